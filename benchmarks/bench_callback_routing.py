@@ -0,0 +1,129 @@
+"""
+Стоимость выбора обработчика нажатия кнопки
+===========================================
+
+Раньше каждый раздел (start, mood, diary, analytics, tags, settings)
+регистрировал кнопки в своем роутере фильтрами F.data == "..." и
+F.data.startswith("..."). aiogram проверяет фильтры по порядку, а
+синхронные фильтры выполняет в пуле потоков, поэтому поздние кнопки
+(настройки, отмена) проходят через десятки проверок.
+
+Теперь обработчик находится по действию из callback_data в таблице
+utils.callbacks. Бенчмарк отправляет нажатия в обе схемы с пустыми
+обработчиками и замеряет только выбор обработчика.
+
+Запуск:
+python -m benchmarks.bench_callback_routing --presses 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiogram import F, Router
+from aiogram.types import CallbackQuery, User
+
+# Кнопки прежних роутеров в порядке подключения (bot.create_dispatcher):
+# "=" - F.data == значение, "^" - F.data.startswith(значение)
+LEGACY_ROUTES = {
+    'start': [('=', 'mood_record'), ('=', 'analytics_menu'), ('=', 'diary_menu'),
+              ('=', 'tags_menu'), ('=', 'settings_menu')],
+    'mood': [('=', 'mood_record'), ('^', 'mood_select_'), ('^', 'category_'),
+             ('=', 'back_to_categories'), ('^', 'tag_toggle_'), ('=', 'noop'),
+             ('=', 'tags_done'), ('=', 'tags_reset'), ('=', 'cancel')],
+    'diary': [('=', 'diary_write'), ('=', 'diary_view'), ('=', 'diary_period'),
+              ('=', 'diary_search'), ('=', 'diary_menu'), ('=', 'back_to_main')],
+    'analytics': [('^', 'analytics_'), ('=', 'analytics_days'), ('=', 'analytics_tags'),
+                  ('=', 'analytics_patterns'), ('=', 'analytics_menu'), ('=', 'back_to_main')],
+    'tags': [('=', 'tag_create'), ('=', 'tag_delete'), ('^', 'delete_tag_'),
+             ('^', 'confirm_delete_tag_'), ('=', 'tag_stats'), ('=', 'tags_menu'),
+             ('=', 'back_to_main'), ('=', 'cancel')],
+    'settings': [('=', 'settings_reminder_time'), ('=', 'settings_reminders'),
+                 ('=', 'settings_timezone'), ('=', 'settings_export'), ('=', 'settings_reset'),
+                 ('=', 'confirm_reset_data'), ('=', 'settings_menu'), ('=', 'back_to_main'),
+                 ('=', 'cancel')],
+}
+
+# Нажатия: (callback_data прежней схемы, callback_data таблицы)
+PRESSES = [
+    ('mood_record', 'mood_record'),
+    ('mood_select_4', 'mood_select:4'),
+    ('category_здоровье', 'category:здоровье'),
+    ('tag_toggle_12', 'tag_toggle:12'),
+    ('tags_done', 'tags_done'),
+    ('diary_view', 'diary_view'),
+    ('analytics_week', 'analytics_period:week'),
+    ('confirm_delete_tag_5', 'confirm_delete_tag:5'),
+    ('settings_export', 'settings_export'),
+    ('back_to_main', 'back_to_main'),
+]
+
+async def noop(callback: CallbackQuery):
+    pass
+
+def build_legacy_router() -> Router:
+    """Прежняя схема: роутеры разделов с фильтрами F.data"""
+    root = Router(name="legacy")
+    for name, routes in LEGACY_ROUTES.items():
+        router = Router(name=name)
+        for kind, value in routes:
+            data_filter = F.data == value if kind == '=' else F.data.startswith(value)
+            router.callback_query.register(noop, data_filter)
+        root.include_router(router)
+    return root
+
+def build_index_router() -> Router:
+    """Таблица действий с теми же кнопками, что у бота, и пустыми обработчиками"""
+    # Модули handlers (их импортирует bot) регистрируют кнопки при импорте
+    import bot
+    from utils.callbacks import CallbackIndex, callbacks
+
+    index = CallbackIndex(name="bench")
+    for action in callbacks.actions():
+        index.register(action, noop)
+    return index.router
+
+def make_callback(data: str) -> CallbackQuery:
+    return CallbackQuery(id="1", from_user=User(id=1, is_bot=False, first_name="Bench"),
+                         chat_instance="1", data=data)
+
+async def _time_per_press(router: Router, data: str, presses: int) -> float:
+    callback = make_callback(data)
+    await router.propagate_event('callback_query', callback)
+    started = time.perf_counter()
+    for _ in range(presses):
+        await router.propagate_event('callback_query', callback)
+    return (time.perf_counter() - started) / presses * 1e6
+
+async def run_benchmark(presses: int) -> dict:
+    legacy, index = build_legacy_router(), build_index_router()
+    rows = []
+    for legacy_data, index_data in PRESSES:
+        rows.append({
+            'data': index_data,
+            'legacy_us': round(await _time_per_press(legacy, legacy_data, presses), 1),
+            'index_us': round(await _time_per_press(index, index_data, presses), 1),
+        })
+    return {
+        'presses': rows,
+        'legacy_mean_us': round(sum(row['legacy_us'] for row in rows) / len(rows), 1),
+        'index_mean_us': round(sum(row['index_us'] for row in rows) / len(rows), 1),
+    }
+
+def print_report(result: dict):
+    print(f"{'callback_data':<24} | {'фильтры, мкс':>12} | {'таблица, мкс':>12}")
+    print("-" * 56)
+    for row in result['presses']:
+        print(f"{row['data']:<24} | {row['legacy_us']:>12.1f} | {row['index_us']:>12.1f}")
+    print("-" * 56)
+    print(f"{'среднее':<24} | {result['legacy_mean_us']:>12.1f} | {result['index_mean_us']:>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость выбора обработчика нажатия кнопки")
+    parser.add_argument('--presses', type=int, default=2000, help="нажатий на каждую кнопку")
+    args = parser.parse_args()
+
+    print_report(asyncio.run(run_benchmark(args.presses)))
+
+if __name__ == "__main__":
+    main()
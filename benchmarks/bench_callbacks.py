@@ -0,0 +1,155 @@
+"""
+Накладные расходы обработки callback кнопок меню
+================================================
+
+Кнопки главного меню (Дневник, Мои теги, Настройки) раньше создавали
+внутри обработчика класс MockMessage, его экземпляр и через него вызывали
+обработчик сообщения. Теперь обработчик меню получает callback.message и
+user_id напрямую.
+
+Замеряется:
+- адаптер: создание класса и экземпляра при каждом нажатии (как было)
+  против прямого вызова;
+- обработчики callback_*_menu целиком с заглушками сообщения и запроса
+  (без сети, база временная).
+
+Запуск:
+python -m benchmarks.bench_callbacks --presses 20000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+class StubChat:
+    __slots__ = ('id',)
+
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+class StubUser:
+    __slots__ = ('id', 'username', 'first_name', 'is_bot')
+
+    def __init__(self, user_id: int, is_bot: bool = False):
+        self.id = user_id
+        self.username = f"user{user_id}"
+        self.first_name = "Bench"
+        self.is_bot = is_bot
+
+class StubMessage:
+    """Сообщение бота с кнопкой: answer ничего не отправляет"""
+    __slots__ = ('chat', 'from_user', 'bot')
+
+    def __init__(self, chat_id: int):
+        self.chat = StubChat(chat_id)
+        self.from_user = StubUser(1, is_bot=True)
+        self.bot = self
+
+    async def answer(self, text, reply_markup=None, **kwargs):
+        return None
+
+    async def send_message(self, chat_id, text, reply_markup=None, parse_mode=None, **kwargs):
+        return None
+
+class StubCallback:
+    __slots__ = ('from_user', 'message', 'bot', 'data')
+
+    def __init__(self, user_id: int, data: str):
+        self.from_user = StubUser(user_id)
+        self.message = StubMessage(user_id)
+        self.bot = self.message
+        self.data = data
+
+    async def answer(self, text: str = None, **kwargs):
+        return None
+
+async def legacy_adapter(callback, show):
+    """Как было: класс и экземпляр MockMessage на каждое нажатие"""
+    class MockMessage:
+        def __init__(self, callback):
+            self.from_user = callback.from_user
+            self.chat = callback.message.chat
+            self.bot = callback.bot
+
+        async def answer(self, text, reply_markup=None, parse_mode=None, **kwargs):
+            await self.bot.send_message(
+                chat_id=self.chat.id,
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode,
+                **kwargs
+            )
+
+    await show(MockMessage(callback))
+
+async def direct_call(callback, show):
+    """Как стало: сообщение с кнопкой и user_id передаются напрямую"""
+    await show(callback.message, callback.from_user.id)
+
+async def _time_per_call(coroutine_factory, presses: int) -> float:
+    started = time.perf_counter()
+    for _ in range(presses):
+        await coroutine_factory()
+    return (time.perf_counter() - started) / presses * 1e6
+
+async def run_benchmark(presses: int, db_path: str) -> dict:
+    from database.db_manager import db_manager, DatabaseManager
+    from handlers.start import callback_diary_menu, callback_tags_menu, callback_settings_menu
+
+    async def show(message, user_id=None):
+        await message.answer("menu")
+
+    callback = StubCallback(7, 'diary_menu')
+    result = {
+        'adapter_us': {
+            'legacy': round(await _time_per_call(lambda: legacy_adapter(callback, show), presses), 2),
+            'direct': round(await _time_per_call(lambda: direct_call(callback, show), presses), 2),
+        },
+        'handlers_us': {},
+    }
+
+    db_manager.override(DatabaseManager(db_path))
+    try:
+        db_manager.get_or_create_user(7)
+        for handler in (callback_diary_menu, callback_tags_menu, callback_settings_menu):
+            result['handlers_us'][handler.__name__] = round(
+                await _time_per_call(lambda: handler(callback), presses // 10), 2)
+    finally:
+        db_manager.reset()
+
+    return result
+
+def print_report(result: dict):
+    adapter = result['adapter_us']
+    print(f"Адаптер на нажатие: класс MockMessage {adapter['legacy']:.2f} мкс, "
+          f"прямой вызов {adapter['direct']:.2f} мкс "
+          f"(x{adapter['legacy'] / adapter['direct']:.1f})")
+    print()
+    print(f"{'обработчик':<28} | {'мкс на нажатие':>15}")
+    print("-" * 46)
+    for name, value in result['handlers_us'].items():
+        print(f"{name:<28} | {value:>15.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы обработки callback кнопок меню")
+    parser.add_argument('--presses', type=int, default=20000)
+    parser.add_argument('--verbose', action='store_true', help="не приглушать логи бота")
+    args = parser.parse_args()
+
+    if args.verbose:
+        # Логи бота в консоль и LOG_FILE, как при обычном запуске
+        from config import config, setup_logging
+        setup_logging(config)
+    else:
+        logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(run_benchmark(args.presses, os.path.join(tmp, 'bench.db')))
+
+    print_report(result)
+
+if __name__ == "__main__":
+    main()
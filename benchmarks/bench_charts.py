@@ -0,0 +1,117 @@
+"""
+Бенчмарк построения графиков
+============================
+
+Заполняет временную базу синтетическими записями одного пользователя и для
+каждого типа графика измеряет время двух путей данных:
+- список MoodEntry из get_mood_entries (старый путь);
+- массивы NumPy из get_mood_arrays (целочисленные столбцы дат в базе).
+
+Отдельно показывается время загрузки данных и агрегаций без отрисовки,
+так как отрисовка matplotlib одинакова для обоих путей.
+
+Запуск:
+python -m benchmarks.bench_charts --entries 5000 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from database.db_manager import DatabaseManager
+from utils.charts import chart_generator, load_plotting_stack, as_mood_arrays
+
+USER_ID = 1
+
+CHARTS = {
+    'тренд': lambda data: chart_generator.generate_mood_trend_chart(data, None, None),
+    'дни недели': chart_generator.generate_weekday_stats_chart,
+    'тепловая карта': chart_generator.generate_heatmap_chart,
+    'распределение': chart_generator.generate_mood_distribution_chart,
+}
+
+AGGREGATIONS = {
+    'дни недели': chart_generator.weekday_stats,
+    'тепловая карта': chart_generator.hour_weekday_grid,
+}
+
+def fill_database(db: DatabaseManager, entries: int, seed: int = 42):
+    """Синтетические записи: по несколько в день в случайное время"""
+    rnd = random.Random(seed)
+    start = datetime.now() - timedelta(days=entries // 3 + 1)
+
+    rows = []
+    for _ in range(entries):
+        created = start + timedelta(seconds=rnd.randint(0, (entries // 3) * 86400))
+        rows.append((
+            USER_ID,
+            rnd.randint(1, 5),
+            'запись' if rnd.random() < 0.3 else None,
+            created.date().isoformat(),
+            created.strftime('%Y-%m-%d %H:%M:%S'),
+            created.date().toordinal(),
+            int(created.replace(tzinfo=timezone.utc).timestamp())
+        ))
+
+    with db.get_connection() as conn:
+        conn.executemany('''
+            INSERT INTO mood_entries (user_id, mood_score, diary_text, entry_date, created_at,
+                                      entry_ordinal, created_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+def best_of(repeat: int, func) -> float:
+    """Минимальное время выполнения func за repeat прогонов, мс"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Время построения графиков")
+    parser.add_argument('--entries', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    load_plotting_stack()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        fill_database(db, args.entries)
+
+        entries = db.get_mood_entries(USER_ID)
+        arrays = db.get_mood_arrays(USER_ID)
+
+        print(f"Записей: {len(arrays)}, лучшее из {args.repeat} прогонов\n")
+
+        print(f"{'загрузка данных':<28} | {'мс':>9}")
+        print("-" * 41)
+        for name, func in (
+            ('get_mood_entries', lambda: db.get_mood_entries(USER_ID)),
+            ('get_mood_entries + массивы', lambda: as_mood_arrays(db.get_mood_entries(USER_ID))),
+            ('get_mood_arrays', lambda: db.get_mood_arrays(USER_ID)),
+        ):
+            print(f"{name:<28} | {best_of(args.repeat, func):>9.2f}")
+
+        print(f"\n{'агрегация':<16} | {'MoodEntry, мс':>14} | {'массивы, мс':>12}")
+        print("-" * 48)
+        for name, func in AGGREGATIONS.items():
+            from_entries = best_of(args.repeat, lambda: func(entries))
+            from_arrays = best_of(args.repeat, lambda: func(arrays))
+            print(f"{name:<16} | {from_entries:>14.2f} | {from_arrays:>12.2f}")
+
+        print(f"\n{'график':<16} | {'MoodEntry, мс':>14} | {'массивы, мс':>12}")
+        print("-" * 48)
+        for name, func in CHARTS.items():
+            from_entries = best_of(args.repeat, lambda: func(db.get_mood_entries(USER_ID)))
+            from_arrays = best_of(args.repeat, lambda: func(db.get_mood_arrays(USER_ID)))
+            print(f"{name:<16} | {from_entries:>14.1f} | {from_arrays:>12.1f}")
+
+if __name__ == "__main__":
+    main()
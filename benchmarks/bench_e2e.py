@@ -0,0 +1,546 @@
+"""
+Сквозной нагрузочный тест с заглушкой Telegram Bot API
+======================================================
+
+Поднимает локальный HTTP сервер, изображающий Bot API (getUpdates,
+sendMessage, sendPhoto, sendDocument, editMessageText, answerCallbackQuery),
+и запускает настоящего бота (create_bot + create_dispatcher, long polling)
+на временной базе. Синтетические пользователи проходят сценарии так, как это
+делает человек: нажимают кнопки из присланных ботом клавиатур и ждут ответа.
+
+Сценарии:
+- запись настроения: /mood -> оценка -> категория -> теги -> дневник;
+- аналитика: меню аналитики -> график за неделю (sendPhoto);
+- экспорт: настройки -> экспорт CSV (sendDocument).
+
+Отчет: обновлений в секунду, задержки шагов сценариев (от отправки
+обновления до ответа бота), время обработчиков (гистограммы utils.metrics),
+рост размера базы и запросы к Bot API. Результат сохраняется в JSON, с
+которым можно сравнить следующий прогон (--baseline).
+
+Запуск:
+python -m benchmarks.bench_e2e --users 50 --rounds 5
+python -m benchmarks.bench_e2e --users 50 --rounds 5 --baseline benchmarks/results/e2e-<дата>.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import numpy as np
+from aiohttp import web
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+
+BOT_TOKEN = '123456:FAKE-TOKEN-FOR-LOAD-TEST'
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'MoodTracker', 'username': 'moodtracker_bench_bot'}
+
+# Первый пользователь сценариев (Telegram ID синтетических пользователей)
+FIRST_USER_ID = 10_000
+
+class FakeBotAPI:
+    """Заглушка Telegram Bot API
+
+    Хранит отправленные ботом сообщения (текст и inline клавиатуру), чтобы
+    пользователи могли нажимать настоящие кнопки, и складывает каждый ответ
+    бота в очередь чата, из которой его ждет синтетический пользователь.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self.uploaded_bytes = 0
+        self.error_replies = 0
+        self.inbox = defaultdict(asyncio.Queue)
+        self.polling_started = asyncio.Event()
+        self._updates = []
+        self._new_updates = asyncio.Event()
+        self._update_id = 0
+        self._message_id = 0
+        self._callback_chats = {}
+        self._runner = None
+
+    # ===== СЕРВЕР =====
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Запустить сервер, вернуть базовый URL для TelegramAPIServer"""
+        app = web.Application(client_max_size=50 * 2 ** 20)
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        host, port = self._runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        # Ожидающий getUpdates отвечает сразу, иначе сервер ждет конца long polling
+        self._new_updates.set()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        form = await request.post()
+        self.calls[method] += 1
+
+        api_method = getattr(self, f"api_{method.lower()}", None)
+        result = await api_method(form) if api_method else True
+        return web.json_response({'ok': True, 'result': result})
+
+    # ===== ОБНОВЛЕНИЯ =====
+
+    def push_message(self, user: dict, text: str) -> int:
+        """Пользователь пишет боту"""
+        chat = {'id': user['id'], 'type': 'private', 'first_name': user['first_name']}
+        return self._push({'message': {
+            'message_id': self._next_message_id(), 'date': int(time.time()),
+            'chat': chat, 'from': user, 'text': text
+        }})
+
+    def push_callback(self, user: dict, message: dict, data: str) -> int:
+        """Пользователь нажимает inline кнопку под сообщением бота"""
+        callback_id = str(self._update_id + 1)
+        self._callback_chats[callback_id] = user['id']
+        return self._push({'callback_query': {
+            'id': callback_id, 'from': user, 'chat_instance': str(user['id']),
+            'message': message, 'data': data
+        }})
+
+    def _push(self, payload: dict) -> int:
+        self._update_id += 1
+        self._updates.append({'update_id': self._update_id, **payload})
+        self._new_updates.set()
+        return self._update_id
+
+    async def api_getupdates(self, form):
+        self.polling_started.set()
+        offset = int(form.get('offset', 0))
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(form.get('timeout', 0)))
+            except asyncio.TimeoutError:
+                return []
+
+        return self._updates[:int(form.get('limit', 100))]
+
+    # ===== МЕТОДЫ БОТА =====
+
+    async def api_getme(self, form):
+        return BOT_USER
+
+    async def api_sendmessage(self, form):
+        return self._send(form, 'sendMessage', text=form['text'])
+
+    async def api_sendphoto(self, form):
+        size = self._upload(form['photo'])
+        photo = [{'file_id': f"photo{self._message_id}", 'file_unique_id': f"p{self._message_id}",
+                  'width': 1200, 'height': 800, 'file_size': size}]
+        return self._send(form, 'sendPhoto', photo=photo, caption=form.get('caption', ''))
+
+    async def api_senddocument(self, form):
+        size = self._upload(form['document'])
+        document = {'file_id': f"document{self._message_id}", 'file_unique_id': f"d{self._message_id}",
+                    'file_size': size}
+        return self._send(form, 'sendDocument', document=document, caption=form.get('caption', ''))
+
+    async def api_editmessagetext(self, form):
+        chat_id = int(form['chat_id'])
+        message = {
+            'message_id': int(form['message_id']), 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'}, 'from': BOT_USER,
+            'text': form['text'], 'edit_date': int(time.time()),
+        }
+        self._attach_keyboard(message, form)
+        self._deliver(chat_id, 'editMessageText', message)
+        return message
+
+    async def api_answercallbackquery(self, form):
+        chat_id = self._callback_chats.pop(form['callback_query_id'], None)
+        if chat_id is not None:
+            self._deliver(chat_id, 'answerCallbackQuery', None)
+        return True
+
+    def _send(self, form, method: str, **fields) -> dict:
+        chat_id = int(form['chat_id'])
+        message = {
+            'message_id': self._next_message_id(), 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'}, 'from': BOT_USER, **fields
+        }
+        self._attach_keyboard(message, form)
+        self._deliver(chat_id, method, message)
+        return message
+
+    @staticmethod
+    def _attach_keyboard(message: dict, form):
+        # Как и Telegram, в сообщении возвращается только inline клавиатура
+        markup = json.loads(form.get('reply_markup', '{}'))
+        if 'inline_keyboard' in markup:
+            message['reply_markup'] = markup
+
+    def _upload(self, field) -> int:
+        size = len(field.file.read()) if hasattr(field, 'file') else len(field)
+        self.uploaded_bytes += size
+        return size
+
+    def _deliver(self, chat_id: int, method: str, message):
+        if message and (message.get('text') or '').startswith('❌'):
+            self.error_replies += 1
+        self.inbox[chat_id].put_nowait((method, message))
+
+    def _next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+def buttons(message: dict, prefix: str = '') -> list:
+    """callback_data inline кнопок сообщения, начинающиеся с prefix"""
+    keyboard = (message or {}).get('reply_markup', {}).get('inline_keyboard', [])
+    return [button['callback_data'] for row in keyboard for button in row
+            if button.get('callback_data', '').startswith(prefix)]
+
+# ===== СИНТЕТИЧЕСКИЕ ПОЛЬЗОВАТЕЛИ =====
+
+class VirtualUser:
+    """Пользователь, проходящий сценарии и замеряющий задержку каждого шага"""
+
+    def __init__(self, api: FakeBotAPI, user_id: int, latencies: dict,
+                 timeout: float, seed: int):
+        self.api = api
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}',
+                     'username': f'bench_user{user_id}'}
+        self.inbox = api.inbox[user_id]
+        self.latencies = latencies
+        self.timeout = timeout
+        self.rnd = random.Random(seed)
+        self.updates = 0
+
+    async def send(self, step: str, text: str, expect) -> dict:
+        """Написать боту и дождаться подходящего ответа"""
+        self.api.push_message(self.user, text)
+        return await self._wait(step, expect)
+
+    async def click(self, step: str, message: dict, data: str, expect) -> dict:
+        """Нажать кнопку под сообщением бота и дождаться ответа"""
+        self.api.push_callback(self.user, message, data)
+        return await self._wait(step, expect)
+
+    async def _wait(self, step: str, expect) -> dict:
+        self.updates += 1
+        started = time.perf_counter()
+        deadline = started + self.timeout
+
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"нет ответа на шаге '{step}'")
+            method, message = await asyncio.wait_for(self.inbox.get(), remaining)
+            if expect(method, message):
+                self.latencies[step].append(time.perf_counter() - started)
+                return message
+
+    def _drain(self):
+        # Ответы, которых сценарий не ждал (например, вторая клавиатура /mood)
+        while not self.inbox.empty():
+            self.inbox.get_nowait()
+
+    async def mood_flow(self):
+        """Запись настроения с тегами и заметкой"""
+        self._drain()
+        message = await self.send('/mood', '/mood', lambda m, msg: bool(buttons(msg, 'mood_select:')))
+
+        score = self.rnd.randint(1, 5)
+        message = await self.click('оценка', message, f'mood_select:{score}', is_edit)
+
+        categories = buttons(message, 'category:')
+        if categories:
+            message = await self.click('категория', message, self.rnd.choice(categories), is_edit)
+            tags = buttons(message, 'tag_toggle:')
+            chosen = self.rnd.sample(tags, min(len(tags), self.rnd.randint(1, 3)))
+            # Теги выбираются серией быстрых нажатий, клавиатура обновляется
+            # один раз (шаг замеряется от последнего нажатия)
+            for data in chosen[:-1]:
+                self.api.push_callback(self.user, message, data)
+                self.updates += 1
+            message = await self.click('тег', message, chosen[-1], is_edit)
+            await self.click('теги готовы', message, 'tags_done', is_edit)
+
+        await self.send('дневник', f"Заметка {self.rnd.random():.6f}", is_new_message)
+
+    async def analytics_flow(self):
+        """График настроения за неделю"""
+        self._drain()
+        message = await self.send('меню аналитики', '📈 Аналитика',
+                                  lambda m, msg: bool(buttons(msg, 'analytics_period:week')))
+        # При полной очереди графиков (CHART_QUEUE_LIMIT) отчет приходит текстом
+        await self.click('график', message, 'analytics_period:week',
+                         lambda m, msg: m == 'sendPhoto' or (m == 'editMessageText'
+                                                             and msg['text'].startswith(('❌', '📈'))))
+
+    async def export_flow(self):
+        """Экспорт данных в CSV"""
+        self._drain()
+        message = await self.send('меню настроек', '⚙️ Настройки',
+                                  lambda m, msg: bool(buttons(msg, 'settings_export')))
+        await self.click('экспорт', message, 'settings_export',
+                         lambda m, msg: m in ('sendDocument', 'editMessageText'))
+
+    async def run(self, rounds: int, analytics_share: float, export_share: float):
+        await self.send('/start', '/start', is_new_message)
+        for _ in range(rounds):
+            await self.mood_flow()
+            if self.rnd.random() < analytics_share:
+                await self.analytics_flow()
+            if self.rnd.random() < export_share:
+                await self.export_flow()
+
+def is_edit(method: str, message) -> bool:
+    return method == 'editMessageText'
+
+def is_new_message(method: str, message) -> bool:
+    return method == 'sendMessage'
+
+# ===== ЗАПУСК =====
+
+def database_size(db) -> int:
+    """Логический размер базы (с учетом страниц, еще не перенесенных из WAL)"""
+    with db.get_connection() as conn:
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return page_count * page_size
+
+def percentiles(values) -> dict:
+    if not len(values):
+        return {'count': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return {'count': len(values), 'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+
+def handler_latencies() -> dict:
+    """Время обработчиков из гистограмм HANDLER_DURATION"""
+    from utils.metrics import metrics, HANDLER_DURATION
+
+    result = {}
+    for key, histogram in sorted(metrics.get_histograms(HANDLER_DURATION).items()):
+        labels = dict(key)
+        if labels.get('status') != 'ok':
+            continue
+        result[labels['handler']] = {
+            'count': histogram.count,
+            'p50_ms': round(histogram.quantile(0.5) * 1000, 2),
+            'p95_ms': round(histogram.quantile(0.95) * 1000, 2),
+            'p99_ms': round(histogram.quantile(0.99) * 1000, 2),
+        }
+    return result
+
+@asynccontextmanager
+async def running_bot(db_path: str, timeout: float, charts: bool = True):
+    """Настоящий бот (long polling) на базе db_path против заглушки Bot API
+
+    Возвращает заглушку, когда бот начал получать обновления.
+    """
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import bot as bot_module
+    from database.db_manager import db_manager, DatabaseManager
+    from utils.charts import load_plotting_stack
+
+    api = FakeBotAPI()
+    base_url = await api.start()
+
+    db_manager.override(DatabaseManager(db_path))
+    if charts:
+        # Библиотеки графиков загружаются до замера, как после прогрева в боте
+        await asyncio.to_thread(load_plotting_stack)
+
+    bot = bot_module.create_bot(
+        token=BOT_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+    )
+    dp = bot_module.create_dispatcher()
+    # Аргументы попадают в on_startup: без планировщика, метрик и прогрева
+    polling = asyncio.create_task(dp.start_polling(
+        bot, handle_signals=False, polling_timeout=1,
+        scheduler=False, charts=False, metrics_port=0
+    ))
+
+    try:
+        await asyncio.wait_for(api.polling_started.wait(), timeout)
+        yield api
+    finally:
+        await dp.stop_polling()
+        await polling
+        await api.stop()
+        # Роутеры handlers - глобальные объекты, и aiogram не подключает роутер
+        # ко второму диспетчеру. Отвязываем их, чтобы бота можно было снова
+        # запустить в том же процессе (тесты)
+        for router in dp.sub_routers:
+            router._parent_router = None
+        dp.sub_routers.clear()
+
+async def run_benchmark(users: int, rounds: int, analytics_share: float = 0.3,
+                        export_share: float = 0.1, timeout: float = 60, seed: int = 42,
+                        db_path: str = None) -> dict:
+    """Прогнать сценарии через настоящего бота и вернуть результаты"""
+    from database.db_manager import db_manager
+    from utils.metrics import metrics
+
+    async with running_bot(db_path, timeout) as api:
+        metrics.reset()
+        size_before = database_size(db_manager)
+
+        latencies = defaultdict(list)
+        virtual_users = [
+            VirtualUser(api, FIRST_USER_ID + i, latencies, timeout, seed + i)
+            for i in range(users)
+        ]
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(user.run(rounds, analytics_share, export_share) for user in virtual_users),
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - started
+
+        failures = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        for failure in failures[:5]:
+            logging.getLogger('mood_tracker').error("Сценарий не завершен: %r", failure)
+
+        total_updates = sum(user.updates for user in virtual_users)
+        size_after = database_size(db_manager)
+        with db_manager.get_connection() as conn:
+            entries = conn.execute('SELECT COUNT(*) FROM mood_entries').fetchone()[0]
+
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'params': {'users': users, 'rounds': rounds, 'analytics_share': analytics_share,
+                   'export_share': export_share, 'seed': seed},
+        'updates': total_updates,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(total_updates / elapsed, 1) if elapsed else 0.0,
+        'failed_users': len(failures),
+        'error_replies': api.error_replies,
+        'steps': {step: percentiles(values) for step, values in latencies.items()},
+        'handlers': handler_latencies(),
+        'api_calls': dict(api.calls.most_common()),
+        'uploaded_bytes': api.uploaded_bytes,
+        'db': {
+            'size_before': size_before,
+            'size_after': size_after,
+            'mood_entries': entries,
+            'bytes_per_update': round((size_after - size_before) / max(total_updates, 1), 1),
+        },
+    }
+
+# ===== ОТЧЕТ =====
+
+def print_report(result: dict):
+    print(f"Пользователей: {result['params']['users']}, раундов: {result['params']['rounds']}")
+    print(f"Обновлений: {result['updates']} за {result['seconds']:.2f} с -> "
+          f"{result['updates_per_sec']:.1f} обновлений/с")
+    print(f"Незавершенных сценариев: {result['failed_users']}, ответов с ошибкой: {result['error_replies']}")
+
+    for title, table in (("шаг сценария", result['steps']), ("обработчик", result['handlers'])):
+        print()
+        print(f"{title:<32} | {'кол-во':>7} | {'p50, мс':>8} | {'p95, мс':>8} | {'p99, мс':>8}")
+        print("-" * 76)
+        for name, row in table.items():
+            print(f"{name:<32} | {row['count']:>7} | {row['p50_ms']:>8.1f} | "
+                  f"{row['p95_ms']:>8.1f} | {row['p99_ms']:>8.1f}")
+
+    db = result['db']
+    print()
+    print(f"База: {db['size_before'] / 1024:.0f} КБ -> {db['size_after'] / 1024:.0f} КБ "
+          f"({db['bytes_per_update']:.0f} байт на обновление, записей: {db['mood_entries']})")
+    print("Bot API: " + ", ".join(f"{method} {count}" for method, count in result['api_calls'].items()))
+
+def regression_metrics(result: dict) -> dict:
+    """Метрики для сравнения прогонов: {имя: (значение, больше - лучше)}"""
+    values = {'обновлений/с': (result['updates_per_sec'], True),
+              'байт базы на обновление': (result['db']['bytes_per_update'], False)}
+    for step, row in result['steps'].items():
+        values[f"p95 {step}, мс"] = (row['p95_ms'], False)
+    return values
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Напечатать сравнение с прошлым прогоном, вернуть список регрессий"""
+    old_values = regression_metrics(baseline)
+    regressions = []
+
+    print()
+    print(f"Сравнение с прогоном от {baseline.get('date', '?')} (допуск {tolerance:.0%})")
+    print(f"{'метрика':<32} | {'было':>10} | {'стало':>10} | {'изм.':>7}")
+    print("-" * 68)
+
+    for name, (new, higher_is_better) in regression_metrics(result).items():
+        old = old_values.get(name, (0, higher_is_better))[0]
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        mark = " !" if worse > tolerance else ""
+        if mark:
+            regressions.append(name)
+        print(f"{name:<32} | {old:>10.1f} | {new:>10.1f} | {change:>+6.0%}{mark}")
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный тест с заглушкой Bot API")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--analytics-share', type=float, default=0.3,
+                        help="доля раундов с графиком аналитики")
+    parser.add_argument('--export-share', type=float, default=0.1,
+                        help="доля раундов с экспортом CSV")
+    parser.add_argument('--timeout', type=float, default=60, help="ожидание ответа бота, с")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="куда сохранить результаты (JSON)")
+    parser.add_argument('--baseline', help="результаты прошлого прогона для сравнения")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="допустимое ухудшение метрик относительно --baseline")
+    parser.add_argument('--verbose', action='store_true', help="не приглушать логи бота")
+    args = parser.parse_args()
+
+    if args.verbose:
+        # Логи бота в консоль и LOG_FILE, как при обычном запуске
+        from config import config, setup_logging
+        setup_logging(config)
+    else:
+        logging.disable(logging.INFO)
+        warnings.filterwarnings('ignore', message='Glyph .* missing from current font')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(run_benchmark(
+            args.users, args.rounds, args.analytics_share, args.export_share,
+            args.timeout, args.seed, db_path=os.path.join(tmp, 'bench.db')
+        ))
+
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены: {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nРегрессии: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Бенчмарк памяти при загрузке всей истории записей
+=================================================
+
+Заполняет временную базу записями одного пользователя (по умолчанию 100 000)
+и в отдельных процессах загружает их разными способами, измеряя прирост RSS
+и время загрузки:
+- dataclass: прежняя модель MoodEntry (@dataclass с __dict__, даты
+  разбираются сразу при загрузке);
+- slots: текущая MoodEntry из get_mood_entries (__slots__, даты - строки);
+- slots + даты: то же, но после обращения к entry_date/created_at всех записей.
+
+Запуск:
+python -m benchmarks.bench_memory --entries 100000
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+from benchmarks.bench_charts import fill_database, USER_ID
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = ('dataclass', 'slots', 'slots + даты')
+
+@dataclass
+class LegacyMoodEntry:
+    """Модель MoodEntry до перехода на __slots__ (для сравнения)"""
+    id: Optional[int] = None
+    user_id: int = 0
+    mood_score: int = 3
+    diary_text: Optional[str] = None
+    entry_date: Optional[date] = None
+    created_at: Optional[datetime] = None
+
+def current_rss() -> int:
+    """Текущий RSS процесса в байтах (Linux), иначе пиковый"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def load_legacy(db) -> list:
+    """Загрузка так, как это делал get_mood_entries с прежней моделью"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM mood_entries WHERE user_id = ?
+            ORDER BY entry_date DESC, created_at DESC
+        ''', (USER_ID,))
+        return [LegacyMoodEntry(
+            id=row['id'],
+            user_id=row['user_id'],
+            mood_score=row['mood_score'],
+            diary_text=row['diary_text'],
+            entry_date=date.fromisoformat(row['entry_date']),
+            created_at=datetime.fromisoformat(row['created_at'])
+        ) for row in cursor.fetchall()]
+
+def measure(variant: str, db_path: str) -> dict:
+    """Замер одного способа загрузки (выполняется в дочернем процессе)"""
+    from database.db_manager import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    gc.collect()
+    rss_before = current_rss()
+    started = time.perf_counter()
+
+    if variant == 'dataclass':
+        entries = load_legacy(db)
+    else:
+        entries = db.get_mood_entries(USER_ID)
+        if variant == 'slots + даты':
+            for entry in entries:
+                entry.entry_date, entry.created_at
+
+    elapsed = time.perf_counter() - started
+    gc.collect()
+
+    return {
+        'entries': len(entries),
+        'rss_mb': (current_rss() - rss_before) / 2 ** 20,
+        'seconds': elapsed,
+    }
+
+def run_child(variant: str, db_path: str) -> dict:
+    """Запуск замера в чистом процессе, чтобы RSS не смешивался"""
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_memory', '--child', variant, '--db', db_path],
+        cwd=os.path.dirname(db_path), env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Память при загрузке всей истории записей")
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--child', choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.db)))
+        return
+
+    from database.db_manager import DatabaseManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        fill_database(DatabaseManager(db_path), args.entries)
+
+        print(f"{'модель':<14} | {'записей':>8} | {'RSS, МБ':>8} | {'байт/запись':>11} | {'время, с':>8}")
+        print("-" * 62)
+        for variant in VARIANTS:
+            result = run_child(variant, db_path)
+            per_entry = result['rss_mb'] * 2 ** 20 / max(result['entries'], 1)
+            print(f"{variant:<14} | {result['entries']:>8} | {result['rss_mb']:>8.1f} | "
+                  f"{per_entry:>11.0f} | {result['seconds']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
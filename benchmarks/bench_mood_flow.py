@@ -0,0 +1,165 @@
+"""
+Запросы к Bot API на одну запись настроения
+===========================================
+
+Синтетические пользователи записывают настроение через настоящего бота
+(заглушка Bot API из bench_e2e) и считают, сколько запросов к Telegram
+и сколько времени занимает одна запись - от /mood до ответа о сохранении.
+
+Сценарии:
+- note: /mood -> оценка -> категория -> теги -> заметка сообщением;
+- done: то же, но перед заметкой нажата кнопка "Готово".
+
+Теги выбираются серией быстрых нажатий (клавиатура обновляется один раз),
+поэтому число запросов на запись не зависит от скорости пользователя:
+note - 7 + число тегов, done - 9 + число тегов.
+
+Запуск:
+python -m benchmarks.bench_mood_flow --users 20 --entries 3 --tags 3
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from benchmarks.bench_e2e import (FIRST_USER_ID, VirtualUser, buttons, is_edit,
+                                  is_new_message, running_bot)
+
+FLOWS = ('note', 'done')
+
+# Запросы, которые делает не сценарий, а сам бот (получение обновлений)
+SERVICE_METHODS = ('getUpdates', 'getMe')
+
+class MoodLogger(VirtualUser):
+    """Пользователь, который только записывает настроение"""
+
+    async def log_entry(self, flow: str, tags: int) -> Counter:
+        """Одна запись настроения, вернуть запросы к Bot API в чате пользователя"""
+        self._drain()
+        calls = Counter()
+
+        async def wait(step: str, expect) -> dict:
+            # Считаем все ответы бота в чате, а не только ожидаемый
+            def counted(method, message):
+                calls[method] += 1
+                return expect(method, message)
+            return await self._wait(step, counted)
+
+        def click(step: str, message: dict, data: str, expect):
+            self.api.push_callback(self.user, message, data)
+            return wait(step, expect)
+
+        started = time.perf_counter()
+        self.api.push_message(self.user, '/mood')
+        message = await wait('/mood', lambda m, msg: bool(buttons(msg, 'mood_select:')))
+        message = await click('оценка', message, f'mood_select:{self.rnd.randint(1, 5)}', is_edit)
+
+        categories = buttons(message, 'category:')
+        message = await click('категория', message, self.rnd.choice(categories), is_edit)
+
+        chosen = self.rnd.sample(buttons(message, 'tag_toggle:'), tags)
+        for data in chosen:
+            self.api.push_callback(self.user, message, data)
+            self.updates += 1
+        # Ответ на каждое нажатие и одно обновление клавиатуры
+        answered, edited = 0, None
+        while answered < tags or edited is None:
+            method, reply = await asyncio.wait_for(self.inbox.get(), self.timeout)
+            calls[method] += 1
+            if method == 'answerCallbackQuery':
+                answered += 1
+            elif is_edit(method, reply):
+                edited = reply
+        message = edited
+
+        if flow == 'done':
+            await click('готово', message, 'tags_done', is_edit)
+
+        self.api.push_message(self.user, f"Заметка {self.rnd.random():.6f}")
+        await wait('заметка', is_new_message)
+
+        self.latencies[flow].append(time.perf_counter() - started)
+        return calls
+
+async def run_benchmark(users: int, entries: int, tags: int, timeout: float = 60,
+                        seed: int = 42, db_path: str = None) -> dict:
+    """Записать entries настроений каждым пользователем в каждом сценарии"""
+    latencies = defaultdict(list)
+    calls = {flow: Counter() for flow in FLOWS}
+
+    async with running_bot(db_path, timeout, charts=False) as api:
+        loggers = [MoodLogger(api, FIRST_USER_ID + i, latencies, timeout, seed + i)
+                   for i in range(users)]
+        for user in loggers:
+            # /start присылает два сообщения, ждем последнее (главное меню)
+            await user.send('/start', '/start', lambda m, msg: bool(buttons(msg, 'mood_record')))
+
+        async def run_user(user: MoodLogger):
+            for _ in range(entries):
+                for flow in FLOWS:
+                    calls[flow].update(await user.log_entry(flow, tags))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user(user) for user in loggers))
+        elapsed = time.perf_counter() - started
+
+    total = users * entries
+    result = {'params': {'users': users, 'entries': entries, 'tags': tags, 'seed': seed},
+              'seconds': round(elapsed, 3), 'flows': {}}
+    for flow in FLOWS:
+        per_entry = {method: count / total for method, count in calls[flow].most_common()
+                     if method not in SERVICE_METHODS}
+        p50, p95 = np.percentile(np.asarray(latencies[flow]) * 1000, [50, 95])
+        result['flows'][flow] = {
+            'api_calls_per_entry': round(sum(per_entry.values()), 2),
+            'by_method': {method: round(count, 2) for method, count in per_entry.items()},
+            'p50_ms': round(p50, 1),
+            'p95_ms': round(p95, 1),
+        }
+    return result
+
+def print_report(result: dict):
+    params = result['params']
+    print(f"Пользователей: {params['users']}, записей на сценарий: {params['entries']}, "
+          f"тегов в записи: {params['tags']}")
+    print()
+    print(f"{'сценарий':<10} | {'запросов':>8} | {'p50, мс':>8} | {'p95, мс':>8} | запросы по методам")
+    print("-" * 100)
+    for flow, row in result['flows'].items():
+        methods = ", ".join(f"{method} {count:g}" for method, count in row['by_method'].items())
+        print(f"{flow:<10} | {row['api_calls_per_entry']:>8g} | {row['p50_ms']:>8.1f} | "
+              f"{row['p95_ms']:>8.1f} | {methods}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Запросы к Bot API и время одной записи настроения")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--entries', type=int, default=3, help="записей на пользователя в каждом сценарии")
+    parser.add_argument('--tags', type=int, default=3, help="тегов в записи")
+    parser.add_argument('--timeout', type=float, default=60, help="ожидание ответа бота, с")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help="не приглушать логи бота")
+    args = parser.parse_args()
+
+    if args.verbose:
+        # Логи бота в консоль и LOG_FILE, как при обычном запуске
+        from config import config, setup_logging
+        setup_logging(config)
+    else:
+        logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(run_benchmark(
+            args.users, args.entries, args.tags, args.timeout, args.seed,
+            db_path=os.path.join(tmp, 'bench.db')
+        ))
+
+    print_report(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Запись настроения при перегрузке графиками
+==========================================
+
+Часть пользователей непрерывно нажимает кнопку графика за месяц, не
+дожидаясь ответа (после рассылки, при двойных нажатиях), остальные
+записывают настроение. Бот запускается как в bench_e2e: настоящий
+long polling против заглушки Bot API, база временная.
+
+Режимы:
+- без нагрузки: только запись настроения (ориентир);
+- без ограничения: CHART_QUEUE_LIMIT=0, каждый график ставится в очередь;
+- с ограничением: CHART_QUEUE_LIMIT=--limit, при полной очереди
+  аналитика отвечает текстом без графика.
+
+Отчет: задержки шагов записи настроения (p50/p95/p99), число ответов
+графиком и текстом и сколько секунд после конца нагрузки бот еще
+дорисовывал накопившиеся графики. Без ограничения часть работы
+(отправка графиков) приходится на время после записи настроения, с
+ограничением ответы текстом отправляются сразу.
+
+Запуск:
+python -m benchmarks.bench_overload --users 10 --storm-users 10 --rounds 3
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import warnings
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+from benchmarks.bench_e2e import FIRST_USER_ID, VirtualUser, buttons, percentiles, running_bot
+
+# Шаг "тег" не учитывается: он включает паузу EDIT_DEBOUNCE_SECONDS
+MOOD_STEPS = ('/mood', 'оценка', 'категория', 'теги готовы', 'дневник')
+
+class StormUser(VirtualUser):
+    """Пользователь, который нажимает "месяц" каждые interval секунд, не дожидаясь графика"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.presses = 0
+        self.replies = defaultdict(int)
+
+    async def prepare(self, days: int):
+        await self.mood_flow()
+        # Месяц записей: график строится столько же, сколько у обычного пользователя
+        from database.db_manager import db_manager
+        from database.models import MoodEntry
+
+        today = datetime.combine(date.today(), datetime.min.time())
+        for day in range(1, days):
+            entry = MoodEntry(user_id=self.user['id'], mood_score=self.rnd.randint(1, 5),
+                              created_at=today - timedelta(days=day))
+            db_manager.save_mood_entry(entry, [])
+        self._drain()
+        return await self.send('меню аналитики', '📈 Аналитика',
+                               lambda m, msg: bool(buttons(msg, 'analytics_period:month')))
+
+    async def storm(self, menu: dict, interval: float, stop: asyncio.Event):
+        # Нажатия идут с постоянной частотой, как бы быстро ни отвечал бот
+        next_press = time.perf_counter()
+        while not stop.is_set():
+            self.api.push_callback(self.user, menu, 'analytics_period:month')
+            self.presses += 1
+            next_press += interval
+            while time.perf_counter() < next_press:
+                await self._collect(next_press - time.perf_counter())
+
+    async def drain(self, timeout: float):
+        """Дождаться ответов на все нажатия"""
+        deadline = time.perf_counter() + timeout
+        while self.replies['photo'] + self.replies['text'] < self.presses:
+            if time.perf_counter() >= deadline:
+                break
+            await self._collect(deadline - time.perf_counter())
+
+    async def _collect(self, seconds: float):
+        try:
+            method, message = await asyncio.wait_for(self.inbox.get(), seconds)
+        except asyncio.TimeoutError:
+            return
+        if method == 'sendPhoto':
+            self.replies['photo'] += 1
+        elif method == 'editMessageText':
+            self.replies['text'] += 1
+
+async def run_mode(users: int, storm_users: int, rounds: int, interval: float,
+                   limit: int, timeout: float, seed: int, db_path: str) -> dict:
+    from config import config
+
+    with patch.object(config, 'CHART_QUEUE_LIMIT', limit):
+        async with running_bot(db_path, timeout) as api:
+            latencies = defaultdict(list)
+            loggers = [VirtualUser(api, FIRST_USER_ID + i, latencies, timeout, seed + i)
+                       for i in range(users)]
+            stormers = [StormUser(api, FIRST_USER_ID + users + i, defaultdict(list), timeout, seed + users + i)
+                        for i in range(storm_users)]
+
+            menus = await asyncio.gather(*(user.prepare(days=30) for user in stormers))
+            stop = asyncio.Event()
+            storms = [asyncio.create_task(user.storm(menu, interval, stop))
+                      for user, menu in zip(stormers, menus)]
+            await asyncio.sleep(interval * 5)
+
+            async def log_moods(user):
+                for _ in range(rounds):
+                    await user.mood_flow()
+
+            await asyncio.gather(*(log_moods(user) for user in loggers))
+
+            stop.set()
+            await asyncio.gather(*storms)
+            drain_started = time.perf_counter()
+            await asyncio.gather(*(user.drain(timeout) for user in stormers))
+            drain_seconds = time.perf_counter() - drain_started
+
+    mood = [value for step in MOOD_STEPS for value in latencies[step]]
+    return {
+        'mood': percentiles(mood),
+        'presses': sum(user.presses for user in stormers),
+        'photos': sum(user.replies['photo'] for user in stormers),
+        'text_replies': sum(user.replies['text'] for user in stormers),
+        'drain_seconds': round(drain_seconds, 2),
+    }
+
+async def run_benchmark(users: int, storm_users: int, rounds: int, interval: float,
+                        limit: int, timeout: float, seed: int, tmp: str) -> dict:
+    modes = {
+        'без нагрузки': (0, 0),
+        'без ограничения': (storm_users, 0),
+        f'с ограничением ({limit})': (storm_users, limit),
+    }
+    result = {}
+    for name, (stormers, mode_limit) in modes.items():
+        db_path = os.path.join(tmp, f'bench-{len(result)}.db')
+        result[name] = await run_mode(users, stormers, rounds, interval, mode_limit, timeout, seed, db_path)
+    return result
+
+def print_report(result: dict):
+    print(f"{'режим':<20} | {'p50, мс':>8} | {'p95, мс':>8} | {'p99, мс':>8} | "
+          f"{'нажатий':>7} | {'графиков':>8} | {'текстом':>7} | {'дорисовка, с':>12}")
+    print("-" * 100)
+    for name, row in result.items():
+        mood = row['mood']
+        print(f"{name:<20} | {mood['p50_ms']:>8.1f} | {mood['p95_ms']:>8.1f} | {mood['p99_ms']:>8.1f} | "
+              f"{row['presses']:>7} | {row['photos']:>8} | {row['text_replies']:>7} | {row['drain_seconds']:>12.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Запись настроения при перегрузке графиками")
+    parser.add_argument('--users', type=int, default=10, help="пользователей, записывающих настроение")
+    parser.add_argument('--storm-users', type=int, default=10, help="пользователей, нажимающих график")
+    parser.add_argument('--rounds', type=int, default=3, help="записей настроения на пользователя")
+    parser.add_argument('--interval', type=float, default=0.2, help="пауза между нажатиями графика, с")
+    parser.add_argument('--limit', type=int, default=8, help="CHART_QUEUE_LIMIT для режима с ограничением")
+    parser.add_argument('--timeout', type=float, default=120, help="ожидание ответа бота, с")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help="не приглушать логи бота")
+    args = parser.parse_args()
+
+    if args.verbose:
+        # Логи бота в консоль и LOG_FILE, как при обычном запуске
+        from config import config, setup_logging
+        setup_logging(config)
+    else:
+        logging.disable(logging.INFO)
+        warnings.filterwarnings('ignore', message='Glyph .* missing from current font')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(run_benchmark(
+            args.users, args.storm_users, args.rounds, args.interval,
+            args.limit, args.timeout, args.seed, tmp
+        ))
+
+    print_report(result)
+
+if __name__ == "__main__":
+    main()
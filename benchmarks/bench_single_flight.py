@@ -0,0 +1,117 @@
+"""
+Одновременные одинаковые запросы графика
+========================================
+
+Двойное нажатие на кнопку "месяц" раньше строило график дважды, прямо в
+цикле событий: пока рисовался график, бот не обрабатывал другие
+обновления. Теперь отчет считается в потоке графиков, а одинаковые
+одновременные запросы ждут одно вычисление (utils.singleflight).
+
+Замеряется время ответа на --requests одинаковых запросов отчета
+за месяц и самая долгая пауза цикла событий (насколько "замирает" бот).
+
+Запуск:
+python -m benchmarks.bench_single_flight --requests 5
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+async def _max_loop_lag(stop: asyncio.Event) -> float:
+    """Самая долгая задержка тика цикла событий (с)"""
+    lag = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lag = max(lag, time.perf_counter() - started - 0.001)
+    return lag
+
+async def _measure(requests: int, handle) -> dict:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_max_loop_lag(stop))
+    await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handle() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    return {'total_ms': round(elapsed * 1000, 1), 'max_loop_lag_ms': round(await lag_task * 1000, 1)}
+
+async def run_benchmark(requests: int, db_path: str) -> dict:
+    from database.db_manager import db_manager, DatabaseManager
+    from database.models import MoodEntry
+    from handlers.analytics import _trend_report
+    from utils.charts import chart_generator, chart_executor
+    from utils.helpers import get_date_range
+    from utils.singleflight import SingleFlight
+
+    db_manager.override(DatabaseManager(db_path))
+    try:
+        db_manager.get_or_create_user(1)
+        for day in range(30):
+            created = datetime.combine(date.today() - timedelta(days=day), datetime.min.time())
+            db_manager.save_mood_entry(MoodEntry(user_id=1, mood_score=day % 5 + 1, created_at=created), [])
+        chart_generator.warm_up()
+
+        start_date, end_date = get_date_range("month")
+        renders = {'before': 0, 'after': 0}
+
+        async def before():
+            # Как было: отчет считается в обработчике
+            renders['before'] += 1
+            _trend_report(1, start_date, end_date, True)
+            await asyncio.sleep(0)
+
+        flight = SingleFlight()
+
+        def counted_report(user_id, start, end, with_chart):
+            renders['after'] += 1
+            return _trend_report(user_id, start, end, with_chart)
+
+        async def after():
+            await flight.run(1, 'trend', counted_report, start_date, end_date, True, executor=chart_executor)
+
+        # Прогрев (первый график строится дольше)
+        _trend_report(1, start_date, end_date, True)
+
+        result = {'before': await _measure(requests, before), 'after': await _measure(requests, after)}
+        for name in renders:
+            result[name]['renders'] = renders[name]
+        return result
+    finally:
+        db_manager.reset()
+
+def print_report(result: dict, requests: int):
+    print(f"{requests} одинаковых запросов графика за месяц")
+    print(f"{'':<10} | {'графиков':>8} | {'всего, мс':>10} | {'пауза цикла, мс':>15}")
+    print("-" * 52)
+    for name, title in (('before', 'было'), ('after', 'стало')):
+        row = result[name]
+        print(f"{title:<10} | {row['renders']:>8} | {row['total_ms']:>10.1f} | {row['max_loop_lag_ms']:>15.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Одновременные одинаковые запросы графика")
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--verbose', action='store_true', help="не приглушать логи бота")
+    args = parser.parse_args()
+
+    if args.verbose:
+        # Логи бота в консоль и LOG_FILE, как при обычном запуске
+        from config import config, setup_logging
+        setup_logging(config)
+    else:
+        logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(run_benchmark(args.requests, os.path.join(tmp, 'bench.db')))
+
+    print_report(result, args.requests)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Бенчмарк времени запуска бота
+=============================
+
+Запускает `python -X importtime -c "import bot"` в чистом процессе и
+показывает общее время импорта, самые тяжелые модули и то, попали ли
+библиотеки графиков (matplotlib, numpy) в холодный старт.
+
+С флагом --with-charts дополнительно загружает библиотеки графиков,
+чтобы увидеть, сколько стоит первый запрос графика.
+
+Запуск:
+python -m benchmarks.bench_startup
+python -m benchmarks.bench_startup --with-charts --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLOTTING_MODULES = ('matplotlib', 'numpy')
+
+def run_importtime(code: str) -> tuple:
+    """Выполнить код с -X importtime, вернуть (время, строки отчета)"""
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+
+    # Запускаем из временной папки, чтобы не трогать рабочие bot.log и БД
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=tmp, env=env, capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - started
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Импорт завершился с ошибкой:\n{result.stderr[-2000:]}")
+
+    return elapsed, result.stderr.splitlines()
+
+def parse_importtime(lines: list) -> list:
+    """Разбор отчета importtime: [(модуль, self_us, cumulative_us), ...]"""
+    modules = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.rstrip(), int(self_us), int(cumulative_us)))
+
+    return modules
+
+def report(title: str, code: str, top: int):
+    elapsed, lines = run_importtime(code)
+    modules = parse_importtime(lines)
+
+    # Собственное время модулей, сгруппированное по корневому пакету
+    packages = {}
+    for name, self_us, _ in modules:
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    total_import_us = sum(packages.values())
+    loaded = set(packages)
+
+    print(f"\n=== {title} ===")
+    print(f"Время процесса:          {elapsed:.2f} с")
+    print(f"Суммарное время импорта: {total_import_us / 1e6:.2f} с")
+    print(f"Импортировано модулей:   {len(modules)}")
+    print("Библиотеки графиков:     " + ", ".join(
+        f"{name} {'загружен' if name in loaded else 'нет'}" for name in PLOTTING_MODULES
+    ))
+
+    print(f"\nСамые тяжелые пакеты (собственное время модулей):")
+    for name, self_us in sorted(packages.items(), key=lambda x: x[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:>9.1f} мс  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного старта бота")
+    parser.add_argument('--module', default='bot', help="какой модуль импортировать")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--with-charts', action='store_true',
+                        help="дополнительно загрузить библиотеки графиков")
+    args = parser.parse_args()
+
+    report(f"import {args.module}", f"import {args.module}", args.top)
+
+    if args.with_charts:
+        report(
+            f"import {args.module} + загрузка графиков",
+            f"import {args.module}; from utils.charts import load_plotting_stack; load_plotting_stack()",
+            args.top
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Бенчмарк масштабирования обработки обновлений по воркерам
+==========================================================
+
+Запускает настоящий супервизор (bot.run_supervisor) с 1, 2, ... N
+воркерами против заглушки Telegram Bot API из bench_e2e. Супервизор
+получает обновления через getUpdates и раздает их воркерам
+(WorkerPool.submit -> bot.worker_main -> dp.feed_raw_update), а
+синтетические пользователи проходят сценарии записи настроения,
+аналитики и экспорта и ждут ответов бота.
+
+Воркеры - отдельные процессы (spawn), поэтому адрес заглушки, токен и
+временную базу они получают через переменные окружения BOT_API_URL,
+BOT_TOKEN и DATABASE_PATH.
+
+Отчет: обновлений в секунду для каждого числа воркеров, ускорение
+относительно одного воркера и p95 задержки шагов сценариев.
+
+Запуск:
+python -m benchmarks.bench_workers --max-workers 4 --users 40 --rounds 3
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import warnings
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+
+from benchmarks.bench_e2e import BOT_TOKEN, FIRST_USER_ID, FakeBotAPI, VirtualUser, percentiles
+
+# Пользователи прогрева: id подряд попадают во все воркеры (user_id % workers)
+WARM_UP_USER_ID = 1_000
+
+@contextmanager
+def worker_environment(**values):
+    """Переменные окружения, которые получат процессы-воркеры"""
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+@asynccontextmanager
+async def running_supervisor(db_path: str, workers: int, timeout: float):
+    """Супервизор с workers воркерами на базе db_path против заглушки Bot API
+
+    Возвращает заглушку, когда каждый воркер записал настроение и построил
+    график: время запуска процессов и загрузки библиотек не входит в замер.
+    """
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import bot as bot_module
+
+    api = FakeBotAPI()
+    base_url = await api.start()
+
+    # Предупреждения matplotlib о символах эмодзи воркеры пишут прямо в stderr
+    with worker_environment(BOT_TOKEN=BOT_TOKEN, BOT_API_URL=base_url, DATABASE_PATH=db_path,
+                            PYTHONWARNINGS='ignore:Glyph'):
+        bot = bot_module.create_bot(
+            token=BOT_TOKEN,
+            session=AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+        )
+        supervisor = asyncio.create_task(bot_module.run_supervisor(bot, workers))
+
+        try:
+            warm_up = [
+                VirtualUser(api, WARM_UP_USER_ID + i, defaultdict(list), timeout, seed=i)
+                for i in range(workers)
+            ]
+            await asyncio.gather(*(user.run(1, analytics_share=1, export_share=0) for user in warm_up))
+            yield api
+        finally:
+            # Воркеры дорабатывают свои очереди и завершаются (см. run_supervisor)
+            supervisor.cancel()
+            await asyncio.gather(supervisor, return_exceptions=True)
+            await api.stop()
+
+async def run_once(workers: int, users: int, rounds: int, analytics_share: float = 0.3,
+                   export_share: float = 0.0, timeout: float = 120, seed: int = 42,
+                   db_path: str = None) -> dict:
+    """Прогнать сценарии пользователей через супервизор с workers воркерами"""
+    from database.db_manager import DatabaseManager
+
+    # Схема создается заранее, чтобы воркеры не соревновались за DDL
+    db = DatabaseManager(db_path)
+
+    async with running_supervisor(db_path, workers, timeout) as api:
+        latencies = defaultdict(list)
+        virtual_users = [
+            VirtualUser(api, FIRST_USER_ID + i, latencies, timeout, seed + i)
+            for i in range(users)
+        ]
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(user.run(rounds, analytics_share, export_share) for user in virtual_users),
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - started
+
+    failures = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    for failure in failures[:5]:
+        logging.getLogger('mood_tracker').error("Сценарий не завершен: %r", failure)
+
+    total_updates = sum(user.updates for user in virtual_users)
+    with db.get_connection() as conn:
+        entries = conn.execute(
+            'SELECT COUNT(*) FROM mood_entries WHERE user_id >= ?', (FIRST_USER_ID,)
+        ).fetchone()[0]
+
+    return {
+        'workers': workers,
+        'updates': total_updates,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(total_updates / elapsed, 1) if elapsed else 0.0,
+        'failed_users': len(failures),
+        'error_replies': api.error_replies,
+        'mood_entries': entries,
+        'latency': percentiles([value for values in latencies.values() for value in values]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование обработки обновлений по воркерам")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--analytics-share', type=float, default=0.3,
+                        help="доля раундов с графиком аналитики")
+    parser.add_argument('--export-share', type=float, default=0.0,
+                        help="доля раундов с экспортом CSV")
+    parser.add_argument('--timeout', type=float, default=120, help="ожидание ответа бота, с")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help="не приглушать логи бота")
+    args = parser.parse_args()
+
+    if args.verbose:
+        from config import config, setup_logging
+        setup_logging(config)
+    else:
+        # Записи воркеров приходят супервизору: читаем их очередь, но не выводим
+        from utils import logs
+        logs.install([logging.NullHandler()])
+        warnings.filterwarnings('ignore', message='Glyph .* missing from current font')
+
+    print(f"{'воркеры':>8} | {'обновл.':>8} | {'время, с':>9} | {'обновл./с':>10} | "
+          f"{'ускорение':>9} | {'p95, мс':>8} | {'сбои':>5}")
+    print("-" * 76)
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        with tempfile.TemporaryDirectory() as tmp:
+            result = asyncio.run(run_once(
+                workers, args.users, args.rounds, args.analytics_share, args.export_share,
+                args.timeout, args.seed, db_path=os.path.join(tmp, 'bench.db')
+            ))
+
+        rate = result['updates_per_sec']
+        baseline = baseline or rate
+        print(f"{workers:>8} | {result['updates']:>8} | {result['seconds']:>9.2f} | {rate:>10.1f} | "
+              f"{rate / baseline:>8.2f}x | {result['latency']['p95_ms']:>8.1f} | {result['failed_users']:>5}")
+
+if __name__ == "__main__":
+    main()
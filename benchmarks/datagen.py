@@ -0,0 +1,364 @@
+"""
+Генератор синтетических баз данных для бенчмарков
+=================================================
+
+Создает базу с пользователями, записями настроения, тегами, связями
+записей с тегами и счетчиками tag_usage в масштабе до миллионов строк.
+Данные правдоподобны:
+- активность пользователей разная (кто-то пишет каждый день, кто-то раз
+  в неделю), иногда по две записи в день, в основном вечером;
+- настроение зависит от пользователя, дня недели и выбранных тегов
+  (спорт и праздники поднимают его, болезнь и конфликты - опускают);
+- теги выбираются по личным предпочтениям пользователя, часть тегов
+  ходит парами (дедлайн - работа), у некоторых есть собственные теги;
+- длина заметок в дневнике распределена логнормально до DIARY_TEXT_LIMIT.
+
+Все случайные величины берутся из numpy с заданным seed, поэтому одна и та
+же команда дает одну и ту же базу. Строки пишутся пачками executemany в
+больших транзакциях: около 150-200 тысяч строк в секунду, упор - в саму
+вставку в mood_entries (AUTOINCREMENT и индекс по user_id, entry_ordinal).
+
+Запуск:
+python -m benchmarks.datagen --db bench.db --users 100000 --days 365
+python -m benchmarks.datagen --db bench.db --users 1000000 --days 90 --end-date 2025-01-31
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from config import config
+from database.db_manager import DatabaseManager
+from database.models import EPOCH_ORDINAL
+
+# Сдвиг настроения по дням недели (понедельник - воскресенье)
+WEEKDAY_EFFECT = np.array([-0.35, -0.15, -0.1, 0.0, 0.25, 0.4, 0.3])
+
+# Влияние предустановленных тегов на настроение (остальные - 0)
+TAG_EFFECTS = {
+    "💼 работа": -0.15, "⏰ дедлайн": -0.6, "🎯 проект": 0.1,
+    "❤️ семья": 0.3, "👫 друзья": 0.45, "💕 любовь": 0.6, "😤 конфликт": -1.0,
+    "💊 болезнь": -1.1, "🏃 спорт": 0.45, "😴 сон": 0.2,
+    "🎬 кино": 0.25, "🎵 музыка": 0.2, "🎮 игры": 0.15,
+    "☀️ солнце": 0.3, "🌧️ дождь": -0.3, "🌈 радуга": 0.4,
+    "🎉 праздник": 0.7, "🎂 день рождения": 0.6, "✈️ путешествие": 0.6,
+}
+
+# Теги, которые часто отмечают вместе: (тег, спутник, вероятность спутника)
+TAG_COMPANIONS = (
+    ("⏰ дедлайн", "💼 работа", 0.7),
+    ("🎂 день рождения", "🎉 праздник", 0.6),
+    ("✈️ путешествие", "☀️ солнце", 0.4),
+    ("😤 конфликт", "❤️ семья", 0.4),
+    ("🌧️ дождь", "📖 чтение", 0.3),
+)
+
+# Доля пользователей с собственными тегами и их количество
+CUSTOM_TAG_USERS = 0.05
+MAX_CUSTOM_TAGS = 5
+
+# Распределение времени записи: (доля, средний час, разброс в часах)
+WRITING_HOURS = ((0.6, 21.0, 1.5), (0.25, 9.0, 1.5), (0.15, 14.0, 5.0))
+
+FIRST_NAMES = ("Анна", "Иван", "Мария", "Алексей", "Ольга", "Дмитрий", "Елена",
+               "Сергей", "Наталья", "Андрей", "Юлия", "Михаил", None)
+TIMEZONES = ("UTC+3", "UTC+3", "UTC+3", "UTC+2", "UTC+5", "UTC+7", "UTC+0")
+REMINDER_TIMES = ("09:00", "20:00", "21:00", "21:00", "22:00")
+
+DIARY_WORDS = (
+    "сегодня был долгий день на работе устал но доволен результатом вечером гулял "
+    "в парке встретил друзей поговорили обо всем хорошая погода подняла настроение "
+    "немного болела голова плохо спал ночью завтра важная встреча волнуюсь много "
+    "читал слушал музыку приготовил ужин для семьи поссорился из-за ерунды потом "
+    "помирились занимался спортом чувствую себя бодрее планирую отпуск "
+).split()
+
+ENTRY_COLUMNS = ('id', 'user_id', 'mood_score', 'diary_text', 'entry_date',
+                 'created_at', 'entry_ordinal', 'created_ts')
+
+class DatasetGenerator:
+    """Генерация и массовая запись синтетических данных в SQLite"""
+
+    def __init__(self, db_path: str, days: int = 365, end_date: date = None,
+                 seed: int = 42, chunk_users: int = 2000):
+        self.db_path = db_path
+        self.days = days
+        self.end_date = end_date or date.today()
+        self.start_ordinal = self.end_date.toordinal() - days + 1
+        self.seed = seed
+        self.chunk_users = chunk_users
+
+        # Строки дат и времени собираются из готовых кусков - без strftime на строку
+        self._day_strings = [date.fromordinal(self.start_ordinal + d).isoformat()
+                             for d in range(days)]
+        self._time_strings = [f" {s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}"
+                              for s in range(86400)]
+        self._diary_corpus = self._build_corpus(np.random.default_rng(seed))
+
+    # ===== ЗАПИСЬ В БАЗУ =====
+
+    def generate(self, users: int, first_user_id: int = 1, progress=None) -> dict:
+        """Сгенерировать users пользователей, вернуть количество строк по таблицам"""
+        # Схема и предустановленные теги создаются обычным путем
+        DatabaseManager(self.db_path)
+
+        conn = sqlite3.connect(self.db_path)
+        # Потеря данных при сбое не страшна - базу можно сгенерировать заново
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA cache_size = -262144')
+        conn.execute('PRAGMA temp_store = MEMORY')
+
+        try:
+            tag_ids, tag_names = self._load_tags(conn)
+            next_entry_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM mood_entries').fetchone()[0]
+            next_tag_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM tags').fetchone()[0]
+
+            counts = dict.fromkeys(('users', 'user_settings', 'tags', 'mood_entries', 'mood_tags'), 0)
+            for chunk, offset in enumerate(range(0, users, self.chunk_users)):
+                rng = np.random.default_rng([self.seed, chunk])
+                user_ids = np.arange(first_user_id + offset,
+                                     first_user_id + min(offset + self.chunk_users, users))
+
+                rows = self._generate_chunk(rng, user_ids, tag_ids, tag_names,
+                                            next_entry_id, next_tag_id)
+                with conn:
+                    self._write_chunk(conn, rows)
+
+                next_entry_id += len(rows['mood_entries'])
+                next_tag_id += len(rows['tags'])
+                for table, table_rows in rows.items():
+                    counts[table] += len(table_rows)
+                if progress:
+                    progress(offset + len(user_ids), counts)
+
+            return counts
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _load_tags(conn) -> tuple:
+        rows = conn.execute('SELECT id, name FROM tags WHERE is_predefined = TRUE ORDER BY id').fetchall()
+        return np.array([row[0] for row in rows]), [row[1] for row in rows]
+
+    @staticmethod
+    def _write_chunk(conn, rows: dict):
+        conn.executemany('''
+            INSERT INTO users (user_id, username, first_name, registration_date, timezone)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows['users'])
+        conn.executemany('''
+            INSERT INTO user_settings (user_id, daily_reminder, reminder_time, language)
+            VALUES (?, ?, ?, 'ru')
+        ''', rows['user_settings'])
+        conn.executemany('''
+            INSERT INTO tags (id, name, category, is_predefined, created_by)
+            VALUES (?, ?, 'Мои теги', FALSE, ?)
+        ''', rows['tags'])
+        conn.executemany(f'''
+            INSERT INTO mood_entries ({", ".join(ENTRY_COLUMNS)})
+            VALUES ({", ".join("?" * len(ENTRY_COLUMNS))})
+        ''', rows['mood_entries'])
+        conn.executemany('INSERT INTO mood_tags (mood_id, tag_id) VALUES (?, ?)', rows['mood_tags'])
+
+        # Счетчики тегов для новых записей, как их ведет save_mood_entry
+        if rows['mood_entries']:
+            conn.execute('''
+                INSERT INTO tag_usage (user_id, tag_id, count, mood_sum, last_used)
+                SELECT me.user_id, mt.tag_id, COUNT(*), SUM(me.mood_score), MAX(me.entry_date)
+                FROM mood_entries me
+                JOIN mood_tags mt ON mt.mood_id = me.id
+                WHERE me.id BETWEEN ? AND ?
+                GROUP BY me.user_id, mt.tag_id
+            ''', (rows['mood_entries'][0][0], rows['mood_entries'][-1][0]))
+
+            # Серии записей пользователей (столбцы users), как их ведет save_mood_entry
+            DatabaseManager.recompute_user_streaks(conn.cursor(), rows['users'][0][0], rows['users'][-1][0])
+
+    # ===== ГЕНЕРАЦИЯ =====
+
+    def _generate_chunk(self, rng, user_ids: np.ndarray, tag_ids: np.ndarray, tag_names: list,
+                        first_entry_id: int, first_tag_id: int) -> dict:
+        n_users = len(user_ids)
+
+        # Пользователь: день регистрации, активность, базовое настроение
+        registered = (self.days * rng.random(n_users) ** 2).astype(np.int64)
+        activity = rng.beta(1.2, 2.5, n_users)
+        base_mood = rng.normal(3.4, 0.45, n_users)
+        diary_share = rng.beta(1.5, 4.0, n_users)
+
+        # Записи: дни, в которые пользователь был активен (иногда по две)
+        active = rng.random((n_users, self.days)) < activity[:, None]
+        active &= np.arange(self.days)[None, :] >= registered[:, None]
+        user_idx, day_idx = np.nonzero(active)
+        repeat = rng.random(len(user_idx)) < 0.05
+        user_idx = np.concatenate([user_idx, user_idx[repeat]])
+        day_idx = np.concatenate([day_idx, day_idx[repeat]])
+        seconds = self._writing_seconds(rng, len(user_idx))
+        order = np.lexsort((seconds, day_idx, user_idx))
+        user_idx, day_idx, seconds = user_idx[order], day_idx[order], seconds[order]
+
+        n_entries = len(user_idx)
+        entry_ids = np.arange(first_entry_id, first_entry_id + n_entries)
+        ordinals = self.start_ordinal + day_idx
+        weekdays = (ordinals - 1) % 7  # date.fromordinal(1) - понедельник
+
+        # Теги: предпочтения пользователя + пары, затем влияние на настроение
+        custom_tags, custom_links = self._custom_tags(rng, user_ids, user_idx, entry_ids, first_tag_id)
+        tag_links = self._predefined_tags(rng, n_users, user_idx, entry_ids, tag_ids, tag_names)
+        effects = np.array([TAG_EFFECTS.get(name, 0.0) for name in tag_names])
+        effect_by_id = dict(zip(tag_ids.tolist(), effects.tolist()))
+        tag_effect = np.zeros(n_entries)
+        if len(tag_links):
+            np.add.at(tag_effect, tag_links[:, 0] - first_entry_id,
+                      np.vectorize(effect_by_id.get)(tag_links[:, 1]))
+
+        raw = base_mood[user_idx] + WEEKDAY_EFFECT[weekdays] + tag_effect + rng.normal(0, 0.75, n_entries)
+        scores = np.clip(np.rint(raw), 1, 5).astype(np.int64)
+
+        # Дневник: у части записей, длина логнормальная до DIARY_TEXT_LIMIT
+        has_diary = rng.random(n_entries) < diary_share[user_idx]
+        diaries = [None] * n_entries
+        diary_rows = np.flatnonzero(has_diary)
+        lengths = np.clip(rng.lognormal(np.log(90), 0.8, len(diary_rows)), 5, config.DIARY_TEXT_LIMIT).astype(np.int64)
+        starts = rng.integers(0, len(self._diary_corpus) - config.DIARY_TEXT_LIMIT, len(diary_rows))
+        corpus = self._diary_corpus
+        for row, start, length in zip(diary_rows.tolist(), starts.tolist(), lengths.tolist()):
+            diaries[row] = corpus[start:start + length].strip() or "ок"
+
+        day_strings, time_strings = self._day_strings, self._time_strings
+        day_list, second_list = day_idx.tolist(), seconds.tolist()
+        created_ts = (ordinals - EPOCH_ORDINAL) * 86400 + seconds
+
+        entries = list(zip(
+            entry_ids.tolist(), user_ids[user_idx].tolist(), scores.tolist(), diaries,
+            [day_strings[d] for d in day_list],
+            [day_strings[d] + time_strings[s] for d, s in zip(day_list, second_list)],
+            ordinals.tolist(), created_ts.tolist()
+        ))
+
+        links = np.concatenate([tag_links, custom_links]) if len(custom_links) else tag_links
+        names = rng.integers(0, len(FIRST_NAMES), n_users).tolist()
+        return {
+            'users': [(uid, f"user{uid}", FIRST_NAMES[name], self._day_strings[reg] + " 12:00:00",
+                       TIMEZONES[uid % len(TIMEZONES)])
+                      for uid, name, reg in zip(user_ids.tolist(), names, registered.tolist())],
+            'user_settings': [(uid, reminder, REMINDER_TIMES[uid % len(REMINDER_TIMES)])
+                              for uid, reminder in zip(user_ids.tolist(),
+                                                       (rng.random(n_users) < 0.7).tolist())],
+            'tags': custom_tags,
+            'mood_entries': entries,
+            'mood_tags': list(map(tuple, links.tolist())),
+        }
+
+    @staticmethod
+    def _writing_seconds(rng, count: int) -> np.ndarray:
+        """Секунда дня записи: смесь вечернего, утреннего и дневного пиков"""
+        shares = np.array([share for share, _, _ in WRITING_HOURS])
+        component = rng.choice(len(WRITING_HOURS), count, p=shares / shares.sum())
+        means = np.array([mean for _, mean, _ in WRITING_HOURS])[component]
+        spreads = np.array([spread for _, _, spread in WRITING_HOURS])[component]
+        hours = rng.normal(means, spreads) % 24
+        return (hours * 3600).astype(np.int64)
+
+    @staticmethod
+    def _predefined_tags(rng, n_users: int, user_idx: np.ndarray, entry_ids: np.ndarray,
+                         tag_ids: np.ndarray, tag_names: list) -> np.ndarray:
+        """Пары (mood_id, tag_id) для предустановленных тегов"""
+        n_tags = len(tag_ids)
+        if not n_tags or not len(user_idx):
+            return np.empty((0, 2), dtype=np.int64)
+
+        # Личные предпочтения: у каждого несколько любимых тегов
+        preference = rng.gamma(0.25, 1.0, (n_users, n_tags)) + 1e-9
+        cumulative = np.cumsum(preference / preference.sum(axis=1, keepdims=True), axis=1)
+        # Сдвиг строк на номер пользователя - один searchsorted на все записи
+        flat = (cumulative + np.arange(n_users)[:, None]).ravel()
+        flat[n_tags - 1::n_tags] = np.arange(1, n_users + 1)  # ровно 1 в конце строки
+
+        per_entry = np.minimum(rng.poisson(1.1, len(user_idx)), 4)
+        owners = np.repeat(np.arange(len(user_idx)), per_entry)
+        draws = rng.random(len(owners)) + user_idx[owners]
+        picked = np.minimum(np.searchsorted(flat, draws, side='right'), n_users * n_tags - 1)
+        picked -= user_idx[owners] * n_tags
+
+        moods, tags = [entry_ids[owners]], [tag_ids[picked]]
+        position = {name: i for i, name in enumerate(tag_names)}
+        for tag, companion, probability in TAG_COMPANIONS:
+            if tag not in position or companion not in position:
+                continue
+            with_tag = owners[(picked == position[tag]) & (rng.random(len(picked)) < probability)]
+            moods.append(entry_ids[with_tag])
+            tags.append(np.full(len(with_tag), tag_ids[position[companion]]))
+
+        links = np.column_stack([np.concatenate(moods), np.concatenate(tags)])
+        return np.unique(links, axis=0)
+
+    @staticmethod
+    def _custom_tags(rng, user_ids: np.ndarray, user_idx: np.ndarray, entry_ids: np.ndarray,
+                     first_tag_id: int) -> tuple:
+        """Собственные теги части пользователей и их связи с записями"""
+        counts = np.where(rng.random(len(user_ids)) < CUSTOM_TAG_USERS,
+                          rng.integers(1, MAX_CUSTOM_TAGS + 1, len(user_ids)), 0)
+        owners = np.repeat(np.arange(len(user_ids)), counts)
+        if not len(owners):
+            return [], np.empty((0, 2), dtype=np.int64)
+
+        ids = np.arange(first_tag_id, first_tag_id + len(owners))
+        # Имена тегов уникальны во всей таблице
+        rows = [(tag_id, f"🔖 тег {tag_id}", int(user_ids[owner]))
+                for tag_id, owner in zip(ids.tolist(), owners.tolist())]
+
+        # Примерно треть записей владельца отмечена одним из его тегов
+        first_tag = np.zeros(len(user_ids), dtype=np.int64)
+        first_tag[counts > 0] = ids[np.searchsorted(owners, np.flatnonzero(counts))]
+        tagged = (counts[user_idx] > 0) & (rng.random(len(user_idx)) < 0.33)
+        choice = (rng.random(int(tagged.sum())) * counts[user_idx[tagged]]).astype(np.int64)
+        links = np.column_stack([entry_ids[tagged], first_tag[user_idx[tagged]] + choice])
+        return rows, links
+
+    @staticmethod
+    def _build_corpus(rng) -> str:
+        """Длинный текст из слов дневника, из которого вырезаются заметки"""
+        words = rng.choice(DIARY_WORDS, 20 * config.DIARY_TEXT_LIMIT)
+        return " ".join(words)
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетической базы для бенчмарков")
+    parser.add_argument('--db', required=True, help="путь к базе (дополняется, если уже есть)")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                        help="последний день данных (по умолчанию сегодня)")
+    parser.add_argument('--first-user-id', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-users', type=int, default=2000,
+                        help="пользователей в одной транзакции")
+    args = parser.parse_args()
+
+    generator = DatasetGenerator(args.db, args.days, args.end_date, args.seed, args.chunk_users)
+    started = time.perf_counter()
+
+    def progress(done: int, counts: dict):
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        print(f"\r{done}/{args.users} пользователей, {rows} строк, "
+              f"{rows / elapsed:.0f} строк/с", end="", flush=True)
+
+    counts = generator.generate(args.users, args.first_user_id, progress)
+    elapsed = time.perf_counter() - started
+    print()
+
+    end_date = generator.end_date
+    print(f"Период: {end_date - timedelta(days=args.days - 1)} - {end_date}, seed {args.seed}")
+    for table, count in counts.items():
+        print(f"{table:<14} | {count:>12}")
+    total = sum(counts.values())
+    print(f"Всего {total} строк за {elapsed:.1f} с ({total / elapsed:.0f} строк/с), "
+          f"размер базы {os.path.getsize(args.db) / 2 ** 20:.0f} МБ")
+
+if __name__ == "__main__":
+    main()
@@ -12,19 +12,34 @@
 """
 
 import asyncio
+from functools import partial
+from queue import Empty
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
+from aiogram.types import FSInputFile
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.utils.backoff import Backoff, BackoffConfig
 
 # Импорт нашей конфигурации и логгера
-from config import config, logger
+from config import config, logger, setup_logging
 
 # Импорт менеджера базы данных для работы с данными
+# (сама база открывается в on_startup, а не при импорте)
 from database.db_manager import db_manager
 
-# Импорт планировщика для напоминаний
+# Импорт планировщика для напоминаний (создается в on_startup)
 from utils.scheduler import reminder_scheduler
 
+# Фоновый поиск паттернов и ночной расчет инсайтов (запускаются планировщиком)
+from utils.mining import pattern_miner
+from utils.insights import insights_batch
+
+# Генератор графиков (тяжелые библиотеки загружаются в фоне после старта)
+from utils.charts import chart_generator
+
 # ИМПОРТ ОБРАБОТЧИКОВ КОМАНД
 # ===========================
 # Каждый обработчик отвечает за определенную часть функционала:
@@ -34,6 +49,302 @@ from handlers.diary import router as diary_router      # Дневник эмоц
 from handlers.analytics import router as analytics_router  # Аналитика и графики
 from handlers.tags import router as tags_router        # Управление тегами
 from handlers.settings import router as settings_router # Настройки пользователя
+from handlers.admin import router as admin_router      # Профилирование (только ADMIN_IDS)
+from utils.callbacks import callbacks                   # Кнопки всех разделов (таблица действий)
+
+# Многопроцессная обработка обновлений
+from utils.workers import WorkerPool, UserOrderedRunner, extract_user_id, send_result
+
+# Метрики производительности (время обработчиков, запросов к БД и Telegram)
+from utils.metrics import start_metrics_server
+from utils.middlewares import setup_middlewares, TelegramRequestMetrics, DatabaseFlushMiddleware
+from utils.profiling import install_signal_handlers, run_command, format_command_results, process_name
+
+def create_bot(token: str = None, session=None) -> Bot:
+    """
+    СОЗДАНИЕ БОТА
+    =============
+
+    Bot - это основной объект для связи с Telegram API.
+    ParseMode.HTML позволяет использовать HTML-форматирование в сообщениях.
+    token и session нужны нагрузочному тесту (benchmarks/bench_e2e.py),
+    который направляет запросы бота в локальную заглушку Bot API.
+    Воркеры получают адрес сервера Bot API из config.BOT_API_URL.
+    """
+    if session is None and config.BOT_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.BOT_API_URL))
+
+    bot = Bot(
+        token=token or config.BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+    # Замер времени каждого запроса к Telegram (отправка сообщений, фото)
+    bot.session.middleware(TelegramRequestMetrics())
+    # Записи обновления фиксируются до ожидания ответа Telegram
+    bot.session.middleware(DatabaseFlushMiddleware())
+
+    return bot
+
+def create_dispatcher() -> Dispatcher:
+    """
+    СОЗДАНИЕ ДИСПЕТЧЕРА
+    ===================
+
+    Dispatcher (диспетчер) - это "мозг" бота.
+    Он распределяет входящие сообщения по обработчикам.
+    Каждый обработчик отвечает за определенные команды или действия.
+    """
+    dp = Dispatcher()
+
+    dp.include_router(admin_router)      # /profile, /slowlog для администраторов
+    dp.include_router(start_router)      # Команды /start, /help
+    dp.include_router(mood_router)       # Запись настроения
+    dp.include_router(diary_router)      # Дневник эмоций
+    dp.include_router(analytics_router)  # Аналитика и графики
+    dp.include_router(tags_router)       # Управление тегами
+    dp.include_router(settings_router)   # Настройки пользователя
+    # Нажатия inline кнопок всех разделов: обработчик ищется по действию из
+    # callback_data в таблице, которую заполняют модули handlers
+    dp.include_router(callbacks.router)
+
+    # Сессия базы на обновление и метрики времени работы обработчиков
+    setup_middlewares(dp)
+
+    # Действия при запуске и остановке polling
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    return dp
+
+def start_charts_warm_up():
+    """
+    ФОНОВЫЙ ПРОГРЕВ БИБЛИОТЕК ГРАФИКОВ
+    ==================================
+
+    matplotlib и numpy загружаются несколько секунд.
+    Чтобы бот начал отвечать сразу, загружаем их в отдельном потоке,
+    пока бот уже обрабатывает сообщения.
+    """
+    global _warm_up_task
+
+    if not config.CHARTS_WARM_UP:
+        return None
+    # Храним ссылку на задачу, иначе ее может удалить сборщик мусора
+    _warm_up_task = asyncio.create_task(asyncio.to_thread(chart_generator.warm_up))
+    return _warm_up_task
+
+# Фоновая задача прогрева графиков (см. start_charts_warm_up)
+_warm_up_task = None
+
+# HTTP сервер метрик (см. on_startup)
+_metrics_runner = None
+
+# РЕЖИМ НЕСКОЛЬКИХ ВОРКЕРОВ
+# =========================
+# Один процесс Python использует только одно ядро процессора.
+# Чтобы графики и экспорт одних пользователей не тормозили других,
+# главный процесс (супервизор) только получает обновления от Telegram
+# и раздает их процессам-воркерам. Все обновления одного пользователя
+# попадают в один воркер, поэтому порядок их обработки сохраняется.
+# Общая база данных работает в режиме WAL (см. DatabaseManager).
+
+# Паузы между повторами getUpdates - как у dp.start_polling
+SUPERVISOR_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+
+async def get_updates_with_retry(bot: Bot, offset: int, backoff: Backoff) -> list:
+    """getUpdates, который повторяется при ошибках сети и сервера Telegram
+
+    Как и dp.start_polling, супервизор не останавливается из-за временной
+    недоступности Telegram: паузы между попытками растут (backoff), после
+    успешного запроса сбрасываются. Цикл прерывает только отмена задачи.
+    """
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30)
+        except TelegramRetryAfter as e:
+            logger.warning("Telegram просит повторить getUpdates через %s с", e.retry_after)
+            await asyncio.sleep(e.retry_after)
+            continue
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logger.error("Не удалось получить обновления - %s: %s", type(e).__name__, e)
+            logger.warning("Повтор через %.1f с (попытка %s)", backoff.next_delay, backoff.counter + 1)
+            await backoff.asleep()
+            continue
+
+        if backoff.counter:
+            logger.info("Соединение с Telegram восстановлено (попыток: %s)", backoff.counter)
+            backoff.reset()
+        return updates
+
+async def run_supervisor(bot: Bot, workers: int):
+    """Получение обновлений и распределение их по воркерам"""
+    pool = WorkerPool(workers, worker_main)
+    pool.start()
+    loop = asyncio.get_running_loop()
+    backoff = Backoff(SUPERVISOR_BACKOFF)
+
+    # /profile, /slowlog и сигналы супервизору действуют на все процессы
+    control = asyncio.create_task(run_control(bot, pool))
+    install_signal_handlers(
+        loop, send_command=lambda command: pool.control_queue.put({'control': command, 'chat_id': None})
+    )
+
+    offset = None
+    try:
+        while True:
+            updates = await get_updates_with_retry(bot, offset, backoff)
+
+            for update in updates:
+                # Если очередь воркера заполнена, отправка ждет в потоке:
+                # цикл событий (планировщик, метрики) при этом не останавливается
+                await loop.run_in_executor(
+                    None, pool.submit, update.model_dump(mode="json", by_alias=True, exclude_none=True)
+                )
+                offset = update.update_id + 1
+    finally:
+        control.cancel()
+        await asyncio.gather(control, return_exceptions=True)
+        # Воркеры дорабатывают уже полученные обновления и завершаются
+        await loop.run_in_executor(None, pool.stop)
+        await bot.session.close()
+
+# Сколько супервизор ждет ответы процессов сверх длительности команды (секунды)
+CONTROL_TIMEOUT = 30
+
+async def run_control(bot: Bot, pool: WorkerPool):
+    """Выполнение команд администратора во всех процессах
+
+    Обновление с /profile или /slowlog попадает только в один воркер.
+    Он передает команду супервизору (utils.workers.send_command), а тот
+    рассылает ее всем воркерам, выполняет сам и, собрав результаты
+    (или дождавшись CONTROL_TIMEOUT), отвечает администратору.
+    """
+    loop = asyncio.get_running_loop()
+    pending = {}  # номер команды -> команда, чат, ожидаемые процессы, результаты
+    local_tasks = set()
+    next_id = 0
+
+    while True:
+        try:
+            message = await loop.run_in_executor(None, partial(pool.control_queue.get, timeout=1))
+        except Empty:
+            message = {}
+
+        if 'control' in message:
+            next_id += 1
+            command = dict(message['control'], id=next_id)
+            pending[next_id] = {
+                'command': command,
+                'chat_id': message['chat_id'],
+                'expected': [process_name()] + [f"{p.name} (pid {p.pid})" for p in pool.processes],
+                'results': [],
+                'deadline': loop.time() + command.get('seconds', 0) + CONTROL_TIMEOUT,
+            }
+            await loop.run_in_executor(None, pool.broadcast, command)
+            task = asyncio.create_task(run_local_command(pool, command))
+            local_tasks.add(task)
+            task.add_done_callback(local_tasks.discard)
+        elif message.get('id') in pending:
+            pending[message['id']]['results'].append(message['result'])
+
+        for command_id, entry in list(pending.items()):
+            if len(entry['results']) >= len(entry['expected']) or loop.time() > entry['deadline']:
+                del pending[command_id]
+                await reply_command(bot, entry)
+
+async def execute_command(command: dict) -> dict:
+    """Выполнение команды в текущем процессе в отдельном потоке"""
+    try:
+        return await asyncio.to_thread(run_command, command)
+    except Exception as e:
+        logger.error("Ошибка команды %s: %s", command['action'], e)
+        return {'process': process_name(), 'error': str(e)}
+
+async def run_local_command(pool: WorkerPool, command: dict):
+    """Выполнение команды в самом супервизоре (результат - в общую очередь)"""
+    pool.control_queue.put({'id': command['id'], 'result': await execute_command(command)})
+
+async def reply_command(bot: Bot, entry: dict):
+    """Ответ администратору: какие процессы выполнили команду и где их профили"""
+    answered = {result['process'] for result in entry['results']}
+    missing = [name for name in entry['expected'] if name not in answered]
+    text = format_command_results(entry['command'], entry['results'], missing)
+    logger.info(text)
+
+    # Команда по сигналу: результат только в логе
+    if entry['chat_id'] is None:
+        return
+
+    try:
+        await bot.send_message(entry['chat_id'], text)
+        for result in entry['results']:
+            if 'path' in result:
+                await bot.send_document(entry['chat_id'], FSInputFile(result['path']),
+                                        caption=f"🔥 {result['process']}")
+    except Exception as e:
+        logger.error("Не удалось отправить результат команды %s: %s", entry['command']['action'], e)
+
+def worker_main(index: int, queue):
+    """Точка входа процесса-воркера (запускается через WorkerPool)"""
+    asyncio.run(run_worker(index, queue))
+
+async def run_worker(index: int, queue):
+    """Обработка обновлений, полученных от супервизора"""
+    logger.info("👷 Воркер %s запущен", index)
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    # Обновлений в обработке не больше, чем помещается в очередь воркера
+    runner = UserOrderedRunner(limit=config.WORKER_QUEUE_SIZE)
+    loop = asyncio.get_running_loop()
+    commands = set()  # команды супервизора, которые выполняются в потоках
+
+    # Напоминания пользователей воркера живут в его планировщике: их
+    # меняют обработчики настроек этого же воркера. Фоновые задачи
+    # (паттерны, инсайты) запускает только супервизор, иначе они бы
+    # дублировались. Метрики у каждого воркера свои, поэтому и порт отдельный
+    await on_startup(
+        background_jobs=False,
+        metrics_port=config.METRICS_PORT + index + 1 if config.METRICS_PORT else 0
+    )
+
+    try:
+        while True:
+            # Чтение из очереди блокирующее, поэтому выполняем его в потоке
+            update = await loop.run_in_executor(None, queue.get)
+            if update is None:
+                break
+
+            if 'control' in update:
+                # Профилирование идет в потоке, обновления продолжают обрабатываться
+                task = asyncio.create_task(run_worker_command(update['control']))
+                commands.add(task)
+                task.add_done_callback(commands.discard)
+                continue
+
+            await runner.submit(
+                extract_user_id(update),
+                process_raw_update(dp, bot, update)
+            )
+
+        await runner.drain()
+    finally:
+        await on_shutdown()
+        await bot.session.close()
+        logger.info("👷 Воркер %s остановлен", index)
+
+async def run_worker_command(command: dict):
+    """Выполнение команды супервизора в воркере"""
+    send_result(command['id'], await execute_command(command))
+
+async def process_raw_update(dp: Dispatcher, bot: Bot, update: dict):
+    """Обработка одного обновления внутри воркера"""
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception as e:
+        logger.error("Ошибка при обработке обновления %s: %s", update.get('update_id'), e, exc_info=True)
 
 async def main():
     """
@@ -44,12 +355,16 @@ async def main():
     1. Проверяет наличие токена
     2. Создает бота и диспетчера
     3. Регистрирует все обработчики команд
-    4. Запускает планировщик напоминаний
+    4. Запускает базу данных и планировщик напоминаний (on_startup)
     5. Начинает polling для получения сообщений от Telegram
+       (или запускает супервизор с воркерами, если WORKERS > 1)
 
     Polling - это постоянное подключение к серверам Telegram
     для получения новых сообщений от пользователей.
     """
+    # Логи пишет фоновый поток (в воркерах логирование настраивает WorkerPool)
+    setup_logging(config)
+
     try:
         logger.info("🚀 Начинаем инициализацию MoodTracker Bot...")
 
@@ -68,41 +383,23 @@ async def main():
 
         # ШАГ 2: СОЗДАНИЕ БОТА
         # ===================
-        # Bot - это основной объект для связи с Telegram API
-        # ParseMode.HTML позволяет использовать HTML-форматирование в сообщениях
         logger.info("🤖 Инициализация Telegram бота...")
-        bot = Bot(
-            token=config.BOT_TOKEN,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-        )
+        bot = create_bot()
         logger.info("✅ Бот инициализирован успешно")
 
-        # ШАГ 3: СОЗДАНИЕ ДИСПЕТЧЕРА
-        # =========================
-        # Dispatcher (диспетчер) - это "мозг" бота
-        # Он распределяет входящие сообщения по обработчикам
-        logger.info("📋 Настройка диспетчера команд...")
-        dp = Dispatcher()
-
-        # ШАГ 4: РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
-        # ===============================
-        # Подключаем все модули-обработчики к диспетчеру
-        # Каждый обработчик отвечает за определенные команды или действия
-        logger.info("🔗 Регистрация хендлеров...")
-        dp.include_router(start_router)      # Команды /start, /help
-        dp.include_router(mood_router)       # Запись настроения
-        dp.include_router(diary_router)      # Дневник эмоций
-        dp.include_router(analytics_router)  # Аналитика и графики
-        dp.include_router(tags_router)       # Управление тегами
-        dp.include_router(settings_router)   # Настройки пользователя
-        logger.info("✅ Все хендлеры зарегистрированы")
-
-        # ШАГ 5: ЗАПУСК ПЛАНИРОВЩИКА НАПОМИНАНИЙ
-        # ======================================
-        # Планировщик отправляет регулярные напоминания пользователям
-        logger.info("⏰ Запуск планировщика напоминаний...")
-        await reminder_scheduler.start_scheduler()
-        logger.info("✅ Планировщик напоминаний запущен")
+        # ШАГ 3-4: СОЗДАНИЕ ДИСПЕТЧЕРА И РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
+        # ======================================================
+        # В режиме нескольких воркеров диспетчер создается в каждом воркере
+        if config.WORKERS <= 1:
+            logger.info("📋 Настройка диспетчера команд...")
+            dp = create_dispatcher()
+            logger.info("✅ Все хендлеры зарегистрированы")
+
+        # ШАГ 5: БАЗА ДАННЫХ И ПЛАНИРОВЩИК НАПОМИНАНИЙ
+        # ============================================
+        # Выполняются в on_startup: при polling его вызывает диспетчер,
+        # в режиме супервизора - мы сами (графики супервизор не строит,
+        # а кэш чтения базы ему не подходит: данные меняют воркеры)
 
         # ШАГ 6: ЗАПУСК БОТА
         # ==================
@@ -116,8 +413,18 @@ async def main():
         # ==============
         # Начинаем постоянное подключение к Telegram для получения сообщений
         # Бот будет работать бесконечно, пока не будет остановлен
-        logger.info("🔄 Запуск polling...")
-        await dp.start_polling(bot)
+        if config.WORKERS > 1:
+            # Режим супервизора: этот процесс только получает обновления,
+            # а обрабатывают их воркеры (см. run_supervisor)
+            logger.info("🔄 Запуск супервизора с %s воркерами...", config.WORKERS)
+            await on_startup(reminders=False, charts=False, read_cache=False)
+            try:
+                await run_supervisor(bot, config.WORKERS)
+            finally:
+                await on_shutdown()
+        else:
+            logger.info("🔄 Запуск polling...")
+            await dp.start_polling(bot)
 
     # ОБРАБОТКА ИСКЛЮЧЕНИЙ
     # ===================
@@ -130,43 +437,72 @@ async def main():
 
     except Exception as e:
         # Любая другая неожиданная ошибка
-        logger.error(f"💥 Критическая ошибка при запуске бота: {e}", exc_info=True)
+        logger.error("💥 Критическая ошибка при запуске бота: %s", e, exc_info=True)
         print(f"❌ Критическая ошибка: {e}")
         print("Подробная информация записана в лог-файл")
 
-    finally:
-        # ЭТОТ КОД ВЫПОЛНИТСЯ В ЛЮБОМ СЛУЧАЕ
-        # Даже если произошла ошибка или пользователь остановил бота
-
-        # Остановка планировщика напоминаний
-        logger.info("🔄 Остановка планировщика напоминаний...")
-        try:
-            await reminder_scheduler.stop_scheduler()
-            logger.info("✅ Планировщик остановлен")
-        except Exception as e:
-            logger.error(f"❌ Ошибка при остановке планировщика: {e}")
-
-async def on_startup():
+async def on_startup(scheduler: bool = True, charts: bool = True, metrics_port: int = None,
+                     read_cache: bool = True, reminders: bool = True, background_jobs: bool = True):
     """
     ДЕЙСТВИЯ ПРИ ЗАПУСКЕ БОТА
     =========================
 
-    Эта функция вызывается автоматически при запуске бота.
-    Здесь можно выполнить подготовительные действия:
-    - Инициализация базы данных
-    - Загрузка настроек
-    - Подготовка файлов и папок
+    Эта функция вызывается автоматически при запуске polling
+    (а в режиме воркеров - явно в супервизоре и каждом воркере).
+    Импорт модулей бота ничего не создает, поэтому все тяжелые
+    объекты инициализируются здесь:
+    - База данных (создание таблиц)
+    - Исправления данных из fixes.py
+    - Планировщик напоминаний (scheduler=False - не запускать,
+      reminders=False - без напоминаний из базы, background_jobs=False -
+      без фонового поиска паттернов и расчета инсайтов)
+    - Фоновая загрузка библиотек графиков (charts=False - не загружать)
+    - Кэш чтения базы (read_cache=False - выключить в процессе, который
+      сам не обрабатывает обновления и не узнает об изменениях данных)
+    - HTTP эндпоинт метрик (по умолчанию на порту config.METRICS_PORT)
+    - Сигналы профилирования (SIGUSR1, SIGUSR2)
     """
+    global _metrics_runner
+
     try:
         logger.info("Выполнение действий при запуске...")
 
-        # База данных инициализируется автоматически при импорте db_manager
-        # Здесь можно добавить дополнительные действия при запуске
+        # Создание менеджера базы данных и таблиц
+        db_manager.resolve()
+        if not read_cache:
+            db_manager.read_cache.resize(0)
+
+        from fixes import init_fixes
+        init_fixes()
+
+        # Планировщик отправляет регулярные напоминания пользователям
+        if scheduler:
+            logger.info("⏰ Запуск планировщика напоминаний...")
+            await reminder_scheduler.start_scheduler(reminders=reminders)
+            logger.info("✅ Планировщик напоминаний запущен")
+
+            # Паттерны настроения и инсайты пересчитываются в фоне тем же планировщиком
+            if background_jobs:
+                pattern_miner.schedule(reminder_scheduler.scheduler)
+                insights_batch.schedule(reminder_scheduler.scheduler)
+
+        # Графики строятся в этом же процессе - прогреваем библиотеки в фоне
+        if charts:
+            start_charts_warm_up()
+
+        if metrics_port is None:
+            metrics_port = config.METRICS_PORT
+        if metrics_port:
+            _metrics_runner = await start_metrics_server(config.METRICS_HOST, metrics_port)
+
+        # SIGUSR1 - профилирование, SIGUSR2 - журнал медленных запросов
+        install_signal_handlers(asyncio.get_running_loop())
 
         logger.info("Действия при запуске выполнены успешно")
 
     except Exception as e:
-        logger.error(f"Ошибка при выполнении действий при запуске: {e}")
+        logger.error("Ошибка при выполнении действий при запуске: %s", e)
+        raise
 
 async def on_shutdown():
     """
@@ -179,16 +515,26 @@ async def on_shutdown():
     - Закрытие соединений
     - Очистка временных файлов
     """
+    global _metrics_runner
+
     try:
         logger.info("Выполнение действий при остановке...")
 
-        # Здесь можно добавить код для корректного завершения работы
-        # Например, сохранение состояния пользователей, закрытие соединений и т.д.
+        # Остановка планировщика напоминаний (если он был запущен)
+        if reminder_scheduler.initialized and reminder_scheduler.scheduler.running:
+            logger.info("🔄 Остановка планировщика напоминаний...")
+            await reminder_scheduler.stop_scheduler()
+            logger.info("✅ Планировщик остановлен")
+
+        # Остановка HTTP сервера метрик
+        if _metrics_runner is not None:
+            await _metrics_runner.cleanup()
+            _metrics_runner = None
 
         logger.info("Действия при остановке выполнены успешно")
 
     except Exception as e:
-        logger.error(f"Ошибка при выполнении действий при остановке: {e}")
+        logger.error("Ошибка при выполнении действий при остановке: %s", e)
 
 # ЗАЩИТА ОТ ЗАПУСКА В КАЧЕСТВЕ МОДУЛЯ
 # ===================================
@@ -199,19 +545,20 @@ if __name__ == "__main__":
         # ПРОВЕРКА ЗАВИСИМОСТЕЙ
         # =====================
         # Перед запуском бота проверяем, установлены ли все необходимые библиотеки
-        # Это помогает избежать ошибок из-за отсутствия модулей
+        # Это помогает избежать ошибок из-за отсутствия модулей.
+        # find_spec только ищет модуль, не импортируя его, поэтому проверка
+        # не тратит секунды на загрузку matplotlib
         import sys
+        from importlib.util import find_spec
 
         # Список обязательных модулей для работы бота
-        required_modules = ['aiogram', 'matplotlib', 'pandas', 'seaborn']
+        required_modules = ['aiogram', 'matplotlib', 'numpy']
 
         missing_modules = []  # Список отсутствующих модулей
 
         # Проверяем каждый модуль
         for module in required_modules:
-            try:
-                __import__(module)  # Пытаемся импортировать модуль
-            except ImportError:
+            if find_spec(module) is None:
                 missing_modules.append(module)  # Добавляем в список отсутствующих
 
         # Если есть отсутствующие модули, выводим ошибку и останавливаемся
@@ -231,6 +578,6 @@ if __name__ == "__main__":
         # КРИТИЧЕСКАЯ ОБРАБОТКА ОШИБОК
         # =============================
         # Если произошла непредвиденная ошибка на этапе запуска
-        logger.critical(f"Необработанная ошибка: {e}")
+        logger.critical("Необработанная ошибка: %s", e)
         print(f"❌ Критическая ошибка: {e}")
         sys.exit(1)  # Завершаем программу с кодом ошибки
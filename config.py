@@ -14,6 +14,8 @@ import os
 import logging
 from dotenv import load_dotenv
 
+from utils.logs import JsonFormatter, file_handler, forward_to, install, parse_sampling, SamplingFilter
+
 # Загружаем переменные окружения из файла .env
 # Это безопасный способ хранения секретных данных
 load_dotenv()
@@ -23,7 +25,7 @@ load_dotenv()
 # Логирование - это запись всех событий, происходящих в программе
 # Это помогает отслеживать ошибки и понимать, что происходит в боте
 
-def setup_logging():
+def setup_logging(config, log_queue=None):
     """
     Настройка системы логирования для всего бота
 
@@ -38,30 +40,19 @@ def setup_logging():
     - WARNING: предупреждения
     - INFO: информационные сообщения
     - DEBUG: детальная отладочная информация
-    """
-    logging.basicConfig(
-        # Уровень логирования - INFO означает, что будут записываться
-        # все сообщения INFO, WARNING, ERROR
-        level=logging.INFO,
-
-        # Формат сообщения в логах
-        # %(asctime)s - время события
-        # %(levelname)s - уровень (INFO, ERROR и т.д.)
-        # %(name)s - имя модуля, который отправил сообщение
-        # %(message)s - само сообщение
-        format='%(asctime)s | %(levelname)-8s | %(name)-20s | %(message)s',
 
-        # Формат даты и времени
-        datefmt='%Y-%m-%d %H:%M:%S',
+    Обработчики бота только ставят запись в очередь, а в файл и консоль
+    ее пишет фоновый поток (utils.logs), поэтому медленный диск не
+    задерживает ответы пользователям. Настройки - в разделе ЛОГИРОВАНИЕ
+    класса Config.
 
-        # Куда записывать логи (в файл И на экран консоли)
-        handlers=[
-            # Запись в файл с кодировкой UTF-8 для поддержки русского языка
-            logging.FileHandler('bot.log', encoding='utf-8'),
-            # Вывод на экран консоли
-            logging.StreamHandler()
-        ]
-    )
+    Вызывается при запуске бота (bot.main) и воркера (utils.workers):
+    импорт config не запускает поток записи. log_queue - очередь
+    супервизора, которому воркер передает свои записи.
+    """
+    # Частые события (нажатия кнопок) записываются выборочно
+    for name, rate in parse_sampling(config.LOG_SAMPLING).items():
+        logging.getLogger(name).addFilter(SamplingFilter(rate))
 
     # Устанавливаем уровень WARNING для сторонних библиотек
     # чтобы не засорять логи их техническими сообщениями
@@ -69,16 +60,39 @@ def setup_logging():
     logging.getLogger('asyncio').setLevel(logging.WARNING)     # Асинхронное программирование
     logging.getLogger('urllib3').setLevel(logging.WARNING)      # HTTP запросы
 
-    # Создаем отдельный логгер специально для нашего бота
-    logger = logging.getLogger('mood_tracker')
-    logger.setLevel(logging.INFO)
+    if log_queue is not None:
+        # Файл лога пишет и ротирует только супервизор
+        forward_to(log_queue, level=logging.INFO)
+        return logger
 
+    if config.LOG_FORMAT == 'json':
+        # Одна запись - одна строка JSON (для сборщиков логов)
+        formatter = JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S')
+    else:
+        # Формат сообщения в логах
+        # %(asctime)s - время события
+        # %(levelname)s - уровень (INFO, ERROR и т.д.)
+        # %(name)s - имя модуля, который отправил сообщение
+        # %(message)s - само сообщение
+        formatter = logging.Formatter(
+            '%(asctime)s | %(levelname)-8s | %(name)-20s | %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+
+    # Куда записывать логи (на экран консоли и в файл с ротацией)
+    handlers = [logging.StreamHandler()]
+    if config.LOG_FILE:
+        handlers.append(file_handler(
+            config.LOG_FILE, config.LOG_ROTATE, config.LOG_MAX_BYTES, config.LOG_BACKUP_COUNT
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Уровень логирования - INFO означает, что будут записываться
+    # все сообщения INFO, WARNING, ERROR
+    install(handlers, level=logging.INFO)
     return logger
 
-# Глобальный логгер для всего проекта
-# Теперь его можно импортировать в любом файле: from config import logger
-logger = setup_logging()
-
 class Config:
     """
     КЛАСС КОНФИГУРАЦИИ БОТА
@@ -99,11 +113,78 @@ class Config:
     # Хранится в файле .env для безопасности
     BOT_TOKEN = os.getenv('BOT_TOKEN')
 
+    # Адрес сервера Bot API (пусто - api.telegram.org). Нужен для своего
+    # сервера telegram-bot-api и нагрузочных тестов с заглушкой Bot API
+    BOT_API_URL = os.getenv('BOT_API_URL', '')
+
     # НАСТРОЙКИ БАЗЫ ДАННЫХ
     # ======================
     # SQLite база данных для хранения всех данных пользователей
     # Файл создается автоматически при первом запуске
-    DATABASE_PATH = 'mood_tracker.db'
+    DATABASE_PATH = os.getenv('DATABASE_PATH', 'mood_tracker.db')
+
+    # Сколько секунд соединение ждет, если база занята другим процессом
+    # (актуально при запуске нескольких воркеров)
+    DATABASE_BUSY_TIMEOUT = 10
+
+    # Сколько результатов методов чтения (статистика, настройки, паттерны,
+    # экспорт) хранится в памяти до изменения данных пользователя (0 - без кэша)
+    DB_READ_CACHE_SIZE = int(os.getenv('DB_READ_CACHE_SIZE', '4096'))
+
+    # Сколько id зарегистрированных пользователей процесс помнит, чтобы
+    # не обращаться к базе при каждом обновлении (см. ensure_user)
+    KNOWN_USERS_CACHE_SIZE = int(os.getenv('KNOWN_USERS_CACHE_SIZE', '100000'))
+
+    # НАСТРОЙКИ МНОГОПРОЦЕССНОЙ ОБРАБОТКИ
+    # ====================================
+    # Количество процессов-воркеров для обработки обновлений.
+    # 1 - обычный режим (один процесс), больше 1 - режим супервизора:
+    # главный процесс получает обновления и раздает их воркерам по user_id
+    WORKERS = int(os.getenv('WORKERS', '1'))
+
+    # Максимальное количество обновлений в очереди одного воркера
+    WORKER_QUEUE_SIZE = 1000
+
+    # Номер текущего воркера (0 - главный процесс или первый воркер).
+    # Выставляется автоматически при запуске воркера
+    WORKER_INDEX = 0
+
+    # МЕТРИКИ ПРОИЗВОДИТЕЛЬНОСТИ
+    # ===========================
+    # Порт HTTP-эндпоинта /metrics в формате Prometheus (0 - выключен).
+    # В режиме нескольких воркеров воркер N использует порт METRICS_PORT + N + 1
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+    # ПРОФИЛИРОВАНИЕ
+    # ==============
+    # Telegram ID администраторов через запятую (команды /profile и /slowlog)
+    ADMIN_IDS = {int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()}
+
+    # Порог журнала медленных SQL-запросов в миллисекундах (0 - выключен).
+    # Включается и во время работы: /slowlog или сигнал SIGUSR2
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '0'))
+
+    # Профилировщик: длительность по сигналу SIGUSR1 (секунды),
+    # интервал между снимками стеков и папка для результатов
+    PROFILE_SECONDS = 30
+    PROFILE_INTERVAL = 0.005
+    PROFILE_DIR = 'profiles'
+
+    # ФОНОВЫЙ ПОИСК ПАТТЕРНОВ
+    # =======================
+    # Как часто (в минутах) пересчитываются паттерны пользователей с новыми
+    # записями, минимальное число записей с тегом или парой тегов
+    # и сколько паттернов каждого вида сохраняется на пользователя
+    PATTERN_MINING_INTERVAL = int(os.getenv('PATTERN_MINING_INTERVAL', '10'))
+    PATTERN_MIN_SUPPORT = 5
+    PATTERN_MAX_PER_KIND = 10
+
+    # НОЧНОЙ РАСЧЕТ ИНСАЙТОВ
+    # ======================
+    # Час запуска (по времени сервера) и размер порции записей при чтении базы
+    INSIGHTS_HOUR = int(os.getenv('INSIGHTS_HOUR', '3'))
+    INSIGHTS_CHUNK_ROWS = 100_000
 
     # ЭМОДЗИ ДЛЯ ОЦЕНКИ НАСТРОЕНИЯ
     # ===============================
@@ -154,6 +235,45 @@ class Config:
         'terrible': '#F44336'    # Красный - очень плохо
     }
 
+    # Загружать библиотеки графиков в фоне сразу после запуска.
+    # Если выключить, они загрузятся при первом запросе графика
+    CHARTS_WARM_UP = os.getenv('CHARTS_WARM_UP', '1') == '1'
+
+    # Сколько графиков (и, в своей очереди, выгрузок CSV) может ждать
+    # построения. При полной очереди аналитика отвечает текстом (статистика
+    # и строка ▁▃▅█ вместо графика), а выгрузка присылается, когда будет
+    # готова. 0 - без ограничения
+    CHART_QUEUE_LIMIT = int(os.getenv('CHART_QUEUE_LIMIT', '8'))
+
+    # Сколько отчетов без графика (в общем пуле потоков) и отложенных
+    # выгрузок может ждать при перегрузке. Если заполнено и это, бот
+    # просит попробовать позже. 0 - без ограничения
+    OVERLOAD_QUEUE_LIMIT = int(os.getenv('OVERLOAD_QUEUE_LIMIT', '16'))
+
+    # РЕДАКТИРОВАНИЕ СООБЩЕНИЙ
+    # ========================
+    # Пауза (секунды) перед обновлением клавиатуры тегов: серия быстрых
+    # нажатий дает одно редактирование сообщения вместо нескольких
+    EDIT_DEBOUNCE_SECONDS = float(os.getenv('EDIT_DEBOUNCE_SECONDS', '0.4'))
+
+    # ЛОГИРОВАНИЕ
+    # ===========
+    # Файл лога (пустая строка - только консоль)
+    LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+
+    # Формат записей: text или json (одна запись - одна строка JSON)
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+    # Ротация файла: по размеру (size) или по времени (midnight, H, D -
+    # как when у TimedRotatingFileHandler). Хранится LOG_BACKUP_COUNT старых файлов
+    LOG_ROTATE = os.getenv('LOG_ROTATE', 'size')
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+    # Доля записей частых событий, попадающих в лог: "логгер=доля,...".
+    # Предупреждения и ошибки записываются всегда
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', 'mood_tracker.callbacks=0.1')
+
     # ОГРАНИЧЕНИЯ И ЛИМИТЫ
     # =====================
     # Максимальная длина текста в дневнике (символы)
@@ -213,3 +333,9 @@ class Config:
 # Создаем экземпляр класса Config для использования во всем проекте
 # Теперь можно импортировать: from config import config
 config = Config()
+
+# Глобальный логгер для всего проекта
+# Теперь его можно импортировать в любом файле: from config import logger
+# (куда попадают записи, настраивает setup_logging при запуске бота)
+logger = logging.getLogger('mood_tracker')
+logger.setLevel(logging.INFO)
@@ -1,33 +1,216 @@
 import sqlite3
+from contextvars import ContextVar
+from dataclasses import replace
 from datetime import datetime, date, time
+from itertools import chain, count
 from typing import List, Optional, Dict, Any
 from contextlib import contextmanager
 
-from .models import User, MoodEntry, Tag, MoodTag, UserSettings, MoodStats, MoodPattern
+from .models import (User, MoodEntry, MoodArrays, Tag, MoodTag, TagUsage, UserSettings,
+                     MoodStats, MoodPattern, MinedPattern, UserInsights)
 from config import config, logger
+from utils.cache import LRUSet, VersionedLRUCache, memoize_per_user
+from utils.container import LazySingleton
+from utils.metrics import InstrumentedConnection
+
+class SessionConnection(InstrumentedConnection):
+    """Соединение сессии: commit() методов DatabaseManager откладывается
+
+    Транзакцию фиксирует сама сессия (DatabaseSession.flush).
+    """
+
+    def commit(self):
+        pass
+
+    def flush(self):
+        super().commit()
+
+class DatabaseSession:
+    """Единица работы: одно соединение и одна транзакция на обновление Telegram
+
+    Открывается через DatabaseManager.session(). Пока сессия активна, все
+    методы DatabaseManager в том же контексте (задаче asyncio) работают на ее
+    соединении, а их записи фиксируются одним коммитом.
+    """
+
+    def __init__(self, manager: 'DatabaseManager', conn: SessionConnection):
+        self.manager = manager
+        self.conn = conn
+        # Пользователи, данные которых изменены в незафиксированной транзакции
+        self.changed_users = set()
+
+    def flush(self):
+        """Зафиксировать записи, сделанные с начала сессии или прошлого flush
+
+        Версии данных измененных пользователей меняются только после
+        коммита: иначе чтение с другого соединения (поток графиков,
+        другое обновление) успело бы сохранить в кэше старые данные
+        под новой версией.
+        """
+        if self.conn.in_transaction:
+            self.conn.flush()
+        for user_id in self.changed_users:
+            self.manager._advance_data_version(user_id)
+        self.changed_users.clear()
+
+    def rollback(self):
+        """Отменить незафиксированные записи
+
+        Версии не меняются: незафиксированные данные не попадали в кэш
+        (см. DatabaseManager.cache_allowed).
+        """
+        self.conn.rollback()
+        for user_id in self.changed_users:
+            # Регистрация тоже могла быть отменена
+            self.manager.known_users.discard(user_id)
+        self.changed_users.clear()
+
+# Активная сессия текущего контекста (у каждой задачи asyncio свой контекст)
+_current_session: ContextVar[Optional[DatabaseSession]] = ContextVar('db_session', default=None)
+
+def current_session() -> Optional[DatabaseSession]:
+    """Сессия, открытая в текущем контексте, или None"""
+    return _current_session.get()
+
+# Копирование результатов из кэша чтения (@memoize_per_user): вызывающий
+# код получает свой экземпляр и может его менять
+
+def _copy_entry(entry: Optional[MoodEntry]) -> Optional[MoodEntry]:
+    return MoodEntry(*entry._astuple()) if entry is not None else None
+
+def _copy_stats(stats: MoodStats) -> MoodStats:
+    return replace(stats, most_frequent_tags=list(stats.most_frequent_tags))
+
+def _copy_patterns(patterns: List[MoodPattern]) -> List[MoodPattern]:
+    return [replace(pattern) for pattern in patterns]
+
+def _copy_export(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [dict(entry) for entry in entries]
 
 class DatabaseManager:
     """Менеджер базы данных для MoodTracker Bot"""
 
-    def __init__(self, db_path: str = config.DATABASE_PATH):
+    # Столбцы, доступные в fetch_mood_columns: имя -> целочисленное выражение SQL
+    MOOD_COLUMNS = {
+        'id': 'id',
+        'mood_score': 'mood_score',
+        'entry_ordinal': 'entry_ordinal',
+        'created_ts': 'COALESCE(created_ts, -1)',
+        'has_diary': "COALESCE(diary_text, '') != ''",
+    }
+
+    def __init__(self, db_path: str = config.DATABASE_PATH,
+                 read_cache_size: int = config.DB_READ_CACHE_SIZE,
+                 known_users_size: int = config.KNOWN_USERS_CACHE_SIZE):
         self.db_path = db_path
+        # Версии данных пользователей: растут при каждой записи через методы
+        # этого класса. Методы чтения с @memoize_per_user кэшируют результат
+        # до смены версии. Все обновления пользователя обрабатывает один
+        # процесс (см. utils.workers), поэтому счетчика в памяти достаточно;
+        # процессу, который сам не пишет (супервизор), кэш нужно выключить
+        self._data_versions: Dict[int, int] = {}
+        self._version_counter = count(1)
+        self.read_cache = VersionedLRUCache(read_cache_size)
+        # Пользователи, которые точно есть в таблице users
+        self.known_users = LRUSet(known_users_size)
         self.init_database()
 
+    def data_version(self, user_id: int) -> int:
+        """Текущая версия данных пользователя"""
+        return self._data_versions.get(user_id, 0)
+
+    def cache_allowed(self, user_id: int) -> bool:
+        """Можно ли читать и сохранять кэш пользователя в текущем контексте
+
+        Нельзя, пока у сессии есть незафиксированные записи пользователя:
+        ее соединение их видит, а версия данных еще старая.
+        """
+        session = current_session()
+        return session is None or session.manager is not self or user_id not in session.changed_users
+
+    def _bump_data_version(self, user_id: int):
+        """Отметить изменение данных пользователя (сбрасывает его кэш)
+
+        Вызывается после commit(). Внутри сессии коммит откладывается,
+        и версия меняется при DatabaseSession.flush.
+        """
+        session = current_session()
+        if session is not None and session.manager is self:
+            session.changed_users.add(user_id)
+            return
+        self._advance_data_version(user_id)
+
+    def _advance_data_version(self, user_id: int):
+        # Общий счетчик: next() атомарен, и версия не повторится при гонке потоков
+        self._data_versions[user_id] = next(self._version_counter)
+
+    def _connect(self, factory=InstrumentedConnection, **kwargs) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=config.DATABASE_BUSY_TIMEOUT,
+                               factory=factory, **kwargs)
+        conn.row_factory = sqlite3.Row
+        # В режиме WAL полной синхронизации на каждый коммит не требуется
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
     @contextmanager
     def get_connection(self):
-        """Контекстный менеджер для соединения с БД"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Контекстный менеджер для соединения с БД
+
+        Соединение записывает время и количество строк каждого запроса
+        в метрики (см. utils.metrics). Внутри session() выдается соединение
+        сессии; ошибка метода отменяет все незафиксированные записи сессии,
+        чтобы обновление не сохранилось наполовину.
+        """
+        session = current_session()
+        if session is not None and session.manager is self:
+            try:
+                yield session.conn
+            except Exception:
+                session.rollback()
+                raise
+            return
+
+        conn = self._connect()
         try:
             yield conn
         finally:
             conn.close()
 
+    @contextmanager
+    def session(self):
+        """Единица работы: одно соединение и одна транзакция (см. DatabaseSession)
+
+        Записи фиксируются при выходе, при исключении отменяются. Вложенный
+        вызов использует уже открытую сессию.
+        """
+        session = current_session()
+        if session is not None and session.manager is self:
+            yield session
+            return
+
+        # Обработчик может вызвать метод из потока (asyncio.to_thread);
+        # вызовы внутри одного обновления идут последовательно
+        session = DatabaseSession(self, self._connect(SessionConnection, check_same_thread=False))
+        token = _current_session.set(session)
+        try:
+            yield session
+            session.flush()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            _current_session.reset(token)
+            session.conn.close()
+
     def init_database(self):
         """Инициализация базы данных"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
+            # Режим WAL позволяет нескольким процессам-воркерам читать базу
+            # параллельно с записью. Режим сохраняется в самом файле БД
+            cursor.execute('PRAGMA journal_mode = WAL')
+
             # Создание таблицы пользователей
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -35,7 +218,10 @@ class DatabaseManager:
                     username TEXT,
                     first_name TEXT,
                     registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    timezone TEXT DEFAULT 'UTC+3'
+                    timezone TEXT DEFAULT 'UTC+3',
+                    current_streak INTEGER NOT NULL DEFAULT 0,
+                    longest_streak INTEGER NOT NULL DEFAULT 0,
+                    last_entry_date DATE
                 )
             ''')
 
@@ -48,9 +234,13 @@ class DatabaseManager:
                     diary_text TEXT,
                     entry_date DATE,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    entry_ordinal INTEGER,
+                    created_ts INTEGER,
                     FOREIGN KEY (user_id) REFERENCES users (user_id)
                 )
             ''')
+            self._migrate_mood_entries(cursor)
+            self._migrate_user_streaks(cursor)
 
             # Создание таблицы тегов
             cursor.execute('''
@@ -75,6 +265,56 @@ class DatabaseManager:
                 )
             ''')
 
+            # Счетчики использования тегов каждым пользователем. Обновляются
+            # вместе с mood_tags, чтобы статистика тегов не требовала JOIN
+            # по всем записям пользователя
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS tag_usage (
+                    user_id INTEGER,
+                    tag_id INTEGER,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    mood_sum INTEGER NOT NULL DEFAULT 0,
+                    last_used DATE,
+                    PRIMARY KEY (user_id, tag_id),
+                    FOREIGN KEY (user_id) REFERENCES users (user_id),
+                    FOREIGN KEY (tag_id) REFERENCES tags (id)
+                )
+            ''')
+            self._migrate_tag_usage(cursor)
+
+            # Результаты фонового поиска паттернов (utils.mining): связки двух
+            # тегов (kind = 'pair') и влияние тега на следующий день ('lag')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS mined_patterns (
+                    user_id INTEGER,
+                    kind TEXT,
+                    tag_id INTEGER,
+                    other_tag_id INTEGER,
+                    support INTEGER,
+                    correlation REAL,
+                    ci_low REAL,
+                    ci_high REAL,
+                    lift REAL,
+                    mean_difference REAL,
+                    FOREIGN KEY (user_id) REFERENCES users (user_id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_mined_patterns_user
+                ON mined_patterns (user_id)
+            ''')
+
+            # Пользователи, чьи паттерны нужно пересчитать. changes растет при
+            # каждом изменении, поэтому запись, пришедшая во время пересчета,
+            # не потеряется (см. finish_pattern_mining)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pattern_mining_queue (
+                    user_id INTEGER PRIMARY KEY,
+                    changes INTEGER NOT NULL DEFAULT 1
+                )
+            ''')
+            self._migrate_pattern_mining(cursor)
+
             # Создание таблицы настроек пользователя
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS user_settings (
@@ -86,12 +326,169 @@ class DatabaseManager:
                 )
             ''')
 
+            # Инсайты пользователей, которые ночной расчет (utils.insights)
+            # считает для всех сразу. Даты - порядковые номера дней
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_insights (
+                    user_id INTEGER PRIMARY KEY,
+                    total_entries INTEGER,
+                    recent_average REAL,
+                    older_average REAL,
+                    trend TEXT,
+                    best_weekday INTEGER,
+                    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (user_id)
+                )
+            ''')
+
             # Добавление предустановленных тегов
             self._add_predefined_tags(cursor)
 
             conn.commit()
             logger.info("База данных инициализирована успешно")
 
+    def _migrate_mood_entries(self, cursor):
+        """Целочисленные столбцы дат в mood_entries (для fetch_mood_columns)
+
+        entry_ordinal - дата записи как date.toordinal(),
+        created_ts - время создания в секундах Unix (UTC, как CURRENT_TIMESTAMP).
+        В старые базы столбцы добавляются и заполняются один раз.
+        """
+        cursor.execute('PRAGMA table_info(mood_entries)')
+        existing = {row['name'] for row in cursor.fetchall()}
+
+        for column in ('entry_ordinal', 'created_ts'):
+            if column in existing:
+                continue
+            try:
+                cursor.execute(f'ALTER TABLE mood_entries ADD COLUMN {column} INTEGER')
+            except sqlite3.OperationalError as e:
+                # Столбец мог только что добавить параллельно запущенный воркер
+                if 'duplicate column' not in str(e):
+                    raise
+
+        # 1721424.5 - юлианская дата дня, предшествующего 0001-01-01,
+        # поэтому разность совпадает с date.toordinal()
+        cursor.execute('''
+            UPDATE mood_entries
+            SET entry_ordinal = CAST(julianday(entry_date) - 1721424.5 AS INTEGER)
+            WHERE entry_ordinal IS NULL AND entry_date IS NOT NULL
+        ''')
+        cursor.execute('''
+            UPDATE mood_entries
+            SET created_ts = CAST(strftime('%s', created_at) AS INTEGER)
+            WHERE created_ts IS NULL AND created_at IS NOT NULL
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mood_entries_user_ordinal
+            ON mood_entries (user_id, entry_ordinal)
+        ''')
+
+    def _migrate_user_streaks(self, cursor):
+        """Столбцы серий в users: добавляются в старые базы и заполняются по записям"""
+        cursor.execute('PRAGMA table_info(users)')
+        existing = {row['name'] for row in cursor.fetchall()}
+
+        columns = {
+            'current_streak': 'INTEGER NOT NULL DEFAULT 0',
+            'longest_streak': 'INTEGER NOT NULL DEFAULT 0',
+            'last_entry_date': 'DATE',
+        }
+        added = False
+        for column, definition in columns.items():
+            if column in existing:
+                continue
+            try:
+                cursor.execute(f'ALTER TABLE users ADD COLUMN {column} {definition}')
+                added = True
+            except sqlite3.OperationalError as e:
+                # Столбец мог только что добавить параллельно запущенный воркер
+                if 'duplicate column' not in str(e):
+                    raise
+
+        if added:
+            self.recompute_user_streaks(cursor)
+            logger.info("Серии записей пользователей заполнены по существующим записям")
+
+    @staticmethod
+    def recompute_user_streaks(cursor, first_user_id: int = None, last_user_id: int = None):
+        """Пересчитать серии пользователей по всем их записям
+
+        Нужен только для данных, записанных в обход save_mood_entry
+        (старые базы, генератор benchmarks/datagen.py). Серия - подряд идущие
+        дни с записями: день минус номер дня среди дней пользователя
+        одинаков внутри серии.
+        """
+        where, params = '', ()
+        if first_user_id is not None:
+            where, params = 'AND user_id BETWEEN ? AND ?', (first_user_id, last_user_id)
+
+        cursor.execute(f'''
+            WITH days AS (
+                SELECT DISTINCT user_id, entry_ordinal AS day
+                FROM mood_entries
+                WHERE entry_ordinal IS NOT NULL {where}
+            ),
+            runs AS (
+                SELECT user_id, COUNT(*) AS length, MAX(day) AS last_day,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY MAX(day) DESC) AS recency
+                FROM (
+                    SELECT user_id, day,
+                           day - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day) AS run
+                    FROM days
+                )
+                GROUP BY user_id, run
+            ),
+            streaks AS (
+                SELECT user_id,
+                       SUM(CASE WHEN recency = 1 THEN length END) AS current_streak,
+                       MAX(length) AS longest_streak,
+                       date(MAX(last_day) + 1721424.5) AS last_entry_date
+                FROM runs
+                GROUP BY user_id
+            )
+            UPDATE users
+            SET current_streak = streaks.current_streak,
+                longest_streak = streaks.longest_streak,
+                last_entry_date = streaks.last_entry_date
+            FROM streaks
+            WHERE users.user_id = streaks.user_id
+        ''', params)
+
+    def _migrate_tag_usage(self, cursor):
+        """Заполнить tag_usage по mood_tags в базах, созданных до этой таблицы"""
+        cursor.execute('''
+            SELECT NOT EXISTS (SELECT 1 FROM tag_usage) AND EXISTS (SELECT 1 FROM mood_tags)
+        ''')
+        if not cursor.fetchone()[0]:
+            return
+
+        cursor.execute('''
+            INSERT INTO tag_usage (user_id, tag_id, count, mood_sum, last_used)
+            SELECT me.user_id, mt.tag_id, COUNT(*), SUM(me.mood_score), MAX(me.entry_date)
+            FROM mood_tags mt
+            JOIN mood_entries me ON mt.mood_id = me.id
+            GROUP BY me.user_id, mt.tag_id
+        ''')
+        logger.info("Счетчики тегов заполнены для %s пар пользователь-тег", cursor.rowcount)
+
+    def _migrate_pattern_mining(self, cursor):
+        """Поставить в очередь поиска паттернов всех пользователей старой базы"""
+        cursor.execute('''
+            SELECT NOT EXISTS (SELECT 1 FROM mined_patterns)
+               AND NOT EXISTS (SELECT 1 FROM pattern_mining_queue)
+               AND EXISTS (SELECT 1 FROM mood_tags)
+        ''')
+        if not cursor.fetchone()[0]:
+            return
+
+        cursor.execute('''
+            INSERT OR IGNORE INTO pattern_mining_queue (user_id)
+            SELECT DISTINCT user_id FROM mood_entries
+        ''')
+        logger.info("В очередь поиска паттернов поставлено пользователей: %s", cursor.rowcount)
+
     def _add_predefined_tags(self, cursor):
         """Добавление предустановленных тегов"""
         for category, tags in config.PREDEFINED_TAGS.items():
@@ -105,44 +502,57 @@ class DatabaseManager:
 
     def get_or_create_user(self, user_id: int, username: str = None,
                           first_name: str = None) -> User:
-        """Получить или создать пользователя"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        """Получить или создать пользователя
 
-            # Проверяем существует ли пользователь
-            cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-            row = cursor.fetchone()
+        Новый пользователь создается, у существующего обновляются имя и
+        username (None не затирает сохраненное значение) - одним запросом;
+        если менять нечего, строка читается вторым.
+        Строка настроек появляется при первом изменении настроек, до этого
+        get_user_settings возвращает значения по умолчанию.
 
-            if row:
-                return User(
-                    user_id=row['user_id'],
-                    username=row['username'],
-                    first_name=row['first_name'],
-                    registration_date=datetime.fromisoformat(row['registration_date']),
-                    timezone=row['timezone']
-                )
-
-            # Создаем нового пользователя
-            cursor.execute('''
+        Версия данных (и кэш чтения пользователя) меняется, только если
+        строка добавлена или изменена: повторный /start кэш не сбрасывает.
+        """
+        with self.get_connection() as conn:
+            # Без изменений UPDATE не выполняется и RETURNING не возвращает строку
+            row = conn.execute('''
                 INSERT INTO users (user_id, username, first_name)
                 VALUES (?, ?, ?)
-            ''', (user_id, username, first_name))
-
-            # Создаем настройки по умолчанию
-            cursor.execute('''
-                INSERT INTO user_settings (user_id)
-                VALUES (?)
-            ''', (user_id,))
-
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = COALESCE(excluded.username, username),
+                    first_name = COALESCE(excluded.first_name, first_name)
+                WHERE username IS NOT COALESCE(excluded.username, username)
+                   OR first_name IS NOT COALESCE(excluded.first_name, first_name)
+                RETURNING user_id, username, first_name, registration_date, timezone
+            ''', (user_id, username, first_name)).fetchone()
             conn.commit()
 
-            return User(
-                user_id=user_id,
-                username=username,
-                first_name=first_name,
-                registration_date=datetime.now(),
-                timezone=config.DEFAULT_TIMEZONE
-            )
+            changed = row is not None
+            if not changed:
+                row = conn.execute('''
+                    SELECT user_id, username, first_name, registration_date, timezone
+                    FROM users WHERE user_id = ?
+                ''', (user_id,)).fetchone()
+
+        if changed:
+            self._bump_data_version(user_id)
+        self.known_users.add(user_id)
+
+        return User(
+            user_id=row['user_id'],
+            username=row['username'],
+            first_name=row['first_name'],
+            registration_date=datetime.fromisoformat(row['registration_date']),
+            timezone=row['timezone']
+        )
+
+    def ensure_user(self, user_id: int, username: str = None, first_name: str = None):
+        """Зарегистрировать пользователя, если процесс его еще не встречал
+
+        Для известных пользователей запросов к базе нет.
+        """
+        if user_id not in self.known_users:
+            self.get_or_create_user(user_id, username, first_name)
 
     def update_user_timezone(self, user_id: int, timezone: str):
         """Обновить часовой пояс пользователя"""
@@ -152,6 +562,7 @@ class DatabaseManager:
                 UPDATE users SET timezone = ? WHERE user_id = ?
             ''', (timezone, user_id))
             conn.commit()
+            self._bump_data_version(user_id)
 
     # ===== МЕТОДЫ РАБОТЫ С НАСТРОЕНИЕМ =====
 
@@ -160,38 +571,91 @@ class DatabaseManager:
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Сохраняем запись настроения
+            entry_date = entry.entry_date or date.today()
+
+            # Сохраняем запись настроения (дата дублируется целыми числами
+            # для fetch_mood_columns)
             cursor.execute('''
-                INSERT INTO mood_entries (user_id, mood_score, diary_text, entry_date)
-                VALUES (?, ?, ?, ?)
+                INSERT INTO mood_entries (user_id, mood_score, diary_text, entry_date,
+                                          entry_ordinal, created_ts)
+                VALUES (?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
             ''', (
                 entry.user_id,
                 entry.mood_score,
                 entry.diary_text,
-                entry.entry_date or date.today()
+                entry_date,
+                entry_date.toordinal()
             ))
 
             mood_id = cursor.lastrowid
 
-            # Добавляем теги
+            # Серия дней с записями: запись в тот же день ее не меняет,
+            # на следующий день продлевает, после пропуска начинает заново.
+            # Запись задним числом (раньше последней) серию не меняет
+            gap = 'julianday(:entry_date) - julianday(last_entry_date)'
+            streak = f'''CASE
+                WHEN last_entry_date IS NULL OR {gap} > 1 THEN 1
+                WHEN {gap} = 1 THEN current_streak + 1
+                ELSE current_streak
+            END'''
+            cursor.execute(f'''
+                UPDATE users
+                SET current_streak = {streak},
+                    longest_streak = MAX(longest_streak, {streak}),
+                    last_entry_date = MAX(COALESCE(last_entry_date, :entry_date), :entry_date)
+                WHERE user_id = :user_id
+            ''', {'entry_date': entry_date.isoformat(), 'user_id': entry.user_id})
+
+            # Добавляем теги и обновляем счетчики их использования
             if tag_ids:
-                for tag_id in tag_ids:
-                    cursor.execute('''
-                        INSERT INTO mood_tags (mood_id, tag_id)
-                        VALUES (?, ?)
-                    ''', (mood_id, tag_id))
-
+                tag_ids = list(dict.fromkeys(tag_ids))
+                cursor.executemany('''
+                    INSERT INTO mood_tags (mood_id, tag_id)
+                    VALUES (?, ?)
+                ''', [(mood_id, tag_id) for tag_id in tag_ids])
+                cursor.executemany('''
+                    INSERT INTO tag_usage (user_id, tag_id, count, mood_sum, last_used)
+                    VALUES (?, ?, 1, ?, ?)
+                    ON CONFLICT (user_id, tag_id) DO UPDATE SET
+                        count = count + 1,
+                        mood_sum = mood_sum + excluded.mood_sum,
+                        last_used = MAX(COALESCE(last_used, excluded.last_used), excluded.last_used)
+                ''', [(entry.user_id, tag_id, entry.mood_score, entry_date) for tag_id in tag_ids])
+
+            self._queue_pattern_mining(cursor, entry.user_id)
             conn.commit()
+            self._bump_data_version(entry.user_id)
             return mood_id
 
+    def get_mood_streak(self, user_id: int, today: date = None) -> tuple:
+        """Серия пользователя: (текущая, самая длинная)
+
+        Текущая серия не прервана, если последняя запись была сегодня или вчера.
+        """
+        today = today or date.today()
+        with self.get_connection() as conn:
+            row = conn.execute('''
+                SELECT current_streak, longest_streak, last_entry_date FROM users WHERE user_id = ?
+            ''', (user_id,)).fetchone()
+
+        if not row or not row['last_entry_date']:
+            return 0, 0
+
+        last_entry = date.fromisoformat(row['last_entry_date'])
+        current = row['current_streak'] if (today - last_entry).days <= 1 else 0
+        return current, row['longest_streak']
+
     def get_mood_entries(self, user_id: int, start_date: date = None,
                         end_date: date = None, limit: int = None) -> List[MoodEntry]:
         """Получить записи настроения за период"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            # Кортежи в порядке аргументов MoodEntry - без sqlite3.Row
+            cursor.row_factory = None
 
             query = '''
-                SELECT * FROM mood_entries
+                SELECT id, user_id, mood_score, diary_text, entry_date, created_at
+                FROM mood_entries
                 WHERE user_id = ?
             '''
             params = [user_id]
@@ -211,31 +675,75 @@ class DatabaseManager:
                 params.append(limit)
 
             cursor.execute(query, params)
-            rows = cursor.fetchall()
 
-            entries = []
-            for row in rows:
-                entry = MoodEntry(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    mood_score=row['mood_score'],
-                    diary_text=row['diary_text'],
-                    entry_date=date.fromisoformat(row['entry_date']),
-                    created_at=datetime.fromisoformat(row['created_at'])
-                )
-                entries.append(entry)
+            # Даты остаются строками и разбираются MoodEntry при первом обращении
+            return [MoodEntry(*row) for row in cursor.fetchall()]
 
-            return entries
+    def fetch_mood_columns(self, user_id: int, start_date: date = None,
+                           end_date: date = None,
+                           columns: tuple = ('entry_ordinal', 'mood_score')) -> Dict[str, Any]:
+        """Получить записи настроения за период по столбцам
+
+        Возвращает словарь {столбец: numpy.ndarray (int64)} из MOOD_COLUMNS,
+        записи упорядочены по дате. Даты хранятся в базе целыми числами,
+        поэтому строки не разбираются, а объекты MoodEntry не создаются.
+        """
+        import numpy as np
+
+        unknown = set(columns) - set(self.MOOD_COLUMNS)
+        if unknown:
+            raise ValueError(f"Неизвестные столбцы: {', '.join(sorted(unknown))}")
+
+        query = f'''
+            SELECT {', '.join(self.MOOD_COLUMNS[column] for column in columns)}
+            FROM mood_entries
+            WHERE user_id = ?
+        '''
+        params = [user_id]
+
+        if start_date:
+            query += ' AND entry_ordinal >= ?'
+            params.append(start_date.toordinal())
+
+        if end_date:
+            query += ' AND entry_ordinal <= ?'
+            params.append(end_date.toordinal())
+
+        query += ' ORDER BY entry_ordinal, created_ts, id'
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Обычные кортежи вместо sqlite3.Row - их значения сразу идут в массив
+            cursor.row_factory = None
+            cursor.execute(query, params)
+            data = np.fromiter(chain.from_iterable(cursor.fetchall()), dtype=np.int64)
+
+        data = data.reshape(-1, len(columns))
+        return {column: np.ascontiguousarray(data[:, i]) for i, column in enumerate(columns)}
+
+    def get_mood_arrays(self, user_id: int, start_date: date = None,
+                        end_date: date = None) -> MoodArrays:
+        """Получить записи настроения за период в виде массивов (для графиков)"""
+        return MoodArrays.from_columns(self.fetch_mood_columns(
+            user_id, start_date, end_date,
+            columns=('entry_ordinal', 'mood_score', 'has_diary', 'created_ts')
+        ))
 
     def get_today_mood(self, user_id: int) -> Optional[MoodEntry]:
         """Получить запись настроения за сегодня"""
+        # Дата входит в ключ кэша, поэтому после полуночи запрос выполнится заново
+        return self._get_last_mood_on(user_id, date.today())
+
+    @memoize_per_user(copy=_copy_entry)
+    def _get_last_mood_on(self, user_id: int, day: date) -> Optional[MoodEntry]:
+        """Последняя запись настроения за день"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM mood_entries
                 WHERE user_id = ? AND entry_date = ?
                 ORDER BY created_at DESC LIMIT 1
-            ''', (user_id, date.today()))
+            ''', (user_id, day))
 
             row = cursor.fetchone()
             if row:
@@ -244,8 +752,8 @@ class DatabaseManager:
                     user_id=row['user_id'],
                     mood_score=row['mood_score'],
                     diary_text=row['diary_text'],
-                    entry_date=date.fromisoformat(row['entry_date']),
-                    created_at=datetime.fromisoformat(row['created_at'])
+                    entry_date=row['entry_date'],
+                    created_at=row['created_at']
                 )
             return None
 
@@ -293,6 +801,7 @@ class DatabaseManager:
             ''', (name, category, user_id))
 
             conn.commit()
+            self._bump_data_version(user_id)
             return cursor.lastrowid
 
     def delete_custom_tag(self, tag_id: int, user_id: int) -> bool:
@@ -307,17 +816,55 @@ class DatabaseManager:
             ''', (tag_id, user_id))
 
             if cursor.fetchone():
-                # Удаляем связи с записями
+                # Удаляем связи с записями и счетчики использования
                 cursor.execute('DELETE FROM mood_tags WHERE tag_id = ?', (tag_id,))
+                cursor.execute('DELETE FROM tag_usage WHERE tag_id = ?', (tag_id,))
                 # Удаляем тег
                 cursor.execute('DELETE FROM tags WHERE id = ?', (tag_id,))
+                cursor.execute('''
+                    DELETE FROM mined_patterns WHERE tag_id = ? OR other_tag_id = ?
+                ''', (tag_id, tag_id))
+                self._queue_pattern_mining(cursor, user_id)
                 conn.commit()
+                self._bump_data_version(user_id)
                 return True
 
             return False
 
+    def get_tag_names(self, tag_ids: List[int]) -> Dict[int, str]:
+        """Названия тегов по id: {tag_id: name}"""
+        if not tag_ids:
+            return {}
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(f'''
+                SELECT id, name FROM tags WHERE id IN ({', '.join('?' * len(tag_ids))})
+            ''', list(tag_ids))
+            return dict(cursor.fetchall())
+
+    def get_tag_usage(self, user_id: int) -> List[TagUsage]:
+        """Использованные пользователем теги, самые частые первыми
+
+        Читает готовые счетчики из tag_usage - время зависит от числа тегов
+        пользователя, а не от числа его записей.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute('''
+                SELECT tu.tag_id, t.name, t.category, tu.count, tu.mood_sum, tu.last_used
+                FROM tag_usage tu
+                JOIN tags t ON tu.tag_id = t.id
+                WHERE tu.user_id = ? AND tu.count > 0
+                ORDER BY tu.count DESC, t.name
+            ''', (user_id,))
+            return [TagUsage(*row) for row in cursor.fetchall()]
+
     # ===== МЕТОДЫ АНАЛИТИКИ =====
 
+    @memoize_per_user(copy=_copy_stats)
     def get_mood_stats(self, user_id: int, start_date: date,
                       end_date: date) -> MoodStats:
         """Получить статистику настроения за период"""
@@ -392,42 +939,203 @@ class DatabaseManager:
                 most_frequent_tags=frequent_tags
             )
 
+    @memoize_per_user(copy=_copy_patterns)
     def get_mood_patterns(self, user_id: int, min_entries: int = 5) -> List[MoodPattern]:
-        """Получить паттерны настроения (корреляция тегов с настроением)"""
+        """Получить паттерны настроения (корреляция тегов с настроением)
+
+        Все теги считаются одним расчетом (utils.patterns), паттерны
+        упорядочены по модулю корреляции.
+        """
+        from utils.patterns import tag_mood_statistics
+
+        data = self.fetch_pattern_data(user_id)
+        if not data['link_tags'].size:
+            return []
+
+        stats = tag_mood_statistics(data['entry_ids'], data['scores'], data['link_entries'],
+                                    data['link_tags'], min_entries=min_entries)
+        if not stats['tag_id'].size:
+            return []
+
+        tag_ids = stats['tag_id'].tolist()
+        names = self.get_tag_names(tag_ids)
+
+        patterns = [
+            MoodPattern(
+                tag_name=names.get(tag_id, str(tag_id)),
+                correlation=round(correlation, 2),
+                positive_entries=positive,
+                total_entries=total,
+                lift=round(lift, 2),
+                ci_low=round(ci_low, 2),
+                ci_high=round(ci_high, 2),
+                mean_difference=round(difference, 2)
+            )
+            for tag_id, correlation, positive, total, lift, ci_low, ci_high, difference in zip(
+                tag_ids, stats['correlation'].tolist(), stats['positive_entries'].tolist(),
+                stats['total_entries'].tolist(), stats['lift'].tolist(), stats['ci_low'].tolist(),
+                stats['ci_high'].tolist(), stats['mean_difference'].tolist()
+            )
+        ]
+        patterns.sort(key=lambda pattern: abs(pattern.correlation), reverse=True)
+        return patterns
+
+    # ===== ФОНОВЫЙ ПОИСК ПАТТЕРНОВ =====
+
+    def _queue_pattern_mining(self, cursor, user_id: int):
+        """Отметить, что паттерны пользователя нужно пересчитать"""
+        cursor.execute('''
+            INSERT INTO pattern_mining_queue (user_id) VALUES (?)
+            ON CONFLICT (user_id) DO UPDATE SET changes = changes + 1
+        ''', (user_id,))
+
+    def get_pattern_mining_queue(self, limit: int = None) -> Dict[int, int]:
+        """Пользователи, ожидающие пересчета паттернов: {user_id: changes}"""
+        query = 'SELECT user_id, changes FROM pattern_mining_queue ORDER BY user_id'
+        params = []
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(query, params)
+            return dict(cursor.fetchall())
+
+    def fetch_pattern_data(self, user_id: int) -> Dict[str, Any]:
+        """Данные для поиска паттернов: записи и матрица "запись x тег"
+
+        Возвращает массивы numpy: id, оценки и даты (date.toordinal) записей
+        и пары (id записи, id тега) из mood_tags.
+        """
+        import numpy as np
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
 
             cursor.execute('''
-                SELECT
-                    t.name,
-                    COUNT(CASE WHEN me.mood_score >= 4 THEN 1 END) as positive_entries,
-                    COUNT(me.id) as total_entries,
-                    AVG(me.mood_score) as avg_mood_with_tag,
-                    (SELECT AVG(mood_score) FROM mood_entries WHERE user_id = ?) as overall_avg
-                FROM mood_tags mt
-                JOIN tags t ON mt.tag_id = t.id
-                JOIN mood_entries me ON mt.mood_id = me.id
+                SELECT id, mood_score, entry_ordinal FROM mood_entries WHERE user_id = ?
+            ''', (user_id,))
+            entries = np.fromiter(chain.from_iterable(cursor.fetchall()), dtype=np.int64).reshape(-1, 3)
+
+            cursor.execute('''
+                SELECT mt.mood_id, mt.tag_id
+                FROM mood_entries me
+                JOIN mood_tags mt ON mt.mood_id = me.id
                 WHERE me.user_id = ?
-                GROUP BY t.id, t.name
-                HAVING COUNT(me.id) >= ?
-                ORDER BY ABS(AVG(me.mood_score) - (SELECT AVG(mood_score) FROM mood_entries WHERE user_id = ?)) DESC
-            ''', (user_id, user_id, min_entries, user_id))
+            ''', (user_id,))
+            links = np.fromiter(chain.from_iterable(cursor.fetchall()), dtype=np.int64).reshape(-1, 2)
+
+        return {
+            'entry_ids': entries[:, 0],
+            'scores': entries[:, 1],
+            'ordinals': entries[:, 2],
+            'link_entries': links[:, 0],
+            'link_tags': links[:, 1],
+        }
+
+    def finish_pattern_mining(self, user_id: int, changes: int, rows: List[tuple]):
+        """Сохранить найденные паттерны пользователя и убрать его из очереди
+
+        rows - кортежи (kind, tag_id, other_tag_id, support, correlation,
+        ci_low, ci_high, lift, mean_difference). Если за время расчета
+        пришли новые записи (changes в очереди вырос), пользователь остается
+        в очереди и будет пересчитан при следующем запуске.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM mined_patterns WHERE user_id = ?', (user_id,))
+            cursor.executemany('''
+                INSERT INTO mined_patterns (user_id, kind, tag_id, other_tag_id, support,
+                                            correlation, ci_low, ci_high, lift, mean_difference)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(user_id, *row) for row in rows])
+            cursor.execute('''
+                DELETE FROM pattern_mining_queue WHERE user_id = ? AND changes = ?
+            ''', (user_id, changes))
+            conn.commit()
 
-            patterns = []
-            for row in cursor.fetchall():
-                correlation = row['avg_mood_with_tag'] - row['overall_avg']
-                pattern = MoodPattern(
-                    tag_name=row['name'],
-                    correlation=round(correlation, 2),
-                    positive_entries=row['positive_entries'],
-                    total_entries=row['total_entries']
-                )
-                patterns.append(pattern)
+    def get_mined_patterns(self, user_id: int) -> List[MinedPattern]:
+        """Паттерны, найденные фоновым расчетом, самые сильные первыми"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT mp.kind, t.name AS tag_name, o.name AS other_tag_name, mp.support,
+                       mp.correlation, mp.lift, mp.ci_low, mp.ci_high, mp.mean_difference
+                FROM mined_patterns mp
+                JOIN tags t ON t.id = mp.tag_id
+                LEFT JOIN tags o ON o.id = mp.other_tag_id
+                WHERE mp.user_id = ?
+                ORDER BY ABS(mp.correlation) DESC
+            ''', (user_id,))
+            return [MinedPattern(**dict(row)) for row in cursor.fetchall()]
+
+    # ===== НОЧНОЙ РАСЧЕТ ИНСАЙТОВ =====
+
+    def iter_all_mood_columns(self, chunk_rows: int = 100_000):
+        """Все записи настроения порциями, упорядоченные по пользователю
+
+        Возвращает генератор массивов numpy формы (N, 3): user_id,
+        entry_ordinal, mood_score. Порядок (user_id, entry_ordinal, id) совпадает
+        с индексом idx_mood_entries_user_ordinal, поэтому база не сортирует
+        таблицу, а данные не загружаются в память целиком.
+        """
+        import numpy as np
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute('''
+                SELECT user_id, entry_ordinal, mood_score
+                FROM mood_entries
+                WHERE user_id IS NOT NULL AND entry_ordinal IS NOT NULL
+                ORDER BY user_id, entry_ordinal, id
+            ''')
 
-            return patterns
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 3)
+
+    def save_user_insights(self, rows: List[tuple]):
+        """Сохранить посчитанные инсайты
+
+        rows - кортежи (user_id, total_entries, recent_average, older_average,
+        trend, best_weekday).
+        """
+        with self.get_connection() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO user_insights (user_id, total_entries, recent_average,
+                                                      older_average, trend, best_weekday)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+
+    def get_user_insights(self, user_id: int) -> Optional[UserInsights]:
+        """Инсайты пользователя из последнего ночного расчета"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Столбцы перечислены явно: в старых базах остались столбцы серий
+            cursor.execute('''
+                SELECT user_id, total_entries, recent_average, older_average,
+                       trend, best_weekday, computed_at
+                FROM user_insights WHERE user_id = ?
+            ''', (user_id,))
+            row = cursor.fetchone()
+            return UserInsights(**dict(row)) if row else None
+
+    def get_insights_computed_at(self) -> Optional[str]:
+        """Время последнего расчета инсайтов (None, если расчета не было)"""
+        with self.get_connection() as conn:
+            return conn.execute('SELECT MAX(computed_at) FROM user_insights').fetchone()[0]
 
     # ===== МЕТОДЫ НАСТРОЕК =====
 
+    # Обработчики меняют полученные настройки, поэтому из кэша выдается копия
+    @memoize_per_user(copy=replace)
     def get_user_settings(self, user_id: int) -> UserSettings:
         """Получить настройки пользователя"""
         with self.get_connection() as conn:
@@ -451,21 +1159,52 @@ class DatabaseManager:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                UPDATE user_settings
-                SET daily_reminder = ?, reminder_time = ?, language = ?
-                WHERE user_id = ?
+                INSERT INTO user_settings (user_id, daily_reminder, reminder_time, language)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    daily_reminder = excluded.daily_reminder,
+                    reminder_time = excluded.reminder_time,
+                    language = excluded.language
             ''', (
+                settings.user_id,
                 settings.daily_reminder,
                 settings.reminder_time.isoformat(),
-                settings.language,
-                settings.user_id
+                settings.language
             ))
             conn.commit()
+            self._bump_data_version(settings.user_id)
+
+    def get_reminder_settings(self) -> List[UserSettings]:
+        """Настройки пользователей с включенными напоминаниями"""
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                'SELECT * FROM user_settings WHERE daily_reminder ORDER BY user_id'
+            ).fetchall()
+            return [
+                UserSettings(
+                    user_id=row['user_id'],
+                    daily_reminder=True,
+                    reminder_time=time.fromisoformat(row['reminder_time']),
+                    language=row['language']
+                )
+                for row in rows
+            ]
 
     # ===== СЕРВИСНЫЕ МЕТОДЫ =====
 
     def export_user_data(self, user_id: int) -> Dict[str, Any]:
         """Экспорт данных пользователя для CSV/PDF"""
+        entries = self._export_entries(user_id)
+        return {
+            'user_id': user_id,
+            'export_date': datetime.now().isoformat(),
+            'total_entries': len(entries),
+            'entries': entries
+        }
+
+    @memoize_per_user(copy=_copy_export)
+    def _export_entries(self, user_id: int) -> List[Dict[str, Any]]:
+        """Записи пользователя с тегами для экспорта, новые первыми"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
@@ -494,12 +1233,9 @@ class DatabaseManager:
                     'tags': row['tags'] or ''
                 })
 
-            return {
-                'user_id': user_id,
-                'export_date': datetime.now().isoformat(),
-                'total_entries': len(entries),
-                'entries': entries
-            }
+            return entries
 
-# Глобальный экземпляр менеджера базы данных
-db_manager = DatabaseManager()
+# Глобальный экземпляр менеджера базы данных.
+# База открывается при первом обращении (или явно в bot.on_startup),
+# а не при импорте модуля
+db_manager = LazySingleton(DatabaseManager)
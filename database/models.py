@@ -1,7 +1,16 @@
+import sys
 from datetime import datetime, date, time
-from typing import List, Optional
+from typing import List, Optional, Union
 from dataclasses import dataclass
 
+# Модели, которых бывает много в памяти, хранят поля в __slots__ (без __dict__).
+# dataclass(slots=True) доступен с Python 3.10, на старых версиях модели
+# остаются обычными dataclass
+SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Порядковый номер дня 1970-01-01 (date.toordinal) - начало времени Unix
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
 @dataclass
 class User:
     """Модель пользователя"""
@@ -11,17 +20,130 @@ class User:
     registration_date: Optional[datetime] = None
     timezone: str = "UTC+3"
 
-@dataclass
 class MoodEntry:
-    """Модель записи настроения"""
-    id: Optional[int] = None
-    user_id: int = 0
-    mood_score: int = 3
-    diary_text: Optional[str] = None
-    entry_date: Optional[date] = None
-    created_at: Optional[datetime] = None
+    """Модель записи настроения
 
-@dataclass
+    Записи загружаются из базы десятками тысяч, поэтому класс компактный:
+    поля хранятся в __slots__, а даты можно передать строками из базы -
+    они разбираются в date/datetime только при первом обращении.
+    """
+
+    __slots__ = ('id', 'user_id', 'mood_score', 'diary_text', '_entry_date', '_created_at')
+
+    def __init__(self, id: Optional[int] = None, user_id: int = 0, mood_score: int = 3,
+                 diary_text: Optional[str] = None,
+                 entry_date: Union[date, str, None] = None,
+                 created_at: Union[datetime, str, None] = None):
+        self.id = id
+        self.user_id = user_id
+        self.mood_score = mood_score
+        self.diary_text = diary_text
+        self._entry_date = entry_date
+        self._created_at = created_at
+
+    @property
+    def entry_date(self) -> Optional[date]:
+        if isinstance(self._entry_date, str):
+            self._entry_date = date.fromisoformat(self._entry_date)
+        return self._entry_date
+
+    @entry_date.setter
+    def entry_date(self, value: Union[date, str, None]):
+        self._entry_date = value
+
+    @property
+    def created_at(self) -> Optional[datetime]:
+        if isinstance(self._created_at, str):
+            self._created_at = datetime.fromisoformat(self._created_at)
+        return self._created_at
+
+    @created_at.setter
+    def created_at(self, value: Union[datetime, str, None]):
+        self._created_at = value
+
+    def _astuple(self) -> tuple:
+        return (self.id, self.user_id, self.mood_score, self.diary_text,
+                self.entry_date, self.created_at)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (f"MoodEntry(id={self.id!r}, user_id={self.user_id!r}, "
+                f"mood_score={self.mood_score!r}, diary_text={self.diary_text!r}, "
+                f"entry_date={self.entry_date!r}, created_at={self.created_at!r})")
+
+class MoodArrays:
+    """Записи настроения в виде столбцов NumPy (для графиков)
+
+    Все даты хранятся как целые порядковые номера дней (date.toordinal()),
+    поэтому агрегации по дням и дням недели считаются без объектов datetime.
+    Поля created_ordinal и hour равны -1, если время создания неизвестно.
+    """
+
+    __slots__ = ('ordinal', 'score', 'diary', 'created_ordinal', 'hour')
+
+    def __init__(self, ordinal, score, diary, created_ordinal, hour):
+        self.ordinal = ordinal
+        self.score = score
+        self.diary = diary
+        self.created_ordinal = created_ordinal
+        self.hour = hour
+
+    @classmethod
+    def from_rows(cls, rows: list) -> 'MoodArrays':
+        """Из строк курсора (ordinal, score, diary, created_ordinal, hour)"""
+        import numpy as np
+
+        data = np.array(rows, dtype=np.int64).reshape(-1, len(cls.__slots__))
+        return cls(*(np.ascontiguousarray(column) for column in data.T))
+
+    @classmethod
+    def from_columns(cls, columns: dict) -> 'MoodArrays':
+        """Из результата DatabaseManager.fetch_mood_columns"""
+        import numpy as np
+
+        created_ts = columns['created_ts']
+        known = created_ts >= 0
+        return cls(
+            columns['entry_ordinal'],
+            columns['mood_score'],
+            columns['has_diary'],
+            np.where(known, created_ts // 86400 + EPOCH_ORDINAL, -1),
+            np.where(known, created_ts // 3600 % 24, -1)
+        )
+
+    @classmethod
+    def from_entries(cls, entries: List['MoodEntry']) -> 'MoodArrays':
+        """Из списка MoodEntry (для кода, который уже загрузил записи)"""
+        return cls.from_rows([(
+            entry.entry_date.toordinal(),
+            entry.mood_score,
+            int(bool(entry.diary_text)),
+            entry.created_at.toordinal() if entry.created_at else -1,
+            entry.created_at.hour if entry.created_at else -1
+        ) for entry in entries])
+
+    @property
+    def weekday(self):
+        """День недели записи (0 - понедельник), как date.weekday()"""
+        return (self.ordinal - 1) % 7
+
+    @property
+    def created_weekday(self):
+        """День недели создания записи (-1, если неизвестен)"""
+        import numpy as np
+
+        return np.where(self.created_ordinal > 0, (self.created_ordinal - 1) % 7, -1)
+
+    def __len__(self) -> int:
+        return len(self.score)
+
+@dataclass(frozen=True, **SLOTS)
 class Tag:
     """Модель тега"""
     id: Optional[int] = None
@@ -36,7 +158,7 @@ class MoodTag:
     mood_id: int
     tag_id: int
 
-@dataclass
+@dataclass(**SLOTS)
 class UserSettings:
     """Модель настроек пользователя"""
     user_id: int
@@ -60,8 +182,75 @@ class MoodStats:
 
 @dataclass
 class MoodPattern:
-    """Паттерн настроения"""
+    """Паттерн настроения
+
+    correlation - точечно-бисериальная корреляция оценки с наличием тега,
+    ci_low/ci_high - ее 95% доверительный интервал, lift - во сколько раз
+    с тегом чаще хорошее настроение (оценка 4-5), чем в среднем.
+    """
     tag_name: str
     correlation: float
     positive_entries: int
     total_entries: int
+    lift: float = 1.0
+    ci_low: float = -1.0
+    ci_high: float = 1.0
+    mean_difference: float = 0.0
+
+    @property
+    def significant(self) -> bool:
+        """Доверительный интервал корреляции не содержит нуля"""
+        return self.ci_low > 0 or self.ci_high < 0
+
+@dataclass
+class MinedPattern:
+    """Паттерн, найденный фоновым поиском (utils.mining)
+
+    kind = 'pair' - теги tag_name и other_tag_name в одной записи,
+    kind = 'lag' - тег tag_name вчера и настроение сегодня.
+    support - число записей с парой тегов (для 'lag' - число пар дней).
+    """
+    kind: str
+    tag_name: str
+    other_tag_name: Optional[str]
+    support: int
+    correlation: float
+    lift: float = 1.0
+    ci_low: float = -1.0
+    ci_high: float = 1.0
+    mean_difference: float = 0.0
+
+    @property
+    def significant(self) -> bool:
+        """Доверительный интервал корреляции не содержит нуля"""
+        return self.ci_low > 0 or self.ci_high < 0
+
+@dataclass(**SLOTS)
+class TagUsage:
+    """Использование тега пользователем (счетчики из таблицы tag_usage)"""
+    tag_id: int
+    name: str
+    category: str
+    count: int = 0
+    mood_sum: int = 0
+    last_used: Optional[str] = None
+
+    @property
+    def average_mood(self) -> float:
+        """Среднее настроение в записях с этим тегом"""
+        return self.mood_sum / self.count if self.count else 0.0
+
+@dataclass(**SLOTS)
+class UserInsights:
+    """Инсайты пользователя, заранее посчитанные ночным расчетом (utils.insights)
+
+    Серии здесь нет: она хранится в users (DatabaseManager.get_mood_streak).
+    trend - 'up', 'down' или 'stable' (последние 7 записей против 7 предыдущих).
+    """
+    user_id: int
+    total_entries: int
+    recent_average: float
+    older_average: float
+    trend: str
+    best_weekday: int
+    computed_at: Optional[str] = None
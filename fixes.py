@@ -4,7 +4,7 @@
 
 import logging
 from typing import List, Dict, Any
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from database.db_manager import db_manager
 from database.models import MoodEntry, Tag
 
@@ -22,7 +22,7 @@ class BotFixes:
             logger.info("Проверка связей записей и тегов выполнена")
             return True
         except Exception as e:
-            logger.error(f"Ошибка при исправлении связей: {e}")
+            logger.error("Ошибка при исправлении связей: %s", e)
             return False
 
     @staticmethod
@@ -42,7 +42,7 @@ class BotFixes:
             logger.info("Целостность базы данных проверена")
             return True
         except Exception as e:
-            logger.error(f"Ошибка при проверке целостности БД: {e}")
+            logger.error("Ошибка при проверке целостности БД: %s", e)
             return False
 
     @staticmethod
@@ -54,10 +54,10 @@ class BotFixes:
             # В реальном проекте добавить логику очистки
             # удаленных пользователей и старых записей
 
-            logger.info(f"Очистка данных старше {days} дней выполнена")
+            logger.info("Очистка данных старше %s дней выполнена", days)
             return True
         except Exception as e:
-            logger.error(f"Ошибка при очистке старых данных: {e}")
+            logger.error("Ошибка при очистке старых данных: %s", e)
             return False
 
     @staticmethod
@@ -68,7 +68,7 @@ class BotFixes:
             logger.info("Оптимизация базы данных выполнена")
             return True
         except Exception as e:
-            logger.error(f"Ошибка при оптимизации БД: {e}")
+            logger.error("Ошибка при оптимизации БД: %s", e)
             return False
 
     @staticmethod
@@ -80,84 +80,40 @@ class BotFixes:
                 backup_path = f"backup_mood_tracker_{timestamp}.db"
 
             # В реальном проекте добавить логику копирования файла БД
-            logger.info(f"Резервная копия создана: {backup_path}")
+            logger.info("Резервная копия создана: %s", backup_path)
             return backup_path
         except Exception as e:
-            logger.error(f"Ошибка при создании резервной копии: {e}")
+            logger.error("Ошибка при создании резервной копии: %s", e)
             return None
 
 # Дополнительные утилиты для работы с данными
 
-def get_mood_streak(user_id: int) -> int:
-    """Получить текущую серию дней с записями настроения"""
-    try:
-        entries = db_manager.get_mood_entries(user_id, limit=30)
-        if not entries:
-            return 0
-
-        # Сортируем по дате (новые сначала)
-        entries.sort(key=lambda x: x.entry_date, reverse=True)
-
-        streak = 0
-        current_date = date.today()
-
-        for entry in entries:
-            if entry.entry_date == current_date:
-                streak += 1
-                current_date -= timedelta(days=1)
-            elif entry.entry_date == current_date - timedelta(days=1):
-                # Пропущенный день прерывает серию
-                break
-            else:
-                break
-
-        return streak
-    except Exception as e:
-        logger.error(f"Ошибка при подсчете серии: {e}")
-        return 0
-
 def get_mood_insights(user_id: int) -> Dict[str, Any]:
-    """Получить инсайты о настроении пользователя"""
+    """Получить инсайты о настроении пользователя
+
+    Инсайты заранее считаются ночным расчетом для всех пользователей
+    (utils.insights), здесь читается одна готовая строка.
+    """
     try:
-        entries = db_manager.get_mood_entries(user_id)
+        insights = db_manager.get_user_insights(user_id)
 
-        if len(entries) < 7:
+        if not insights or insights.total_entries < 7:
             return {"message": "Нужно минимум 7 записей для анализа"}
 
-        # Анализ тренда
-        recent_entries = sorted(entries[-7:], key=lambda x: x.entry_date)
-        recent_avg = sum(e.mood_score for e in recent_entries) / len(recent_entries)
-
-        older_entries = sorted(entries[-14:-7], key=lambda x: x.entry_date) if len(entries) >= 14 else []
-        older_avg = sum(e.mood_score for e in older_entries) / len(older_entries) if older_entries else recent_avg
-
-        trend = "стабильное"
-        if recent_avg > older_avg + 0.3:
-            trend = "улучшающееся 📈"
-        elif recent_avg < older_avg - 0.3:
-            trend = "ухудшающееся 📉"
-
-        # Лучший день недели
-        weekday_scores = {}
-        for entry in entries:
-            weekday = entry.entry_date.weekday()
-            if weekday not in weekday_scores:
-                weekday_scores[weekday] = []
-            weekday_scores[weekday].append(entry.mood_score)
-
-        best_weekday = max(weekday_scores.items(), key=lambda x: sum(x[1])/len(x[1]))[0]
+        trends = {"up": "улучшающееся 📈", "down": "ухудшающееся 📉", "stable": "стабильное"}
         weekday_names = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
 
         return {
-            "trend": trend,
-            "recent_average": round(recent_avg, 1),
-            "best_weekday": weekday_names[best_weekday],
-            "total_entries": len(entries),
-            "streak": get_mood_streak(user_id)
+            "trend": trends[insights.trend],
+            "recent_average": round(insights.recent_average, 1),
+            "best_weekday": weekday_names[insights.best_weekday],
+            "total_entries": insights.total_entries,
+            # Серия хранится в users и обновляется при каждой записи
+            "streak": db_manager.get_mood_streak(user_id)[0]
         }
 
     except Exception as e:
-        logger.error(f"Ошибка при генерации инсайтов: {e}")
+        logger.error("Ошибка при генерации инсайтов: %s", e)
         return {"error": "Не удалось сгенерировать инсайты"}
 
 # Функции для работы с экспортом данных
@@ -181,7 +137,7 @@ def export_mood_data_to_json(user_id: int) -> Dict[str, Any]:
         return json_data
 
     except Exception as e:
-        logger.error(f"Ошибка при экспорте в JSON: {e}")
+        logger.error("Ошибка при экспорте в JSON: %s", e)
         return {"error": "Не удалось экспортировать данные"}
 
 # Функции для работы с уведомлениями
@@ -189,7 +145,7 @@ def export_mood_data_to_json(user_id: int) -> Dict[str, Any]:
 def generate_motivational_message(user_id: int) -> str:
     """Генерация мотивационного сообщения"""
     try:
-        streak = get_mood_streak(user_id)
+        streak, _ = db_manager.get_mood_streak(user_id)
 
         if streak == 0:
             messages = [
@@ -220,7 +176,7 @@ def generate_motivational_message(user_id: int) -> str:
         return random.choice(messages)
 
     except Exception as e:
-        logger.error(f"Ошибка при генерации мотивационного сообщения: {e}")
+        logger.error("Ошибка при генерации мотивационного сообщения: %s", e)
         return "🌟 Не забудьте записать настроение сегодня!"
 
 # Функции для администратора бота
@@ -236,7 +192,7 @@ def get_bot_statistics() -> Dict[str, Any]:
             "database_size": "0 MB"  # Заглушка
         }
     except Exception as e:
-        logger.error(f"Ошибка при получении статистики бота: {e}")
+        logger.error("Ошибка при получении статистики бота: %s", e)
         return {"error": "Не удалось получить статистику"}
 
 # Тестовые функции
@@ -263,16 +219,16 @@ def create_test_data(user_id: int, days: int = 30):
 
             db_manager.save_mood_entry(entry)
 
-        logger.info(f"Созданы тестовые данные для пользователя {user_id} за {days} дней")
+        logger.info("Созданы тестовые данные для пользователя %s за %s дней", user_id, days)
         return True
 
     except Exception as e:
-        logger.error(f"Ошибка при создании тестовых данных: {e}")
+        logger.error("Ошибка при создании тестовых данных: %s", e)
         return False
 
 # Инициализация исправлений при запуске
 def init_fixes():
-    """Инициализация исправлений при запуске бота"""
+    """Инициализация исправлений при запуске бота (вызывается из bot.on_startup)"""
     try:
         logger.info("Инициализация исправлений...")
 
@@ -283,7 +239,4 @@ def init_fixes():
         logger.info("Исправления инициализированы успешно")
 
     except Exception as e:
-        logger.error(f"Ошибка при инициализации исправлений: {e}")
-
-# Выполняем инициализацию при импорте модуля
-init_fixes()
+        logger.error("Ошибка при инициализации исправлений: %s", e)
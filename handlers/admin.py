@@ -0,0 +1,78 @@
+import asyncio
+from aiogram import Router, F
+from aiogram.types import Message, FSInputFile
+from aiogram.filters import Command, CommandObject
+
+from config import config, logger
+from utils.profiling import stack_sampler, run_command, format_command_results
+from utils.workers import send_command
+
+router = Router()
+
+# Команды этого роутера доступны только администраторам (ADMIN_IDS в .env)
+router.message.filter(F.from_user.id.in_(config.ADMIN_IDS))
+
+# Максимальная длительность профилирования по команде (секунды)
+MAX_PROFILE_SECONDS = 300
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """Обработчик команды /profile [секунды] - профилирование процесса
+
+    В режиме нескольких воркеров профилируются все процессы: команду
+    рассылает супервизор, он же присылает файлы (см. bot.run_control).
+    """
+    try:
+        seconds = int(command.args) if command.args else config.PROFILE_SECONDS
+        seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+        profile = {'action': 'profile', 'seconds': seconds}
+
+        if send_command(profile, message.chat.id):
+            await message.answer(f"🔬 Профилирование всех процессов на {seconds} с...")
+            return
+
+        if stack_sampler.running:
+            await message.answer("⏳ Профилирование уже идет.")
+            return
+
+        await message.answer(f"🔬 Профилирование на {seconds} с...")
+
+        # Профилировщик снимает стеки в отдельном потоке, бот продолжает работать
+        result = await asyncio.to_thread(run_command, profile)
+        text = format_command_results(profile, [result])
+
+        if 'path' not in result:
+            await message.answer(text)
+            return
+
+        await message.answer_document(FSInputFile(result['path']), caption=text)
+
+    except ValueError:
+        await message.answer("Использование: /profile [секунды]")
+    except Exception as e:
+        logger.error("Ошибка в команде /profile: %s", e)
+        await message.answer("❌ Не удалось выполнить профилирование.")
+
+@router.message(Command("slowlog"))
+async def cmd_slowlog(message: Message, command: CommandObject):
+    """Обработчик команды /slowlog [on|off|мс] - журнал медленных запросов"""
+    args = (command.args or "").strip().lower()
+    slowlog = {'action': 'slowlog'}
+
+    if args == "on":
+        slowlog['enabled'] = True
+    elif args == "off":
+        slowlog['enabled'] = False
+    elif args:
+        try:
+            slowlog.update(enabled=True, threshold_ms=float(args))
+        except ValueError:
+            await message.answer("Использование: /slowlog [on|off|порог в мс]")
+            return
+
+    # В режиме нескольких воркеров журнал переключается во всех процессах
+    if send_command(slowlog, message.chat.id):
+        await message.answer("🐢 Команда отправлена всем процессам, ответ пришлет супервизор.")
+        return
+
+    await message.answer(format_command_results(slowlog, [run_command(slowlog)]))
@@ -1,26 +1,152 @@
 from datetime import date, timedelta
+from typing import List, Optional, Tuple
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 
 from database.db_manager import db_manager
+from database.models import MoodStats, TagUsage
 from keyboards.inline import (
     get_analytics_keyboard,
     get_back_keyboard,
     get_main_menu_keyboard
 )
 from keyboards.reply import get_main_reply_keyboard
-from config import logger
-from utils.charts import chart_generator
+from config import config, logger
+from utils.callbacks import callbacks, AnalyticsPeriod
+from utils.charts import chart_generator, chart_executor
 from utils.helpers import (
     get_date_range,
     format_stats_message,
-    format_patterns_message
+    format_patterns_message,
+    format_mined_patterns_message,
+    format_sparkline,
+    truncate_text
 )
-from aiogram.types import InputFile
+from utils.singleflight import single_flight, Overloaded
+from aiogram.types import BufferedInputFile
 
 router = Router()
 
+# Вычисления отчетов аналитики. Они выполняются в потоке графиков через
+# single_flight: цикл событий не ждет построения графика, а двойное нажатие
+# на кнопку строит график один раз. with_chart=False - тот же отчет без
+# картинки (chart_png = None), когда очередь графиков заполнена
+
+def _trend_report(user_id: int, start_date: date, end_date: date,
+                  with_chart: bool) -> Optional[Tuple[Optional[bytes], MoodStats, Optional[str]]]:
+    """PNG графика тренда (или строка ▁▃▅█ по дням) и статистика за период
+
+    None - записей за период нет.
+    """
+    # Данные массивами - для графика не нужны объекты MoodEntry
+    mood_data = db_manager.get_mood_arrays(user_id, start_date, end_date)
+    if not len(mood_data):
+        return None
+
+    stats = db_manager.get_mood_stats(user_id, start_date, end_date)
+    if with_chart:
+        chart_buffer = chart_generator.generate_mood_trend_chart(mood_data, start_date, end_date)
+        return chart_buffer.getvalue(), stats, None
+
+    import numpy as np
+
+    days = end_date.toordinal() - start_date.toordinal() + 1
+    day = mood_data.ordinal - start_date.toordinal()
+    counts = np.bincount(day, minlength=days)
+    totals = np.bincount(day, weights=mood_data.score, minlength=days)
+    daily = [totals[i] / counts[i] if counts[i] else None for i in range(days)]
+    return None, stats, format_sparkline(daily)
+
+def _weekday_report(user_id: int, with_chart: bool) -> Optional[tuple]:
+    """PNG графика по дням недели, средние и количества (None - меньше 3 записей)"""
+    mood_data = db_manager.get_mood_arrays(user_id)
+    if len(mood_data) < 3:
+        return None
+
+    chart_png = chart_generator.generate_weekday_stats_chart(mood_data).getvalue() if with_chart else None
+    weekday_means, weekday_counts = chart_generator.weekday_stats(mood_data)
+    return chart_png, weekday_means, weekday_counts
+
+def _tags_report(user_id: int, with_chart: bool) -> Optional[Tuple[Optional[bytes], List[TagUsage]]]:
+    """PNG круговой диаграммы и счетчики тегов (None - тегов нет)"""
+    # Готовые счетчики из tag_usage (без перебора записей)
+    usage = db_manager.get_tag_usage(user_id)
+    if not usage:
+        return None
+
+    if not with_chart:
+        return None, usage
+    chart_buffer = chart_generator.generate_tags_pie_chart({tag.name: tag.count for tag in usage})
+    return chart_buffer.getvalue(), usage
+
+def _patterns_report(user_id: int, with_chart: bool) -> Optional[Tuple[Optional[bytes], str]]:
+    """PNG распределения настроения и текст паттернов (None - паттернов нет)"""
+    patterns = db_manager.get_mood_patterns(user_id)
+    if not patterns:
+        return None
+
+    chart_png = None
+    if with_chart:
+        mood_data = db_manager.get_mood_arrays(user_id)
+        chart_png = chart_generator.generate_mood_distribution_chart(mood_data).getvalue()
+
+    # Связки тегов и эффекты следующего дня заранее находит фоновый
+    # поиск (utils.mining), здесь они только читаются
+    mined_message = format_mined_patterns_message(db_manager.get_mined_patterns(user_id), limit=3)
+    patterns_message = format_patterns_message(patterns, limit=6 if mined_message else 10)
+    if mined_message:
+        patterns_message = patterns_message.rstrip() + "\n\n" + mined_message
+
+    # Подпись к фото в Telegram ограничена 1024 символами
+    return chart_png, truncate_text(patterns_message, 1024)
+
+async def _build_report(user_id: int, operation: str, report, *args):
+    """Отчет с графиком, а при заполненной очереди графиков - без него
+
+    Отчет без графика все равно читает из базы всю историю пользователя
+    (get_mood_arrays не кэшируется), поэтому он считается в общем пуле
+    потоков, а не в цикле событий и не в занятом потоке графиков. Этих
+    вычислений не больше config.OVERLOAD_QUEUE_LIMIT: сверх него
+    выбрасывается Overloaded (см. _reply_overloaded).
+    """
+    try:
+        return await single_flight.run(user_id, operation, report, *args, True,
+                                       executor=chart_executor, limit=config.CHART_QUEUE_LIMIT)
+    except Overloaded:
+        logger.info("Очередь графиков заполнена, отчет %s пользователю %s без графика", operation, user_id)
+        return await single_flight.run(user_id, operation, report, *args, False,
+                                       limit=config.OVERLOAD_QUEUE_LIMIT)
+
+async def _reply_overloaded(callback: CallbackQuery):
+    """Ответ, когда заполнена и очередь отчетов без графика"""
+    await callback.message.edit_text(
+        "⏳ Сейчас много запросов. Попробуйте чуть позже.",
+        reply_markup=get_back_keyboard("analytics_menu")
+    )
+    await callback.answer()
+
+async def _send_report(callback: CallbackQuery, chart_png: Optional[bytes], filename: str, caption: str):
+    """Отправить отчет: фото с подписью или (без графика) текст вместо меню"""
+    if chart_png is None:
+        await callback.message.edit_text(
+            caption + "\n\n⏳ Сейчас много запросов, поэтому без графика. Попробуйте чуть позже.",
+            reply_markup=get_back_keyboard("analytics_menu")
+        )
+        return
+
+    try:
+        await callback.message.delete()
+    except Exception:
+        pass  # Игнорируем ошибку если сообщение уже удалено
+
+    await callback.bot.send_photo(
+        chat_id=callback.message.chat.id,
+        photo=BufferedInputFile(chart_png, filename=filename),
+        caption=caption,
+        reply_markup=get_back_keyboard("analytics_menu")
+    )
+
 @router.message(Command("stats"))
 async def cmd_stats(message: Message):
     """Обработчик команды /stats - быстрая статистика"""
@@ -31,7 +157,7 @@ async def cmd_stats(message: Message):
         start_date = date.today() - timedelta(days=7)
         end_date = date.today()
 
-        stats = db_manager.get_mood_stats(user_id, start_date, end_date)
+        stats = await single_flight.run(user_id, 'stats', db_manager.get_mood_stats, start_date, end_date)
 
         if stats.total_entries == 0:
             await message.answer(
@@ -45,7 +171,7 @@ async def cmd_stats(message: Message):
         await message.answer(stats_message)
 
     except Exception as e:
-        logger.error(f"Ошибка в команде /stats для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /stats для пользователя %s: %s", message.from_user.id, e)
         await message.answer("❌ Произошла ошибка при получении статистики.")
 
 @router.message(F.text == "📈 Аналитика")
@@ -75,14 +201,14 @@ async def show_analytics_menu(message: Message):
         )
 
     except Exception as e:
-        logger.error(f"Ошибка при показе меню аналитики: {e}")
+        logger.error("Ошибка при показе меню аналитики: %s", e)
         await message.answer("❌ Произошла ошибка.")
 
-@router.callback_query(F.data.startswith("analytics_"))
-async def callback_analytics_period(callback: CallbackQuery):
+@callbacks.handler(AnalyticsPeriod)
+async def callback_analytics_period(callback: CallbackQuery, callback_data: AnalyticsPeriod):
     """Обработчик выбора периода для аналитики"""
     try:
-        period = callback.data.split("_")[1]
+        period = callback_data.period
         user_id = callback.from_user.id
 
         # Определяем период
@@ -102,10 +228,9 @@ async def callback_analytics_period(callback: CallbackQuery):
             await callback.answer("❌ Неизвестный период")
             return
 
-        # Получаем данные
-        entries = db_manager.get_mood_entries(user_id, start_date, end_date)
+        report = await _build_report(user_id, 'trend', _trend_report, start_date, end_date)
 
-        if not entries:
+        if report is None:
             await callback.message.edit_text(
                 f"📊 За последний {period_name} записей не найдено.\n\n" +
                 "Попробуйте выбрать другой период.",
@@ -113,45 +238,31 @@ async def callback_analytics_period(callback: CallbackQuery):
             )
             return
 
-        # Генерируем график тренда
-        chart_buffer = chart_generator.generate_mood_trend_chart(entries, start_date, end_date)
-
-        # Получаем статистику
-        stats = db_manager.get_mood_stats(user_id, start_date, end_date)
-        stats_message = format_stats_message(stats)
-
-        # Отправляем график
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass  # Игнорируем ошибку если сообщение уже удалено
+        chart_png, stats, sparkline = report
+        caption = f"📈 График настроения за {period_name}\n\n{format_stats_message(stats)}"
+        if sparkline:
+            caption += f"\n{sparkline}"
 
-        # Создаем InputFile из BytesIO
-        chart_file = InputFile(chart_buffer, filename=f"mood_chart_{period_name}.png")
-
-        await callback.bot.send_photo(
-            chat_id=callback.message.chat.id,
-            photo=chart_file,
-            caption=f"📈 График настроения за {period_name}\n\n{stats_message}",
-            reply_markup=get_back_keyboard("analytics_menu")
-        )
+        await _send_report(callback, chart_png, f"mood_chart_{period_name}.png", caption)
 
         await callback.answer()
 
+    except Overloaded:
+        await _reply_overloaded(callback)
     except Exception as e:
-        logger.error(f"Ошибка при генерации графика тренда: {e}")
+        logger.error("Ошибка при генерации графика тренда: %s", e)
         await callback.message.edit_text("❌ Произошла ошибка при генерации графика.")
 
-@router.callback_query(F.data == "analytics_days")
+@callbacks.handler("analytics_days")
 async def callback_analytics_days(callback: CallbackQuery):
     """Обработчик анализа по дням недели"""
     try:
         user_id = callback.from_user.id
 
-        # Получаем все записи пользователя
-        entries = db_manager.get_mood_entries(user_id)
+        # График и статистика по всем записям пользователя
+        report = await _build_report(user_id, 'weekdays', _weekday_report)
 
-        if len(entries) < 3:
+        if report is None:
             await callback.message.edit_text(
                 "📅 Для анализа по дням недели нужно минимум 3 записи.\n\n" +
                 "Продолжайте вести дневник настроения!",
@@ -159,16 +270,7 @@ async def callback_analytics_days(callback: CallbackQuery):
             )
             return
 
-        # Генерируем график по дням недели
-        chart_buffer = chart_generator.generate_weekday_stats_chart(entries)
-
-        # Получаем статистику по дням
-        weekday_stats = {}
-        for entry in entries:
-            weekday = entry.entry_date.weekday()
-            if weekday not in weekday_stats:
-                weekday_stats[weekday] = []
-            weekday_stats[weekday].append(entry.mood_score)
+        chart_png, weekday_means, weekday_counts = report
 
         # Форматируем анализ
         weekday_names = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
@@ -176,10 +278,9 @@ async def callback_analytics_days(callback: CallbackQuery):
         analysis_text = "📅 Анализ настроения по дням недели:\n\n"
 
         for weekday in range(7):
-            if weekday in weekday_stats:
-                scores = weekday_stats[weekday]
-                avg_score = sum(scores) / len(scores)
-                count = len(scores)
+            if weekday_counts[weekday]:
+                avg_score = weekday_means[weekday]
+                count = weekday_counts[weekday]
 
                 day_name = weekday_names[weekday]
                 emoji = "😊" if avg_score >= 4 else "😐" if avg_score >= 3 else "😢"
@@ -188,63 +289,25 @@ async def callback_analytics_days(callback: CallbackQuery):
             else:
                 analysis_text += f"{weekday_names[weekday]}: Нет данных\n"
 
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass  # Игнорируем ошибку если сообщение уже удалено
-
-        # Создаем InputFile из BytesIO
-        chart_file = InputFile(chart_buffer, filename="weekday_stats.png")
-
-        await callback.bot.send_photo(
-            chat_id=callback.message.chat.id,
-            photo=chart_file,
-            caption=analysis_text,
-            reply_markup=get_back_keyboard("analytics_menu")
-        )
+        await _send_report(callback, chart_png, "weekday_stats.png", analysis_text)
 
         await callback.answer()
 
+    except Overloaded:
+        await _reply_overloaded(callback)
     except Exception as e:
-        logger.error(f"Ошибка при анализе по дням недели: {e}")
+        logger.error("Ошибка при анализе по дням недели: %s", e)
         await callback.message.edit_text("❌ Произошла ошибка.")
 
-@router.callback_query(F.data == "analytics_tags")
+@callbacks.handler("analytics_tags")
 async def callback_analytics_tags(callback: CallbackQuery):
     """Обработчик анализа по тегам"""
     try:
         user_id = callback.from_user.id
 
-        # Получаем статистику по тегам
-        # В реальном проекте нужно добавить метод для получения статистики тегов
-        entries = db_manager.get_mood_entries(user_id)
-
-        if not entries:
-            await callback.message.edit_text(
-                "🏷️ Нет данных для анализа тегов.",
-                reply_markup=get_analytics_keyboard()
-            )
-            return
-
-        # Собираем статистику по тегам
-        tag_stats = {}
-        total_entries = len(entries)
-
-        # Получаем все теги пользователя
-        all_tags = db_manager.get_all_tags(user_id)
-
-        for tag in all_tags:
-            # Считаем, сколько раз тег использовался
-            tag_usage = 0
-            for entry in entries:
-                # В реальном проекте нужно получить связи entry-tag из базы
-                # Пока что это заглушка
-                pass
-
-            if tag_usage > 0:
-                tag_stats[tag.name] = tag_usage
+        report = await _build_report(user_id, 'tags', _tags_report)
 
-        if not tag_stats:
+        if report is None:
             await callback.message.edit_text(
                 "🏷️ У вас пока нет тегов для анализа.\n\n" +
                 "Добавляйте теги при записи настроения для более глубокого анализа!",
@@ -252,48 +315,36 @@ async def callback_analytics_tags(callback: CallbackQuery):
             )
             return
 
-        # Генерируем круговую диаграмму
-        chart_buffer = chart_generator.generate_tags_pie_chart(tag_stats)
+        chart_png, usage = report
+        total_marks = sum(tag.count for tag in usage)
 
         # Форматируем текст анализа
         analysis_text = "🏷️ Анализ использования тегов:\n\n"
 
-        sorted_tags = sorted(tag_stats.items(), key=lambda x: x[1], reverse=True)
-        for tag_name, count in sorted_tags[:10]:  # Топ 10 тегов
-            percentage = (count / total_entries) * 100 if total_entries > 0 else 0
-            analysis_text += f"#{tag_name}: {count} раз ({percentage:.1f}%)\n"
+        for tag in usage[:10]:  # Топ 10 тегов (usage уже отсортирован)
+            percentage = tag.count / total_marks * 100
+            analysis_text += (f"#{tag.name}: {tag.count} раз ({percentage:.1f}%), "
+                              f"среднее {tag.average_mood:.1f}\n")
 
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass  # Игнорируем ошибку если сообщение уже удалено
-
-        # Создаем InputFile из BytesIO
-        chart_file = InputFile(chart_buffer, filename="tags_pie_chart.png")
-
-        await callback.bot.send_photo(
-            chat_id=callback.message.chat.id,
-            photo=chart_file,
-            caption=analysis_text,
-            reply_markup=get_back_keyboard("analytics_menu")
-        )
+        await _send_report(callback, chart_png, "tags_pie_chart.png", analysis_text)
 
         await callback.answer()
 
+    except Overloaded:
+        await _reply_overloaded(callback)
     except Exception as e:
-        logger.error(f"Ошибка при анализе по тегам: {e}")
+        logger.error("Ошибка при анализе по тегам: %s", e)
         await callback.message.edit_text("❌ Произошла ошибка.")
 
-@router.callback_query(F.data == "analytics_patterns")
+@callbacks.handler("analytics_patterns")
 async def callback_analytics_patterns(callback: CallbackQuery):
     """Обработчик поиска паттернов настроения"""
     try:
         user_id = callback.from_user.id
 
-        # Получаем паттерны
-        patterns = db_manager.get_mood_patterns(user_id)
+        report = await _build_report(user_id, 'patterns', _patterns_report)
 
-        if not patterns:
+        if report is None:
             await callback.message.edit_text(
                 "🔍 Паттерны не найдены.\n\n" +
                 "Для поиска паттернов нужно больше записей с тегами (минимум 5 записей на тег).",
@@ -301,64 +352,13 @@ async def callback_analytics_patterns(callback: CallbackQuery):
             )
             return
 
-        # Генерируем распределение настроения
-        entries = db_manager.get_mood_entries(user_id)
-        chart_buffer = chart_generator.generate_mood_distribution_chart(entries)
-
-        # Форматируем паттерны
-        patterns_message = format_patterns_message(patterns)
-
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass  # Игнорируем ошибку если сообщение уже удалено
-
-        # Создаем InputFile из BytesIO
-        chart_file = InputFile(chart_buffer, filename="mood_patterns.png")
-
-        await callback.bot.send_photo(
-            chat_id=callback.message.chat.id,
-            photo=chart_file,
-            caption=patterns_message,
-            reply_markup=get_back_keyboard("analytics_menu")
-        )
+        chart_png, patterns_message = report
+        await _send_report(callback, chart_png, "mood_patterns.png", patterns_message)
 
         await callback.answer()
 
+    except Overloaded:
+        await _reply_overloaded(callback)
     except Exception as e:
-        logger.error(f"Ошибка при поиске паттернов: {e}")
+        logger.error("Ошибка при поиске паттернов: %s", e)
         await callback.message.edit_text("❌ Произошла ошибка.")
-
-@router.callback_query(F.data == "analytics_menu")
-async def callback_analytics_menu(callback: CallbackQuery):
-    """Обработчик возврата в меню аналитики"""
-    try:
-        await callback.message.edit_text(
-            "📈 Аналитика настроения\n\nВыберите тип анализа:",
-            reply_markup=get_analytics_keyboard()
-        )
-        await callback.answer()
-    except Exception as e:
-        # Если сообщение нельзя отредактировать, отправляем новое
-        logger.warning(f"Не удалось отредактировать сообщение, отправляем новое: {e}")
-        try:
-            await callback.bot.send_message(
-                chat_id=callback.message.chat.id,
-                text="📈 Аналитика настроения\n\nВыберите тип анализа:",
-                reply_markup=get_analytics_keyboard()
-            )
-        except Exception as e2:
-            logger.error(f"Не удалось отправить новое сообщение: {e2}")
-        await callback.answer()
-
-@router.callback_query(F.data == "back_to_main")
-async def callback_back_to_main(callback: CallbackQuery):
-    """Обработчик возврата в главное меню"""
-    try:
-        await callback.message.edit_text(
-            "🏠 Выберите действие:",
-            reply_markup=get_main_menu_keyboard()
-        )
-        await callback.answer()
-    except Exception as e:
-        logger.error(f"Ошибка при возврате в главное меню: {e}")
@@ -14,6 +14,7 @@ from keyboards.inline import (
 )
 from keyboards.reply import get_main_reply_keyboard
 from config import logger
+from utils.callbacks import callbacks
 from utils.helpers import format_mood_entry
 
 router = Router()
@@ -29,7 +30,7 @@ async def cmd_diary(message: Message):
     try:
         await show_diary_menu(message)
     except Exception as e:
-        logger.error(f"Ошибка в команде /diary для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /diary для пользователя %s: %s", message.from_user.id, e)
         await message.answer("❌ Произошла ошибка.")
 
 @router.message(F.text == "📝 Дневник")
@@ -44,7 +45,7 @@ async def show_diary_menu(message: Message):
         reply_markup=get_diary_actions_keyboard()
     )
 
-@router.callback_query(F.data == "diary_write")
+@callbacks.handler("diary_write")
 async def callback_diary_write(callback: CallbackQuery, state: FSMContext):
     """Обработчик создания новой записи в дневнике"""
     try:
@@ -70,10 +71,10 @@ async def callback_diary_write(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при создании записи дневника: {e}")
+        logger.error("Ошибка при создании записи дневника: %s", e)
         await callback.message.edit_text("❌ Произошла ошибка.")
 
-@router.callback_query(F.data == "diary_view")
+@callbacks.handler("diary_view")
 async def callback_diary_view(callback: CallbackQuery):
     """Обработчик просмотра записей дневника"""
     try:
@@ -116,10 +117,10 @@ async def callback_diary_view(callback: CallbackQuery):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при просмотре дневника: {e}")
+        logger.error("Ошибка при просмотре дневника: %s", e)
         await callback.message.edit_text("❌ Произошла ошибка.")
 
-@router.callback_query(F.data == "diary_period")
+@callbacks.handler("diary_period")
 async def callback_diary_period(callback: CallbackQuery):
     """Обработчик просмотра записей за период"""
     try:
@@ -174,10 +175,10 @@ async def callback_diary_period(callback: CallbackQuery):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при просмотре записей за период: {e}")
+        logger.error("Ошибка при просмотре записей за период: %s", e)
         await callback.message.edit_text("❌ Произошла ошибка.")
 
-@router.callback_query(F.data == "diary_search")
+@callbacks.handler("diary_search")
 async def callback_diary_search(callback: CallbackQuery, state: FSMContext):
     """Обработчик поиска по дневнику"""
     try:
@@ -191,7 +192,7 @@ async def callback_diary_search(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при поиске по дневнику: {e}")
+        logger.error("Ошибка при поиске по дневнику: %s", e)
 
 @router.message(DiaryStates.waiting_for_search_query)
 async def process_search_query(message: Message, state: FSMContext):
@@ -256,7 +257,7 @@ async def process_search_query(message: Message, state: FSMContext):
         await state.clear()
 
     except Exception as e:
-        logger.error(f"Ошибка при обработке поискового запроса: {e}")
+        logger.error("Ошибка при обработке поискового запроса: %s", e)
         await state.clear()
         await message.answer("❌ Произошла ошибка при поиске.")
 
@@ -307,26 +308,14 @@ async def process_new_diary_entry(message: Message, state: FSMContext):
             )
 
         await state.clear()
-        logger.info(f"Пользователь {user_id} добавил запись в дневник")
+        logger.info("Пользователь %s добавил запись в дневник", user_id)
 
     except Exception as e:
-        logger.error(f"Ошибка при сохранении записи дневника: {e}")
+        logger.error("Ошибка при сохранении записи дневника: %s", e)
         await state.clear()
         await message.answer("❌ Произошла ошибка при сохранении.")
 
-@router.callback_query(F.data == "diary_menu")
-async def callback_diary_menu(callback: CallbackQuery):
-    """Обработчик возврата в меню дневника"""
-    try:
-        await callback.message.edit_text(
-            "📝 Дневник эмоций\n\nВыберите действие:",
-            reply_markup=get_diary_actions_keyboard()
-        )
-        await callback.answer()
-    except Exception as e:
-        logger.error(f"Ошибка при возврате в меню дневника: {e}")
-
-@router.callback_query(F.data == "back_to_main")
+@callbacks.handler("back_to_main")
 async def callback_back_to_main(callback: CallbackQuery, state: FSMContext):
     """Обработчик возврата в главное меню"""
     try:
@@ -337,4 +326,4 @@ async def callback_back_to_main(callback: CallbackQuery, state: FSMContext):
         )
         await callback.answer()
     except Exception as e:
-        logger.error(f"Ошибка при возврате в главное меню: {e}")
+        logger.error("Ошибка при возврате в главное меню: %s", e)
@@ -13,8 +13,10 @@ from keyboards.inline import (
     get_back_keyboard,
     get_cancel_keyboard
 )
-from keyboards.reply import get_mood_quick_reply, get_main_reply_keyboard
+from keyboards.reply import get_mood_quick_reply, get_main_reply_keyboard, get_reply_button_texts
 from config import config, logger
+from utils.callbacks import callbacks, MoodSelect, TagCategory, TagToggle, category_key
+from utils.debounce import edit_debouncer
 from utils.helpers import format_mood_entry
 
 router = Router()
@@ -25,100 +27,76 @@ class MoodStates(StatesGroup):
     waiting_for_tags_selection = State()
     waiting_for_diary_text = State()
 
+# Текст, который не считается заметкой при выборе тегов: кнопки reply клавиатур
+REPLY_BUTTON_TEXTS = get_reply_button_texts()
+
+# Подсказка к выбору тегов: заметку можно написать, не нажимая "Готово"
+NOTE_HINT = "\n\n📝 Заметку можно сразу написать сообщением"
+
 @router.message(Command("mood"))
 async def cmd_mood(message: Message, state: FSMContext):
     """Обработчик команды /mood - быстрая запись настроения"""
     try:
-        user_id = message.from_user.id
-
-        # Проверяем, была ли уже запись сегодня
-        today_entry = db_manager.get_today_mood(user_id)
-        if today_entry:
-            # Показываем сегодняшнюю запись
-            tags = []  # В реальном проекте нужно получить теги для записи
-            response = format_mood_entry(today_entry, tags)
-            response += "\n\n❓ Хотите обновить запись?"
-
-            await message.answer(
-                response,
-                reply_markup=get_mood_rating_keyboard()
-            )
-            return
-
-        # Начинаем процесс записи настроения
-        await start_mood_rating(message, state)
+        await show_mood_prompt(message, state, message.from_user.id)
 
     except Exception as e:
-        logger.error(f"Ошибка в команде /mood для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /mood для пользователя %s: %s", message.from_user.id, e)
         await message.answer("❌ Произошла ошибка.")
 
-@router.callback_query(F.data == "mood_record")
-async def callback_mood_record(callback: CallbackQuery, state: FSMContext):
-    """Обработчик callback кнопки записи настроения"""
-    try:
-        logger.info(f"Callback mood_record received from user {callback.from_user.id}")
-        await callback.answer()
+async def show_mood_prompt(message: Message, state: FSMContext, user_id: int, edit: bool = False):
+    """Первый шаг записи настроения - одно сообщение с клавиатурой оценки
 
-        # Создаем message-like объект для совместимости с cmd_mood
-        class MockMessage:
-            """Mock message object для совместимости между callback и message handlers"""
-            def __init__(self, callback):
-                self.from_user = callback.from_user
-                self.chat = callback.message.chat
-                self.bot = callback.bot
-
-            async def answer(self, text, reply_markup=None, parse_mode=None, **kwargs):
-                """Mock answer method для отправки сообщений"""
-                try:
-                    await self.bot.send_message(
-                        chat_id=self.chat.id,
-                        text=text,
-                        reply_markup=reply_markup,
-                        parse_mode=parse_mode,
-                        **kwargs
-                    )
-                    logger.debug(f"MockMessage answer sent to user {self.from_user.id}")
-                except Exception as e:
-                    logger.error(f"Failed to send MockMessage answer: {e}")
-                    raise
-
-        mock_message = MockMessage(callback)
-        await cmd_mood(mock_message, state)
-        logger.info(f"Successfully processed mood_record callback for user {callback.from_user.id}")
+    Следующие шаги (оценка, теги, заметка) редактируют это же сообщение.
+    user_id передается отдельно: у сообщения из callback отправитель - бот.
+    edit=True (нажатие кнопки меню) - вопрос заменяет сообщение меню,
+    чтобы старую клавиатуру нельзя было нажать еще раз.
+    """
+    send = message.edit_text if edit else message.answer
 
-    except Exception as e:
-        logger.error(f"Error in mood_record callback: {e}")
-        await callback.answer("Произошла ошибка при обработке запроса")
+    # Проверяем, была ли уже запись сегодня
+    today_entry = db_manager.get_today_mood(user_id)
+    if today_entry:
+        # Показываем сегодняшнюю запись
+        tags = []  # В реальном проекте нужно получить теги для записи
+        response = format_mood_entry(today_entry, tags)
+        response += "\n\n❓ Хотите обновить запись?"
+
+        await send(response, reply_markup=get_mood_rating_keyboard())
+        return
+
+    # Начинаем процесс записи настроения
+    await start_mood_rating(message, state, edit=edit)
 
 @router.message(F.text == "📊 Записать настроение")
 async def btn_mood_record(message: Message, state: FSMContext):
     """Обработчик кнопки записи настроения"""
     await cmd_mood(message, state)
 
-async def start_mood_rating(message: Message, state: FSMContext):
-    """Начало процесса оценки настроения"""
+async def start_mood_rating(message: Message, state: FSMContext, edit: bool = False):
+    """Начало процесса оценки настроения
+
+    Одно сообщение с inline клавиатурой. Отдельное сообщение с быстрыми
+    reply кнопками больше не отправляется: текст этих кнопок по-прежнему
+    принимается (process_mood_quick_reply). edit - см. show_mood_prompt.
+    """
     try:
         await state.set_state(MoodStates.waiting_for_mood_rating)
 
-        await message.answer(
+        send = message.edit_text if edit else message.answer
+        await send(
             "🌟 Какое у вас настроение сегодня?",
             reply_markup=get_mood_rating_keyboard()
         )
 
-        await message.answer(
-            "💡 Или используйте быстрые кнопки:",
-            reply_markup=get_mood_quick_reply()
-        )
-
     except Exception as e:
-        logger.error(f"Ошибка при начале оценки настроения: {e}")
+        logger.error("Ошибка при начале оценки настроения: %s", e)
         await state.clear()
 
-@router.callback_query(F.data.startswith("mood_select_"))
-async def callback_mood_select(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(MoodSelect)
+async def callback_mood_select(callback: CallbackQuery, state: FSMContext, callback_data: MoodSelect):
     """Обработчик выбора оценки настроения"""
     try:
-        mood_score = int(callback.data.split("_")[2])
+        mood_score = callback_data.score
 
         if not 1 <= mood_score <= 5:
             await callback.answer("❌ Неверная оценка настроения")
@@ -145,14 +123,14 @@ async def callback_mood_select(callback: CallbackQuery, state: FSMContext):
             await state.update_data(current_category=None, selected_tags=[])
             await callback.message.edit_text(
                 f"Вы выбрали: {config.MOOD_EMOJIS[mood_score]} {config.MOOD_NAMES[mood_score]}\n\n"
-                "🏷️ Выберите теги, которые описывают ваше состояние:",
+                "🏷️ Выберите теги, которые описывают ваше состояние:" + NOTE_HINT,
                 reply_markup=get_tags_selection_keyboard(tags, [], None)
             )
 
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при выборе оценки настроения: {e}")
+        logger.error("Ошибка при выборе оценки настроения: %s", e)
         await state.clear()
         await callback.message.edit_text("❌ Произошла ошибка.")
 
@@ -197,22 +175,18 @@ async def process_mood_quick_reply(message: Message, state: FSMContext):
             await state.update_data(current_category=None, selected_tags=[])
             await message.answer(
                 f"Вы выбрали: {config.MOOD_EMOJIS[mood_score]} {config.MOOD_NAMES[mood_score]}\n\n"
-                "🏷️ Выберите теги, которые описывают ваше состояние:",
+                "🏷️ Выберите теги, которые описывают ваше состояние:" + NOTE_HINT,
                 reply_markup=get_tags_selection_keyboard(tags, [], None)
             )
 
     except Exception as e:
-        logger.error(f"Ошибка при обработке быстрого ответа: {e}")
+        logger.error("Ошибка при обработке быстрого ответа: %s", e)
         await state.clear()
 
-@router.callback_query(F.data.startswith("category_"))
-async def callback_category_select(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(TagCategory)
+async def callback_category_select(callback: CallbackQuery, state: FSMContext, callback_data: TagCategory):
     """Обработчик выбора категории"""
     try:
-        category_id = callback.data.split("_", 1)[1]
-        # Преобразуем обратно из формата для callback_data
-        category_name = category_id.replace("_", " ").title()
-
         # Получаем данные из состояния
         data = await state.get_data()
         user_id = callback.from_user.id
@@ -231,11 +205,12 @@ async def callback_category_select(callback: CallbackQuery, state: FSMContext):
         # Находим правильное название категории
         actual_category = None
         for cat_name in categories.keys():
-            if cat_name.lower().replace(" ", "_") == category_id:
+            if category_key(cat_name) == callback_data.key:
                 actual_category = cat_name
                 break
 
         if actual_category:
+            edit_debouncer.cancel(callback.message)
             await state.update_data(current_category=actual_category)
             mood_text = f"Вы выбрали: {config.MOOD_EMOJIS[mood_score]} {config.MOOD_NAMES[mood_score]}\n\n" if mood_score else ""
 
@@ -247,9 +222,9 @@ async def callback_category_select(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при выборе категории: {e}")
+        logger.error("Ошибка при выборе категории: %s", e)
 
-@router.callback_query(F.data == "back_to_categories")
+@callbacks.handler("back_to_categories")
 async def callback_back_to_categories(callback: CallbackQuery, state: FSMContext):
     """Обработчик возврата к списку категорий"""
     try:
@@ -260,6 +235,7 @@ async def callback_back_to_categories(callback: CallbackQuery, state: FSMContext
         selected_tags = data.get('selected_tags', [])
 
         await state.update_data(current_category=None)
+        edit_debouncer.cancel(callback.message)
 
         mood_text = f"Вы выбрали: {config.MOOD_EMOJIS[mood_score]} {config.MOOD_NAMES[mood_score]}\n\n" if mood_score else ""
 
@@ -271,13 +247,18 @@ async def callback_back_to_categories(callback: CallbackQuery, state: FSMContext
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при возврате к категориям: {e}")
+        logger.error("Ошибка при возврате к категориям: %s", e)
+
+@callbacks.handler(TagToggle)
+async def callback_tag_toggle(callback: CallbackQuery, state: FSMContext, callback_data: TagToggle):
+    """Обработчик выбора/отмены выбора тега
 
-@router.callback_query(F.data.startswith("tag_toggle_"))
-async def callback_tag_toggle(callback: CallbackQuery, state: FSMContext):
-    """Обработчик выбора/отмены выбора тега"""
+    Нажатие подтверждается сразу, а клавиатура обновляется с паузой
+    (см. utils.debounce): при быстром выборе нескольких тегов сообщение
+    редактируется один раз, с последним выбором.
+    """
     try:
-        tag_id = int(callback.data.split("_")[2])
+        tag_id = callback_data.tag_id
 
         # Получаем текущие данные
         data = await state.get_data()
@@ -290,6 +271,7 @@ async def callback_tag_toggle(callback: CallbackQuery, state: FSMContext):
             selected_tags.append(tag_id)
 
         await state.update_data(selected_tags=selected_tags)
+        await callback.answer()
 
         # Обновляем клавиатуру
         user_id = callback.from_user.id
@@ -299,33 +281,31 @@ async def callback_tag_toggle(callback: CallbackQuery, state: FSMContext):
         mood_text = f"Вы выбрали: {config.MOOD_EMOJIS[mood_score]} {config.MOOD_NAMES[mood_score]}\n\n" if mood_score else ""
 
         if current_category:
-            await callback.message.edit_text(
-                mood_text + f"🏷️ Выберите теги из категории '{current_category}':",
-                reply_markup=get_tags_selection_keyboard(tags, selected_tags, current_category)
-            )
+            text = mood_text + f"🏷️ Выберите теги из категории '{current_category}':"
         else:
             selected_count = len(selected_tags)
             tags_text = f"🏷️ Выберите теги ({selected_count} выбрано):" if selected_count > 0 else "🏷️ Выберите теги:"
+            text = mood_text + tags_text
 
-            await callback.message.edit_text(
-                mood_text + tags_text,
-                reply_markup=get_tags_selection_keyboard(tags, selected_tags, current_category)
-            )
-
-        await callback.answer()
+        keyboard = get_tags_selection_keyboard(tags, selected_tags, current_category)
+        edit_debouncer.schedule(
+            callback.message,
+            lambda: callback.message.edit_text(text, reply_markup=keyboard)
+        )
 
     except Exception as e:
-        logger.error(f"Ошибка при выборе тега: {e}")
+        logger.error("Ошибка при выборе тега: %s", e)
 
-@router.callback_query(F.data == "noop")
+@callbacks.handler("noop")
 async def callback_noop(callback: CallbackQuery):
     """Обработчик заголовков (ничего не делает)"""
     await callback.answer()
 
-@router.callback_query(F.data == "tags_done")
+@callbacks.handler("tags_done")
 async def callback_tags_done(callback: CallbackQuery, state: FSMContext):
     """Обработчик завершения выбора тегов"""
     try:
+        edit_debouncer.cancel(callback.message)
         await state.set_state(MoodStates.waiting_for_diary_text)
 
         data = await state.get_data()
@@ -343,13 +323,14 @@ async def callback_tags_done(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при завершении выбора тегов: {e}")
+        logger.error("Ошибка при завершении выбора тегов: %s", e)
 
-@router.callback_query(F.data == "tags_reset")
+@callbacks.handler("tags_reset")
 async def callback_tags_reset(callback: CallbackQuery, state: FSMContext):
     """Обработчик сброса выбора тегов"""
     try:
         await state.update_data(selected_tags=[])
+        edit_debouncer.cancel(callback.message)
 
         data = await state.get_data()
         user_id = callback.from_user.id
@@ -366,12 +347,21 @@ async def callback_tags_reset(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Выбор тегов сброшен")
 
     except Exception as e:
-        logger.error(f"Ошибка при сбросе выбора тегов: {e}")
+        logger.error("Ошибка при сбросе выбора тегов: %s", e)
 
 @router.message(MoodStates.waiting_for_diary_text)
+@router.message(MoodStates.waiting_for_tags_selection, F.text,
+                ~F.text.startswith("/"), ~F.text.in_(REPLY_BUTTON_TEXTS))
 async def process_diary_text(message: Message, state: FSMContext):
-    """Обработка текста дневника"""
+    """Обработка текста дневника
+
+    Заметку можно написать и во время выбора тегов: запись сохраняется
+    сразу, без шага "Готово".
+    """
     try:
+        # Отложенное обновление клавиатуры тегов уже не нужно
+        edit_debouncer.cancel_chat(message.chat.id)
+
         diary_text = message.text.strip() if message.text != "❌ Отмена" else ""
 
         # Валидация текста
@@ -418,17 +408,18 @@ async def process_diary_text(message: Message, state: FSMContext):
         # Очищаем состояние
         await state.clear()
 
-        logger.info(f"Пользователь {user_id} сохранил запись настроения {entry_id}")
+        logger.info("Пользователь %s сохранил запись настроения %s", user_id, entry_id)
 
     except Exception as e:
-        logger.error(f"Ошибка при сохранении записи настроения: {e}")
+        logger.error("Ошибка при сохранении записи настроения: %s", e)
         await state.clear()
         await message.answer("❌ Произошла ошибка при сохранении.")
 
-@router.callback_query(F.data == "cancel")
+@callbacks.handler("cancel")
 async def callback_cancel(callback: CallbackQuery, state: FSMContext):
     """Обработчик отмены"""
     try:
+        edit_debouncer.cancel(callback.message)
         await state.clear()
         await callback.message.edit_text(
             "❌ Действие отменено.",
@@ -436,7 +427,7 @@ async def callback_cancel(callback: CallbackQuery, state: FSMContext):
         )
         await callback.answer()
     except Exception as e:
-        logger.error(f"Ошибка при отмене: {e}")
+        logger.error("Ошибка при отмене: %s", e)
 
 @router.message(F.text == "❌ Отмена")
 async def message_cancel(message: Message, state: FSMContext):
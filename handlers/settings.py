@@ -1,4 +1,10 @@
+import asyncio
+import contextvars
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
 from datetime import time
+from typing import Optional, Set, Tuple
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -13,9 +19,11 @@ from keyboards.inline import (
     get_confirmation_keyboard
 )
 from keyboards.reply import get_main_reply_keyboard
-from config import logger
+from config import config, logger
+from utils.callbacks import callbacks
 from utils.helpers import parse_time_string
-from aiogram.types import InputFile
+from utils.singleflight import single_flight, Overloaded
+from aiogram.types import BufferedInputFile
 
 router = Router()
 
@@ -30,7 +38,7 @@ async def cmd_settings(message: Message):
     try:
         await show_settings_menu(message)
     except Exception as e:
-        logger.error(f"Ошибка в команде /settings для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /settings для пользователя %s: %s", message.from_user.id, e)
         await message.answer("❌ Произошла ошибка.")
 
 @router.message(F.text == "⚙️ Настройки")
@@ -38,10 +46,13 @@ async def btn_settings(message: Message):
     """Обработчик кнопки Настройки"""
     await cmd_settings(message)
 
-async def show_settings_menu(message: Message):
-    """Показать меню настроек"""
+async def show_settings_menu(message: Message, user_id: int = None):
+    """Показать меню настроек
+
+    user_id передается из callback: у сообщения с кнопкой отправитель - бот.
+    """
     try:
-        user_id = message.from_user.id
+        user_id = user_id or message.from_user.id
 
         # Получаем текущие настройки
         settings = db_manager.get_user_settings(user_id)
@@ -72,10 +83,10 @@ async def show_settings_menu(message: Message):
         )
 
     except Exception as e:
-        logger.error(f"Ошибка при показе меню настроек: {e}")
+        logger.error("Ошибка при показе меню настроек: %s", e)
         await message.answer("❌ Произошла ошибка.")
 
-@router.callback_query(F.data == "settings_reminder_time")
+@callbacks.handler("settings_reminder_time")
 async def callback_settings_reminder_time(callback: CallbackQuery, state: FSMContext):
     """Обработчик настройки времени напоминания"""
     try:
@@ -89,7 +100,7 @@ async def callback_settings_reminder_time(callback: CallbackQuery, state: FSMCon
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при настройке времени напоминания: {e}")
+        logger.error("Ошибка при настройке времени напоминания: %s", e)
 
 @router.message(SettingsStates.waiting_for_reminder_time)
 async def process_reminder_time(message: Message, state: FSMContext):
@@ -125,13 +136,13 @@ async def process_reminder_time(message: Message, state: FSMContext):
         )
 
         await state.clear()
-        logger.info(f"Пользователь {user_id} установил время напоминания на {reminder_time}")
+        logger.info("Пользователь %s установил время напоминания на %s", user_id, reminder_time)
 
     except Exception as e:
-        logger.error(f"Ошибка при установке времени напоминания: {e}")
+        logger.error("Ошибка при установке времени напоминания: %s", e)
         await state.clear()
 
-@router.callback_query(F.data == "settings_reminders")
+@callbacks.handler("settings_reminders")
 async def callback_settings_reminders(callback: CallbackQuery):
     """Обработчик включения/отключения напоминаний"""
     try:
@@ -162,9 +173,9 @@ async def callback_settings_reminders(callback: CallbackQuery):
         await callback.answer(f"Напоминания {status_text}")
 
     except Exception as e:
-        logger.error(f"Ошибка при переключении напоминаний: {e}")
+        logger.error("Ошибка при переключении напоминаний: %s", e)
 
-@router.callback_query(F.data == "settings_timezone")
+@callbacks.handler("settings_timezone")
 async def callback_settings_timezone(callback: CallbackQuery, state: FSMContext):
     """Обработчик настройки часового пояса"""
     try:
@@ -179,7 +190,7 @@ async def callback_settings_timezone(callback: CallbackQuery, state: FSMContext)
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при настройке часового пояса: {e}")
+        logger.error("Ошибка при настройке часового пояса: %s", e)
 
 @router.message(SettingsStates.waiting_for_timezone)
 async def process_timezone(message: Message, state: FSMContext):
@@ -207,22 +218,98 @@ async def process_timezone(message: Message, state: FSMContext):
         )
 
         await state.clear()
-        logger.info(f"Пользователь {user_id} установил часовой пояс {timezone_str}")
+        logger.info("Пользователь %s установил часовой пояс %s", user_id, timezone_str)
 
     except Exception as e:
-        logger.error(f"Ошибка при установке часового пояса: {e}")
+        logger.error("Ошибка при установке часового пояса: %s", e)
         await state.clear()
 
-@router.callback_query(F.data == "settings_export")
+def _export_csv(user_id: int) -> Optional[Tuple[bytes, int, str]]:
+    """CSV с записями пользователя, число записей и дата экспорта (None - записей нет)"""
+    export_data = db_manager.export_user_data(user_id)
+    if not export_data['entries']:
+        return None
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    # Заголовки
+    writer.writerow(['Дата', 'Настроение', 'Оценка', 'Заметка', 'Теги'])
+
+    # Данные
+    for entry in export_data['entries']:
+        writer.writerow([
+            entry['date'],
+            entry['mood_name'],
+            entry['mood_score'],
+            entry['diary_text'],
+            entry['tags']
+        ])
+
+    return output.getvalue().encode('utf-8'), export_data['total_entries'], export_data['export_date']
+
+# Выгрузки собираются по одной в своем потоке; длину очереди ограничивает
+# config.CHART_QUEUE_LIMIT, как и у графиков
+export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+# Выгрузки, поставленные в очередь при перегрузке (файл присылается, когда готов)
+_queued_exports: Set[asyncio.Task] = set()
+
+async def _send_export(bot, chat_id: int, user_id: int, export: Tuple[bytes, int, str]):
+    csv_bytes, total_entries, export_date = export
+    await bot.send_document(
+        chat_id=chat_id,
+        document=BufferedInputFile(csv_bytes, filename=f"mood_tracker_export_{user_id}.csv"),
+        caption="📤 Экспорт данных в формате CSV\n\n" +
+               f"Всего записей: {total_entries}\n" +
+               f"Дата экспорта: {export_date[:10]}",
+        reply_markup=get_back_keyboard("settings_menu")
+    )
+
+async def _send_export_when_ready(bot, chat_id: int, user_id: int):
+    """Дождаться выгрузки в очереди и прислать файл"""
+    try:
+        export = await single_flight.run(user_id, 'export', _export_csv, executor=export_executor)
+        if export is None:
+            await bot.send_message(chat_id, "📤 У вас нет данных для экспорта.")
+            return
+        await _send_export(bot, chat_id, user_id, export)
+    except Exception as e:
+        logger.error("Ошибка отложенного экспорта для пользователя %s: %s", user_id, e)
+
+def _queue_export(bot, chat_id: int, user_id: int):
+    """Отложить выгрузку; при config.OVERLOAD_QUEUE_LIMIT отложенных - Overloaded"""
+    if 0 < config.OVERLOAD_QUEUE_LIMIT <= len(_queued_exports):
+        raise Overloaded('export')
+
+    # Задача создается в пустом контексте: сессия базы обновления
+    # (DatabaseManager.session) к отправке файла уже закрыта
+    task = contextvars.Context().run(asyncio.create_task, _send_export_when_ready(bot, chat_id, user_id))
+    _queued_exports.add(task)
+    task.add_done_callback(_queued_exports.discard)
+
+@callbacks.handler("settings_export")
 async def callback_settings_export(callback: CallbackQuery):
     """Обработчик экспорта данных"""
     try:
         user_id = callback.from_user.id
 
-        # Получаем данные пользователя
-        export_data = db_manager.export_user_data(user_id)
+        # Файл собирается в потоке выгрузок; двойное нажатие собирает его один раз
+        try:
+            export = await single_flight.run(user_id, 'export', _export_csv,
+                                             executor=export_executor, limit=config.CHART_QUEUE_LIMIT)
+        except Overloaded:
+            try:
+                _queue_export(callback.bot, callback.message.chat.id, user_id)
+                text = ("⏳ Сейчас много запросов. Файл с данными будет готов чуть позже - "
+                        "я пришлю его отдельным сообщением.")
+            except Overloaded:
+                text = "⏳ Сейчас много запросов. Попробуйте экспорт чуть позже."
+            await callback.message.edit_text(text, reply_markup=get_back_keyboard("settings_menu"))
+            await callback.answer()
+            return
 
-        if not export_data['entries']:
+        if export is None:
             await callback.message.edit_text(
                 "📤 У вас нет данных для экспорта.\n\n" +
                 "Начните с создания записей настроения!",
@@ -230,57 +317,20 @@ async def callback_settings_export(callback: CallbackQuery):
             )
             return
 
-        # Создаем CSV файл
-        import csv
-        import io
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Заголовки
-        writer.writerow(['Дата', 'Настроение', 'Оценка', 'Заметка', 'Теги'])
-
-        # Данные
-        for entry in export_data['entries']:
-            writer.writerow([
-                entry['date'],
-                entry['mood_name'],
-                entry['mood_score'],
-                entry['diary_text'],
-                entry['tags']
-            ])
-
-        csv_content = output.getvalue()
-        output.close()
-
-        # Отправляем файл
-        from io import BytesIO
-        csv_bytes = BytesIO(csv_content.encode('utf-8'))
-
         try:
             await callback.message.delete()
         except Exception:
             pass  # Игнорируем ошибку если сообщение уже удалено
 
-        # Создаем InputFile из BytesIO
-        csv_file = InputFile(csv_bytes, filename=f"mood_tracker_export_{user_id}.csv")
-
-        await callback.bot.send_document(
-            chat_id=callback.message.chat.id,
-            document=csv_file,
-            caption="📤 Экспорт данных в формате CSV\n\n" +
-                   f"Всего записей: {export_data['total_entries']}\n" +
-                   f"Дата экспорта: {export_data['export_date'][:10]}",
-            reply_markup=get_back_keyboard("settings_menu")
-        )
+        await _send_export(callback.bot, callback.message.chat.id, user_id, export)
 
         await callback.answer("Экспорт завершен")
 
     except Exception as e:
-        logger.error(f"Ошибка при экспорте данных: {e}")
+        logger.error("Ошибка при экспорте данных: %s", e)
         await callback.message.edit_text("❌ Произошла ошибка при экспорте.")
 
-@router.callback_query(F.data == "settings_reset")
+@callbacks.handler("settings_reset")
 async def callback_settings_reset(callback: CallbackQuery):
     """Обработчик сброса данных"""
     try:
@@ -303,15 +353,15 @@ async def callback_settings_reset(callback: CallbackQuery):
             "⚠️ Это действие нельзя отменить!\n" +
             "Все данные будут удалены без возможности восстановления.\n\n" +
             "Вы действительно хотите удалить все данные?",
-            reply_markup=get_confirmation_keyboard("reset_data")
+            reply_markup=get_confirmation_keyboard("confirm_reset_data")
         )
 
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при сбросе данных: {e}")
+        logger.error("Ошибка при сбросе данных: %s", e)
 
-@router.callback_query(F.data == "confirm_reset_data")
+@callbacks.handler("confirm_reset_data")
 async def callback_confirm_reset_data(callback: CallbackQuery):
     """Подтверждение сброса данных"""
     try:
@@ -325,57 +375,9 @@ async def callback_confirm_reset_data(callback: CallbackQuery):
             reply_markup=get_main_menu_keyboard()
         )
 
-        logger.info(f"Пользователь {user_id} сбросил все данные")
-
-        await callback.answer()
-
-    except Exception as e:
-        logger.error(f"Ошибка при подтверждении сброса данных: {e}")
-
-@router.callback_query(F.data == "settings_menu")
-async def callback_settings_menu(callback: CallbackQuery):
-    """Обработчик возврата в меню настроек"""
-    try:
-        user_id = callback.from_user.id
-        settings = db_manager.get_user_settings(user_id)
-
-        response = "⚙️ Настройки бота\n\n"
-        response += f"⏰ Время напоминания: {settings.reminder_time.strftime('%H:%M')}\n"
-        response += f"🔔 Напоминания: {'Включены' if settings.daily_reminder else 'Отключены'}\n"
-        response += f"🌍 Часовой пояс: {settings.language}\n"
-
-        await callback.message.edit_text(
-            response,
-            reply_markup=get_settings_keyboard()
-        )
-
-        await callback.answer()
-
-    except Exception as e:
-        logger.error(f"Ошибка при возврате в меню настроек: {e}")
+        logger.info("Пользователь %s сбросил все данные", user_id)
 
-@router.callback_query(F.data == "back_to_main")
-async def callback_back_to_main(callback: CallbackQuery, state: FSMContext):
-    """Обработчик возврата в главное меню"""
-    try:
-        await state.clear()
-        await callback.message.edit_text(
-            "🏠 Выберите действие:",
-            reply_markup=get_main_menu_keyboard()
-        )
         await callback.answer()
-    except Exception as e:
-        logger.error(f"Ошибка при возврате в главное меню: {e}")
 
-@router.callback_query(F.data == "cancel")
-async def callback_cancel(callback: CallbackQuery, state: FSMContext):
-    """Обработчик отмены"""
-    try:
-        await state.clear()
-        await callback.message.edit_text(
-            "❌ Действие отменено.",
-            reply_markup=get_main_menu_keyboard()
-        )
-        await callback.answer()
     except Exception as e:
-        logger.error(f"Ошибка при отмене: {e}")
+        logger.error("Ошибка при подтверждении сброса данных: %s", e)
@@ -7,6 +7,8 @@ from database.db_manager import db_manager
 from keyboards.inline import get_main_menu_keyboard, get_analytics_keyboard
 from keyboards.reply import get_main_reply_keyboard
 from config import config, logger
+from utils.callbacks import callbacks
+from utils.singleflight import single_flight
 from messages import messages
 
 # Импортируем функции для меню из других файлов
@@ -31,7 +33,7 @@ async def cmd_start(message: Message):
             first_name=first_name
         )
 
-        logger.info(f"Пользователь {user_id} ({username}) начал работу с ботом")
+        logger.info("Пользователь %s (%s) начал работу с ботом", user_id, username)
 
         # Приветственное сообщение
         welcome_text = f"""
@@ -53,7 +55,7 @@ async def cmd_start(message: Message):
         )
 
     except Exception as e:
-        logger.error(f"Ошибка в команде /start для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /start для пользователя %s: %s", message.from_user.id, e)
         await message.answer(
             "❌ Произошла ошибка. Попробуйте позже.",
             reply_markup=get_main_reply_keyboard()
@@ -68,7 +70,7 @@ async def cmd_help(message: Message):
             reply_markup=get_main_reply_keyboard()
         )
     except Exception as e:
-        logger.error(f"Ошибка в команде /help для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /help для пользователя %s: %s", message.from_user.id, e)
         await message.answer(messages.ERROR_SERVICE_UNAVAILABLE)
 
 @router.message(F.text == "ℹ️ Помощь")
@@ -85,7 +87,7 @@ async def btn_main_menu(message: Message):
             reply_markup=get_main_menu_keyboard()
         )
     except Exception as e:
-        logger.error(f"Ошибка при показе главного меню для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка при показе главного меню для пользователя %s: %s", message.from_user.id, e)
         await message.answer(messages.ERROR_SERVICE_UNAVAILABLE)
 
 @router.message(Command("privacy"))
@@ -118,7 +120,7 @@ MoodTracker Bot уважает вашу приватность и конфиде
 """
         await message.answer(privacy_text)
     except Exception as e:
-        logger.error(f"Ошибка в команде /privacy для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /privacy для пользователя %s: %s", message.from_user.id, e)
         await message.answer("❌ Произошла ошибка.")
 
 @router.message(Command("stats"))
@@ -132,7 +134,7 @@ async def cmd_stats(message: Message):
         start_date = date.today() - timedelta(days=7)
         end_date = date.today()
 
-        stats = db_manager.get_mood_stats(user_id, start_date, end_date)
+        stats = await single_flight.run(user_id, 'stats', db_manager.get_mood_stats, start_date, end_date)
 
         if stats.total_entries == 0:
             await message.answer(
@@ -148,54 +150,27 @@ async def cmd_stats(message: Message):
         await message.answer(stats_message)
 
     except Exception as e:
-        logger.error(f"Ошибка в команде /stats для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /stats для пользователя %s: %s", message.from_user.id, e)
         await message.answer("❌ Произошла ошибка при получении статистики.")
 
-@router.callback_query(F.data == "mood_record")
+@callbacks.handler("mood_record")
 async def callback_mood_record_from_main(callback: CallbackQuery, state: FSMContext):
     """Обработчик callback кнопки записи настроения из главного меню"""
     try:
-        logger.info(f"Callback mood_record received from main menu by user {callback.from_user.id}")
         await callback.answer()
 
-        # Создаем message-like объект для совместимости
-        class MockMessage:
-            """Mock message object для совместимости между callback и message handlers"""
-            def __init__(self, callback):
-                self.from_user = callback.from_user
-                self.chat = callback.message.chat
-                self.bot = callback.bot
-
-            async def answer(self, text, reply_markup=None, parse_mode=None, **kwargs):
-                """Mock answer method для отправки сообщений"""
-                try:
-                    await self.bot.send_message(
-                        chat_id=self.chat.id,
-                        text=text,
-                        reply_markup=reply_markup,
-                        parse_mode=parse_mode,
-                        **kwargs
-                    )
-                    logger.debug(f"MockMessage answer sent to user {self.from_user.id}")
-                except Exception as e:
-                    logger.error(f"Failed to send MockMessage answer: {e}")
-                    raise
-
-        # Импортируем функцию из mood.py
-        from handlers.mood import cmd_mood
-        mock_message = MockMessage(callback)
-        await cmd_mood(mock_message, state)
-        logger.info(f"Successfully processed mood_record from main menu for user {callback.from_user.id}")
+        # Вопрос об оценке заменяет сообщение меню (его отправил бот)
+        from handlers.mood import show_mood_prompt
+        await show_mood_prompt(callback.message, state, callback.from_user.id, edit=True)
 
     except Exception as e:
-        logger.error(f"Error in mood_record from main menu callback: {e}")
+        logger.error("Error in mood_record from main menu callback: %s", e)
         await callback.answer("Произошла ошибка при обработке запроса")
 
-@router.callback_query(F.data == "analytics_menu")
+@callbacks.handler("analytics_menu")
 async def callback_analytics_menu(callback: CallbackQuery):
     """Обработчик callback кнопки Аналитика"""
     try:
-        logger.info(f"Callback analytics_menu received from user {callback.from_user.id}")
         await callback.answer()
 
         # Проверяем, есть ли записи для анализа
@@ -215,101 +190,43 @@ async def callback_analytics_menu(callback: CallbackQuery):
             text="📈 Аналитика настроения\n\nВыберите тип анализа:",
             reply_markup=get_analytics_keyboard()
         )
-        logger.info(f"Successfully showed analytics menu for user {callback.from_user.id}")
 
     except Exception as e:
-        logger.error(f"Error in analytics_menu callback: {e}")
+        logger.error("Error in analytics_menu callback: %s", e)
         await callback.answer("Произошла ошибка при открытии аналитики")
 
-@router.callback_query(F.data == "diary_menu")
+@callbacks.handler("diary_menu")
 async def callback_diary_menu(callback: CallbackQuery):
     """Обработчик callback кнопки Дневник"""
     try:
-        logger.info(f"Callback diary_menu received from user {callback.from_user.id}")
         await callback.answer()
 
-        # Создаем MockMessage для совместимости с функцией show_diary_menu
-        class MockMessage:
-            def __init__(self, callback):
-                self.from_user = callback.from_user
-                self.chat = callback.message.chat
-                self.bot = callback.bot
-
-            async def answer(self, text, reply_markup=None, parse_mode=None, **kwargs):
-                await self.bot.send_message(
-                    chat_id=self.chat.id,
-                    text=text,
-                    reply_markup=reply_markup,
-                    parse_mode=parse_mode,
-                    **kwargs
-                )
-
-        mock_message = MockMessage(callback)
-        await show_diary_menu(mock_message)
-        logger.info(f"Successfully showed diary menu for user {callback.from_user.id}")
+        await show_diary_menu(callback.message)
 
     except Exception as e:
-        logger.error(f"Error in diary_menu callback: {e}")
+        logger.error("Error in diary_menu callback: %s", e)
         await callback.answer("Произошла ошибка при открытии дневника")
 
-@router.callback_query(F.data == "tags_menu")
+@callbacks.handler("tags_menu")
 async def callback_tags_menu(callback: CallbackQuery):
     """Обработчик callback кнопки Мои теги"""
     try:
-        logger.info(f"Callback tags_menu received from user {callback.from_user.id}")
         await callback.answer()
 
-        # Создаем MockMessage для совместимости с функцией show_tags_menu
-        class MockMessage:
-            def __init__(self, callback):
-                self.from_user = callback.from_user
-                self.chat = callback.message.chat
-                self.bot = callback.bot
-
-            async def answer(self, text, reply_markup=None, parse_mode=None, **kwargs):
-                await self.bot.send_message(
-                    chat_id=self.chat.id,
-                    text=text,
-                    reply_markup=reply_markup,
-                    parse_mode=parse_mode,
-                    **kwargs
-                )
-
-        mock_message = MockMessage(callback)
-        await show_tags_menu(mock_message)
-        logger.info(f"Successfully showed tags menu for user {callback.from_user.id}")
+        await show_tags_menu(callback.message, callback.from_user.id)
 
     except Exception as e:
-        logger.error(f"Error in tags_menu callback: {e}")
+        logger.error("Error in tags_menu callback: %s", e)
         await callback.answer("Произошла ошибка при открытии тегов")
 
-@router.callback_query(F.data == "settings_menu")
+@callbacks.handler("settings_menu")
 async def callback_settings_menu(callback: CallbackQuery):
     """Обработчик callback кнопки Настройки"""
     try:
-        logger.info(f"Callback settings_menu received from user {callback.from_user.id}")
         await callback.answer()
 
-        # Создаем MockMessage для совместимости с функцией show_settings_menu
-        class MockMessage:
-            def __init__(self, callback):
-                self.from_user = callback.from_user
-                self.chat = callback.message.chat
-                self.bot = callback.bot
-
-            async def answer(self, text, reply_markup=None, parse_mode=None, **kwargs):
-                await self.bot.send_message(
-                    chat_id=self.chat.id,
-                    text=text,
-                    reply_markup=reply_markup,
-                    parse_mode=parse_mode,
-                    **kwargs
-                )
-
-        mock_message = MockMessage(callback)
-        await show_settings_menu(mock_message)
-        logger.info(f"Successfully showed settings menu for user {callback.from_user.id}")
+        await show_settings_menu(callback.message, callback.from_user.id)
 
     except Exception as e:
-        logger.error(f"Error in settings_menu callback: {e}")
+        logger.error("Error in settings_menu callback: %s", e)
         await callback.answer("Произошла ошибка при открытии настроек")
@@ -13,6 +13,7 @@ from keyboards.inline import (
 )
 from keyboards.reply import get_main_reply_keyboard
 from config import logger
+from utils.callbacks import callbacks, DeleteTag, ConfirmDeleteTag
 
 router = Router()
 
@@ -27,7 +28,7 @@ async def cmd_tags(message: Message):
     try:
         await show_tags_menu(message)
     except Exception as e:
-        logger.error(f"Ошибка в команде /tags для пользователя {message.from_user.id}: {e}")
+        logger.error("Ошибка в команде /tags для пользователя %s: %s", message.from_user.id, e)
         await message.answer("❌ Произошла ошибка.")
 
 @router.message(F.text == "🏷️ Мои теги")
@@ -35,10 +36,13 @@ async def btn_tags(message: Message):
     """Обработчик кнопки Мои теги"""
     await cmd_tags(message)
 
-async def show_tags_menu(message: Message):
-    """Показать меню управления тегами"""
+async def show_tags_menu(message: Message, user_id: int = None):
+    """Показать меню управления тегами
+
+    user_id передается из callback: у сообщения с кнопкой отправитель - бот.
+    """
     try:
-        user_id = message.from_user.id
+        user_id = user_id or message.from_user.id
 
         # Получаем все теги пользователя
         tags = db_manager.get_all_tags(user_id)
@@ -90,10 +94,10 @@ async def show_tags_menu(message: Message):
         )
 
     except Exception as e:
-        logger.error(f"Ошибка при показе меню тегов: {e}")
+        logger.error("Ошибка при показе меню тегов: %s", e)
         await message.answer("❌ Произошла ошибка.")
 
-@router.callback_query(F.data == "tag_create")
+@callbacks.handler("tag_create")
 async def callback_tag_create(callback: CallbackQuery, state: FSMContext):
     """Обработчик создания нового тега"""
     try:
@@ -107,7 +111,7 @@ async def callback_tag_create(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при создании тега: {e}")
+        logger.error("Ошибка при создании тега: %s", e)
 
 @router.message(TagStates.waiting_for_tag_name)
 async def process_tag_name(message: Message, state: FSMContext):
@@ -152,7 +156,7 @@ async def process_tag_name(message: Message, state: FSMContext):
         await state.set_state(TagStates.waiting_for_category_name)
 
     except Exception as e:
-        logger.error(f"Ошибка при обработке названия тега: {e}")
+        logger.error("Ошибка при обработке названия тега: %s", e)
         await state.clear()
 
 @router.message(TagStates.waiting_for_category_name)
@@ -187,14 +191,14 @@ async def process_category_name(message: Message, state: FSMContext):
         )
 
         await state.clear()
-        logger.info(f"Пользователь {user_id} создал тег '{tag_name}' в категории '{category_name}'")
+        logger.info("Пользователь %s создал тег '%s' в категории '%s'", user_id, tag_name, category_name)
 
     except Exception as e:
-        logger.error(f"Ошибка при создании тега: {e}")
+        logger.error("Ошибка при создании тега: %s", e)
         await state.clear()
         await message.answer("❌ Произошла ошибка при создании тега.")
 
-@router.callback_query(F.data == "tag_delete")
+@callbacks.handler("tag_delete")
 async def callback_tag_delete(callback: CallbackQuery):
     """Обработчик удаления тега"""
     try:
@@ -219,7 +223,7 @@ async def callback_tag_delete(callback: CallbackQuery):
         for tag in custom_tags:
             builder.button(
                 text=f"🗑️ {tag.name}",
-                callback_data=f"delete_tag_{tag.id}"
+                callback_data=DeleteTag(tag_id=tag.id)
             )
 
         builder.button(text="⬅️ Назад", callback_data="tags_menu")
@@ -234,13 +238,13 @@ async def callback_tag_delete(callback: CallbackQuery):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при удалении тега: {e}")
+        logger.error("Ошибка при удалении тега: %s", e)
 
-@router.callback_query(F.data.startswith("delete_tag_"))
-async def callback_delete_specific_tag(callback: CallbackQuery):
+@callbacks.handler(DeleteTag)
+async def callback_delete_specific_tag(callback: CallbackQuery, callback_data: DeleteTag):
     """Обработчик удаления конкретного тега"""
     try:
-        tag_id = int(callback.data.split("_")[2])
+        tag_id = callback_data.tag_id
         user_id = callback.from_user.id
 
         # Получаем информацию о теге
@@ -259,19 +263,19 @@ async def callback_delete_specific_tag(callback: CallbackQuery):
         await callback.message.edit_text(
             f"🗑️ Удалить тег '{tag_to_delete.name}'?\n\n" +
             "Это действие нельзя отменить!",
-            reply_markup=get_confirmation_keyboard(f"delete_tag_{tag_id}")
+            reply_markup=get_confirmation_keyboard(ConfirmDeleteTag(tag_id=tag_id).pack())
         )
 
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при удалении тега: {e}")
+        logger.error("Ошибка при удалении тега: %s", e)
 
-@router.callback_query(F.data.startswith("confirm_delete_tag_"))
-async def callback_confirm_delete_tag(callback: CallbackQuery):
+@callbacks.handler(ConfirmDeleteTag)
+async def callback_confirm_delete_tag(callback: CallbackQuery, callback_data: ConfirmDeleteTag):
     """Подтверждение удаления тега"""
     try:
-        tag_id = int(callback.data.split("_")[3])
+        tag_id = callback_data.tag_id
         user_id = callback.from_user.id
 
         # Удаляем тег
@@ -282,7 +286,7 @@ async def callback_confirm_delete_tag(callback: CallbackQuery):
                 "✅ Тег успешно удален!",
                 reply_markup=get_back_keyboard("tags_menu")
             )
-            logger.info(f"Пользователь {user_id} удалил тег {tag_id}")
+            logger.info("Пользователь %s удалил тег %s", user_id, tag_id)
         else:
             await callback.message.edit_text(
                 "❌ Не удалось удалить тег.\nВозможно, он уже был удален.",
@@ -292,46 +296,36 @@ async def callback_confirm_delete_tag(callback: CallbackQuery):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при подтверждении удаления тега: {e}")
+        logger.error("Ошибка при подтверждении удаления тега: %s", e)
 
-@router.callback_query(F.data == "tag_stats")
+@callbacks.handler("tag_stats")
 async def callback_tag_stats(callback: CallbackQuery):
     """Обработчик статистики по тегам"""
     try:
         user_id = callback.from_user.id
 
-        # Получаем все записи пользователя
-        entries = db_manager.get_mood_entries(user_id)
+        # Счетчики использования из tag_usage (самые частые первыми)
+        usage = db_manager.get_tag_usage(user_id)
 
-        if not entries:
+        if not usage:
             await callback.message.edit_text(
                 "📊 Нет данных для анализа тегов.",
                 reply_markup=get_back_keyboard("tags_menu")
             )
             return
 
-        # Собираем статистику по тегам
-        tags = db_manager.get_all_tags(user_id)
-        tag_usage = {}
-
-        for tag in tags:
-            usage_count = 0
-            # В реальном проекте нужно подсчитать использование тега
-            tag_usage[tag.name] = usage_count
-
         # Форматируем статистику
         response = "📊 Статистика использования тегов:\n\n"
 
-        if tag_usage:
-            sorted_usage = sorted(tag_usage.items(), key=lambda x: x[1], reverse=True)
+        for tag in usage:
+            response += (f"🏷️ {tag.name}: {tag.count} раз, "
+                         f"среднее настроение {tag.average_mood:.1f}\n")
 
-            for tag_name, count in sorted_usage:
-                if count > 0:
-                    response += f"🏷️ {tag_name}: {count} раз\n"
-                else:
-                    response += f"🏷️ {tag_name}: не использовался\n"
-        else:
-            response += "У вас пока нет статистики по тегам."
+        # Остальные теги пользователя еще не использовались
+        used_ids = {tag.tag_id for tag in usage}
+        unused = [tag.name for tag in db_manager.get_all_tags(user_id) if tag.id not in used_ids]
+        if unused:
+            response += "\n💤 Не использовались: " + ", ".join(unused)
 
         await callback.message.edit_text(
             response,
@@ -341,42 +335,4 @@ async def callback_tag_stats(callback: CallbackQuery):
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка при получении статистики тегов: {e}")
-
-@router.callback_query(F.data == "tags_menu")
-async def callback_tags_menu(callback: CallbackQuery):
-    """Обработчик возврата в меню тегов"""
-    try:
-        await callback.message.edit_text(
-            "🏷️ Управление тегами\n\nВыберите действие:",
-            reply_markup=get_back_keyboard()
-        )
-        await callback.answer()
-    except Exception as e:
-        logger.error(f"Ошибка при возврате в меню тегов: {e}")
-
-@router.callback_query(F.data == "back_to_main")
-async def callback_back_to_main(callback: CallbackQuery, state: FSMContext):
-    """Обработчик возврата в главное меню"""
-    try:
-        await state.clear()
-        await callback.message.edit_text(
-            "🏠 Выберите действие:",
-            reply_markup=get_main_menu_keyboard()
-        )
-        await callback.answer()
-    except Exception as e:
-        logger.error(f"Ошибка при возврате в главное меню: {e}")
-
-@router.callback_query(F.data == "cancel")
-async def callback_cancel(callback: CallbackQuery, state: FSMContext):
-    """Обработчик отмены"""
-    try:
-        await state.clear()
-        await callback.message.edit_text(
-            "❌ Действие отменено.",
-            reply_markup=get_main_menu_keyboard()
-        )
-        await callback.answer()
-    except Exception as e:
-        logger.error(f"Ошибка при отмене: {e}")
+        logger.error("Ошибка при получении статистики тегов: %s", e)
@@ -1,6 +1,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import config
+from utils.callbacks import MoodSelect, TagCategory, TagToggle, AnalyticsPeriod, category_key
 
 def get_main_menu_keyboard() -> InlineKeyboardMarkup:
     """Главная клавиатура меню"""
@@ -24,7 +25,7 @@ def get_mood_rating_keyboard() -> InlineKeyboardMarkup:
         name = config.MOOD_NAMES[score]
         builder.button(
             text=f"{emoji} {score} - {name}",
-            callback_data=f"mood_select_{score}"
+            callback_data=MoodSelect(score=score)
         )
 
     builder.adjust(1)
@@ -59,7 +60,7 @@ def get_tags_selection_keyboard(tags: list, selected_tags: list = None, current_
 
             builder.button(
                 text=f"📁 {category_name}{status}",
-                callback_data=f"category_{category_name.lower().replace(' ', '_')}"
+                callback_data=TagCategory(key=category_key(category_name))
             )
 
         builder.button(text="➕ Создать тег", callback_data="tag_create")
@@ -79,12 +80,12 @@ def get_tags_selection_keyboard(tags: list, selected_tags: list = None, current_
             status = "🟢" if is_selected else "⚪"
             builder.button(
                 text=f"{status} {tag.name}",
-                callback_data=f"tag_toggle_{tag.id}"
+                callback_data=TagToggle(tag_id=tag.id)
             )
 
         # Если тегов больше 8, добавляем пагинацию (упрощенная версия)
         if len(category_tags) > 8:
-            builder.button(text="📄 Еще теги...", callback_data="tag_page_2")
+            builder.button(text="📄 Еще теги...", callback_data="noop")
 
         # Кнопки управления
         builder.button(text="⬅️ Назад к категориям", callback_data="back_to_categories")
@@ -109,10 +110,10 @@ def get_analytics_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура аналитики"""
     builder = InlineKeyboardBuilder()
 
-    builder.button(text="📊 График за неделю", callback_data="analytics_week")
-    builder.button(text="📈 График за месяц", callback_data="analytics_month")
-    builder.button(text="📅 График за квартал", callback_data="analytics_quarter")
-    builder.button(text="📊 График за год", callback_data="analytics_year")
+    builder.button(text="📊 График за неделю", callback_data=AnalyticsPeriod(period="week"))
+    builder.button(text="📈 График за месяц", callback_data=AnalyticsPeriod(period="month"))
+    builder.button(text="📅 График за квартал", callback_data=AnalyticsPeriod(period="quarter"))
+    builder.button(text="📊 График за год", callback_data=AnalyticsPeriod(period="year"))
     builder.button(text="📅 Статистика по дням", callback_data="analytics_days")
     builder.button(text="🏷️ Анализ тегов", callback_data="analytics_tags")
     builder.button(text="🔍 Поиск паттернов", callback_data="analytics_patterns")
@@ -133,12 +134,12 @@ def get_settings_keyboard() -> InlineKeyboardMarkup:
     builder.adjust(2, 2, 1)
     return builder.as_markup()
 
-def get_confirmation_keyboard(action: str) -> InlineKeyboardMarkup:
-    """Клавиатура подтверждения действия"""
+def get_confirmation_keyboard(confirm_data: str) -> InlineKeyboardMarkup:
+    """Клавиатура подтверждения действия (confirm_data - callback_data кнопки "Да")"""
     builder = InlineKeyboardBuilder()
 
-    builder.button(text="✅ Да", callback_data=f"confirm_{action}")
-    builder.button(text="❌ Нет", callback_data=f"cancel_{action}")
+    builder.button(text="✅ Да", callback_data=confirm_data)
+    builder.button(text="❌ Нет", callback_data="cancel")
 
     builder.adjust(2)
     return builder.as_markup()
@@ -35,3 +35,8 @@ def get_cancel_reply_keyboard() -> ReplyKeyboardMarkup:
     builder.button(text="❌ Отмена")
 
     return builder.as_markup(resize_keyboard=True)
+
+def get_reply_button_texts() -> set:
+    """Тексты кнопок всех reply клавиатур (нажатие кнопки - не ввод текста)"""
+    keyboards = (get_main_reply_keyboard(), get_mood_quick_reply(), get_cancel_reply_keyboard())
+    return {button.text for keyboard in keyboards for row in keyboard.keyboard for button in row}
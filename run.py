@@ -9,6 +9,7 @@
 import sys
 import os
 import logging
+from importlib.util import find_spec
 from pathlib import Path
 
 # Настройка логирования
@@ -27,12 +28,11 @@ def check_python_version():
     return True
 
 def check_dependencies():
-    """Проверка наличия зависимостей"""
+    """Проверка наличия зависимостей (без импорта самих модулей)"""
     required_modules = [
         'aiogram',
         'matplotlib',
-        'pandas',
-        'seaborn',
+        'numpy',
         'PIL',
         'apscheduler',
         'dotenv'
@@ -41,12 +41,7 @@ def check_dependencies():
     missing_modules = []
 
     for module in required_modules:
-        try:
-            if module == 'PIL':
-                import PIL
-            else:
-                __import__(module)
-        except ImportError:
+        if find_spec(module) is None:
             missing_modules.append(module)
 
     if missing_modules:
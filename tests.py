@@ -15,6 +15,7 @@ pytest tests.py
 import unittest
 import sys
 import os
+import tempfile
 from datetime import date, datetime
 from unittest.mock import Mock, MagicMock
 
@@ -22,11 +23,26 @@ from unittest.mock import Mock, MagicMock
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули бота
-from database.db_manager import DatabaseManager
+from database.db_manager import DatabaseManager, db_manager
 from database.models import User, MoodEntry, Tag
 from config import config
 from utils.helpers import format_mood_entry
 from keyboards.inline import get_main_menu_keyboard
+from utils.workers import extract_user_id, shard_for_update, UserOrderedRunner
+
+
+class TempDatabaseTestCase(unittest.TestCase):
+    """Базовый класс: временная база, подставленная в db_manager"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'test.db')
+        self.db = DatabaseManager(self.db_path)
+        db_manager.override(self.db)
+
+    def tearDown(self):
+        db_manager.reset()
+        self.tmp.cleanup()
 
 
 class TestDatabaseManager(unittest.TestCase):
@@ -284,6 +300,1387 @@ class TestModels(unittest.TestCase):
 
         print("✅ Модель тега корректна!")
 
+    def test_mood_entry_lazy_dates(self):
+        """Даты записи из строк базы разбираются при обращении"""
+        print("🧪 Тестируем компактную модель записи...")
+
+        entry = MoodEntry(1, 123456, 4, None, "2024-03-01", "2024-03-01 10:30:00")
+
+        self.assertFalse(hasattr(entry, '__dict__'))
+        self.assertEqual(entry.entry_date, date(2024, 3, 1))
+        self.assertEqual(entry.created_at, datetime(2024, 3, 1, 10, 30))
+        self.assertEqual(entry, MoodEntry(1, 123456, 4, None, date(2024, 3, 1),
+                                          datetime(2024, 3, 1, 10, 30)))
+
+        print("✅ Компактная модель записи корректна!")
+
+
+class TestWorkers(unittest.TestCase):
+    """Тесты для многопроцессной обработки обновлений"""
+
+    def test_shard_by_user(self):
+        """Тест распределения обновлений по воркерам"""
+        print("🧪 Тестируем шардирование обновлений...")
+
+        message = {'update_id': 1, 'message': {'from': {'id': 42}, 'chat': {'id': 42}}}
+        callback = {'update_id': 2, 'callback_query': {'from': {'id': 42}}}
+
+        # Сообщение и callback одного пользователя попадают в один воркер
+        self.assertEqual(extract_user_id(message), 42)
+        self.assertEqual(extract_user_id(callback), 42)
+        self.assertEqual(shard_for_update(message, 4), shard_for_update(callback, 4))
+
+        # Обновление без пользователя распределяется по update_id
+        self.assertEqual(shard_for_update({'update_id': 7}, 4), 3)
+
+        print("✅ Шардирование корректно!")
+
+    def test_user_ordered_runner(self):
+        """Тест сохранения порядка обработки для одного пользователя"""
+        print("🧪 Тестируем порядок обработки обновлений...")
+
+        import asyncio
+        processed = []
+
+        async def handle(user_id, number, delay):
+            await asyncio.sleep(delay)
+            processed.append((user_id, number))
+
+        async def scenario():
+            runner = UserOrderedRunner()
+            # Первое обновление пользователя 1 самое медленное
+            await runner.submit(1, handle(1, 1, 0.05))
+            await runner.submit(1, handle(1, 2, 0))
+            await runner.submit(2, handle(2, 1, 0))
+            await runner.drain()
+
+        asyncio.run(scenario())
+
+        # Пользователь 2 не ждал пользователя 1, а порядок пользователя 1 сохранен
+        self.assertEqual(processed[0], (2, 1))
+        self.assertEqual([n for u, n in processed if u == 1], [1, 2])
+
+        print("✅ Порядок обработки сохранен!")
+
+    def test_user_ordered_runner_limit(self):
+        """Тест ограничения числа обновлений в обработке"""
+        print("🧪 Тестируем ограничение задач воркера...")
+
+        import asyncio
+
+        async def scenario():
+            runner = UserOrderedRunner(limit=2)
+            release = asyncio.Event()
+            await runner.submit(1, release.wait())
+            await runner.submit(2, release.wait())
+
+            # Третье обновление ждет, пока освободится место
+            third = asyncio.create_task(runner.submit(3, asyncio.sleep(0)))
+            await asyncio.sleep(0.01)
+            waited = not third.done()
+
+            release.set()
+            await third
+            await runner.drain()
+            return waited
+
+        self.assertTrue(asyncio.run(scenario()))
+        print("✅ Задач в обработке не больше ограничения!")
+
+    def test_supervisor_broadcasts_admin_commands(self):
+        """/profile из одного воркера выполняется во всех процессах, ответ - со всеми файлами"""
+        print("🧪 Тестируем рассылку команд профилирования воркерам...")
+        import asyncio
+        import queue
+        from types import SimpleNamespace
+        from unittest.mock import AsyncMock, patch
+        from bot import run_control
+        from utils.profiling import stack_sampler, process_name
+
+        class FakePool:
+            """Пул с одним воркером, который сразу присылает свой профиль"""
+
+            def __init__(self, tmp):
+                self.control_queue = queue.Queue()
+                self.processes = [SimpleNamespace(name="mood-worker-0", pid=101)]
+                self.path = os.path.join(tmp, "worker.folded")
+                self.sent = []
+
+            def broadcast(self, command):
+                self.sent.append(command)
+                self.control_queue.put({'id': command['id'],
+                                        'result': {'process': "mood-worker-0 (pid 101)", 'path': self.path}})
+
+        bot = Mock()
+        bot.send_message = AsyncMock()
+        bot.send_document = AsyncMock()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = FakePool(tmp)
+            pool.control_queue.put({'control': {'action': 'profile', 'seconds': 0.05}, 'chat_id': 42})
+
+            async def scenario():
+                control = asyncio.create_task(run_control(bot, pool))
+                for _ in range(100):
+                    if bot.send_message.await_count:
+                        break
+                    await asyncio.sleep(0.05)
+                control.cancel()
+                await asyncio.gather(control, return_exceptions=True)
+
+            with patch.object(stack_sampler, 'output_dir', tmp):
+                asyncio.run(scenario())
+
+        self.assertEqual(pool.sent, [{'action': 'profile', 'seconds': 0.05, 'id': 1}])
+        chat_id, text = bot.send_message.call_args.args
+        self.assertEqual(chat_id, 42)
+        # В ответе оба процесса и пути к их профилям
+        self.assertIn(f"{process_name()}: {tmp}", text)
+        self.assertIn(f"mood-worker-0 (pid 101): {pool.path}", text)
+        self.assertEqual(bot.send_document.await_count, 2)
+        print("✅ Команда выполнена во всех процессах!")
+
+    def test_supervisor_retries_get_updates(self):
+        """Ошибки сети и сервера Telegram не останавливают получение обновлений"""
+        print("🧪 Тестируем повтор getUpdates в супервизоре...")
+        import asyncio
+        from unittest.mock import AsyncMock
+        from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+        from aiogram.utils.backoff import Backoff, BackoffConfig
+        from bot import get_updates_with_retry
+
+        bot = Mock()
+        bot.get_updates = AsyncMock(side_effect=[
+            TelegramNetworkError(Mock(), "нет соединения"),
+            TelegramServerError(Mock(), "Bad Gateway"),
+            TelegramRetryAfter(Mock(), "Too Many Requests", retry_after=0),
+            ["обновление"],
+        ])
+        backoff = Backoff(BackoffConfig(min_delay=0.001, max_delay=0.01, factor=2, jitter=0))
+
+        updates = asyncio.run(get_updates_with_retry(bot, 5, backoff))
+
+        self.assertEqual(updates, ["обновление"])
+        self.assertEqual(bot.get_updates.await_count, 4)
+        self.assertEqual(bot.get_updates.call_args.kwargs['offset'], 5)
+        # После успешного запроса паузы начинаются заново
+        self.assertEqual(backoff.counter, 0)
+        print("✅ getUpdates повторяется!")
+
+    def test_worker_schedules_own_reminders(self):
+        """Воркер запускает планировщик с напоминаниями своих пользователей"""
+        print("🧪 Тестируем напоминания в режиме воркеров...")
+        import asyncio
+        from datetime import time
+        from unittest.mock import AsyncMock, patch
+        from database.models import UserSettings
+        from handlers.settings import callback_settings_reminders
+        from utils.scheduler import ReminderScheduler, reminder_scheduler
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'test.db'))
+            db_manager.override(db)
+            for user_id in range(1, 5):
+                db.update_user_settings(UserSettings(user_id=user_id, reminder_time=time(9, user_id),
+                                                     daily_reminder=user_id != 4))
+
+            scheduler = ReminderScheduler()
+            reminder_scheduler.override(scheduler)
+
+            callback = Mock()
+            callback.from_user.id = 3
+            callback.answer = AsyncMock()
+            callback.message.edit_text = AsyncMock()
+
+            async def scenario():
+                await scheduler.start_scheduler()
+                loaded = set(scheduler.active_jobs)
+                # Пользователь воркера отключает напоминания - задача снимается
+                await callback_settings_reminders(callback)
+                running = scheduler.scheduler.running
+                await scheduler.stop_scheduler()
+                return loaded, running
+
+            try:
+                with patch.object(config, 'WORKERS', 2), patch.object(config, 'WORKER_INDEX', 1):
+                    loaded, running = asyncio.run(scenario())
+            finally:
+                reminder_scheduler.reset()
+                db_manager.reset()
+
+        # Воркер 1 из 2 отвечает за нечетных пользователей с включенными напоминаниями
+        self.assertEqual(loaded, {1, 3})
+        self.assertTrue(running)
+        self.assertEqual(set(scheduler.active_jobs), {1})
+        print("✅ Напоминания воркера запланированы!")
+
+
+class TestLazyImports(unittest.TestCase):
+    """Тесты для отложенной загрузки тяжелых библиотек"""
+
+    def test_charts_import_is_lazy(self):
+        """Импорт модуля графиков не загружает matplotlib и pandas"""
+        print("🧪 Тестируем отложенную загрузку библиотек графиков...")
+
+        import subprocess
+        code = (
+            "import sys, utils.charts; "
+            "print(any(m in sys.modules for m in ('matplotlib', 'pandas', 'seaborn')))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True
+        )
+
+        self.assertEqual(result.stdout.strip(), "False")
+
+        print("✅ Библиотеки графиков не загружаются при импорте!")
+
+    def test_weekday_stats_without_matplotlib(self):
+        """Агрегации по дням недели и часам (без графика) не загружают matplotlib"""
+        print("🧪 Тестируем статистику по дням недели без matplotlib...")
+
+        import subprocess
+        code = (
+            "import sys; from datetime import date, datetime; from utils.charts import chart_generator; "
+            "from database.models import MoodEntry; "
+            "entry = MoodEntry(user_id=1, mood_score=4, entry_date=date.today(), created_at=datetime.now()); "
+            "mean, count = chart_generator.weekday_stats([entry]); "
+            "total, grid = chart_generator.hour_weekday_grid([entry]); "
+            "print(int(count.sum()), int(grid.sum()), 'matplotlib' in sys.modules)"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True
+        )
+
+        self.assertEqual(result.stdout.strip(), "1 1 False", result.stderr)
+
+        print("✅ Статистика считается без matplotlib!")
+
+    def test_imports_have_no_side_effects(self):
+        """Импорт модулей бота не создает базу данных и планировщик"""
+        print("🧪 Тестируем импорт без побочных эффектов...")
+
+        import subprocess
+        code = (
+            "import os, bot, fixes; "
+            "from database.db_manager import db_manager; "
+            "from utils.scheduler import reminder_scheduler; "
+            "print(db_manager.initialized, reminder_scheduler.initialized, "
+            "os.path.exists('mood_tracker.db'))"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            result = subprocess.run(
+                [sys.executable, '-c', code],
+                cwd=tmp, capture_output=True, text=True,
+                env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+            )
+
+        self.assertEqual(result.stdout.strip(), "False False False", result.stderr)
+
+        print("✅ Импорт не открывает базу данных!")
+
+
+class TestMoodArrays(TempDatabaseTestCase):
+    """Тесты для данных графиков в виде массивов"""
+
+    def setUp(self):
+        """Временная база с записями за две недели"""
+        from datetime import timedelta
+
+        super().setUp()
+        for day in range(14):
+            self.db.save_mood_entry(MoodEntry(
+                user_id=1,
+                mood_score=day % 5 + 1,
+                diary_text="текст" if day % 2 else None,
+                entry_date=date.today() - timedelta(days=day)
+            ))
+
+    def test_arrays_match_entries(self):
+        """Массивы из SQL совпадают с записями MoodEntry"""
+        print("🧪 Тестируем загрузку записей массивами...")
+
+        from database.models import MoodArrays
+        arrays = self.db.get_mood_arrays(1)
+        expected = MoodArrays.from_entries(self.db.get_mood_entries(1)[::-1])
+
+        self.assertEqual(arrays.ordinal.tolist(), expected.ordinal.tolist())
+        self.assertEqual(arrays.score.tolist(), expected.score.tolist())
+        self.assertEqual(arrays.diary.tolist(), expected.diary.tolist())
+        self.assertEqual(arrays.hour.tolist(), expected.hour.tolist())
+        self.assertEqual(arrays.weekday.tolist(),
+                         [date.fromordinal(int(o)).weekday() for o in arrays.ordinal])
+
+        print("✅ Массивы совпадают с записями!")
+
+    def test_fetch_mood_columns(self):
+        """Столбцы записей за период без создания MoodEntry"""
+        print("🧪 Тестируем выборку записей по столбцам...")
+
+        from datetime import timedelta
+        start_date = date.today() - timedelta(days=6)
+        columns = self.db.fetch_mood_columns(1, start_date, date.today())
+        entries = self.db.get_mood_entries(1, start_date, date.today())[::-1]
+
+        self.assertEqual(columns['entry_ordinal'].tolist(), [e.entry_date.toordinal() for e in entries])
+        self.assertEqual(columns['mood_score'].tolist(), [e.mood_score for e in entries])
+
+        with self.assertRaises(ValueError):
+            self.db.fetch_mood_columns(1, columns=('diary_text',))
+
+        print("✅ Выборка по столбцам работает!")
+
+    def test_old_database_migration(self):
+        """Старая база без целочисленных дат дополняется при запуске"""
+        print("🧪 Тестируем миграцию старой базы...")
+
+        import sqlite3
+        path = os.path.join(self.tmp.name, 'old.db')
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE mood_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER,
+                mood_score INTEGER, diary_text TEXT, entry_date DATE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute("INSERT INTO mood_entries (user_id, mood_score, entry_date, created_at) "
+                     "VALUES (1, 4, '2024-03-01', '2024-03-01 10:30:00')")
+        conn.commit()
+        conn.close()
+
+        columns = DatabaseManager(path).fetch_mood_columns(
+            1, columns=('entry_ordinal', 'created_ts')
+        )
+
+        self.assertEqual(columns['entry_ordinal'].tolist(), [date(2024, 3, 1).toordinal()])
+        self.assertEqual(columns['created_ts'].tolist(), [1709289000])
+
+        print("✅ Старая база успешно обновлена!")
+
+    def test_weekday_stats(self):
+        """Среднее по дням недели считается как в Python"""
+        print("🧪 Тестируем статистику по дням недели...")
+
+        from utils.charts import chart_generator
+        mean, count = chart_generator.weekday_stats(self.db.get_mood_arrays(1))
+
+        by_day = {}
+        for entry in self.db.get_mood_entries(1):
+            by_day.setdefault(entry.entry_date.weekday(), []).append(entry.mood_score)
+
+        self.assertEqual(count.tolist(), [len(by_day.get(day, [])) for day in range(7)])
+        for day, scores in by_day.items():
+            self.assertAlmostEqual(mean[day], sum(scores) / len(scores))
+
+        print("✅ Статистика по дням недели верна!")
+
+
+class TestMetrics(unittest.TestCase):
+    """Тесты для метрик производительности"""
+
+    def test_histogram_quantiles(self):
+        """Квантили гистограммы попадают в нужные корзины"""
+        print("🧪 Тестируем гистограмму задержек...")
+
+        from utils.metrics import Histogram
+        histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+        for _ in range(90):
+            histogram.observe(0.005)
+        for _ in range(10):
+            histogram.observe(0.5)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertLessEqual(histogram.quantile(0.5), 0.01)
+        self.assertGreater(histogram.quantile(0.99), 0.1)
+        self.assertLessEqual(histogram.quantile(0.99), 1.0)
+
+        print("✅ Квантили считаются верно!")
+
+    def test_database_queries_are_measured(self):
+        """Запросы DatabaseManager попадают в метрики"""
+        print("🧪 Тестируем метрики запросов к базе...")
+
+        from utils.metrics import metrics, DB_QUERY_DURATION, DB_ROWS
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'test.db'))
+            metrics.reset()
+            db.save_mood_entry(MoodEntry(user_id=1, mood_score=4))
+            db.get_mood_entries(1)
+
+        self.assertEqual(metrics.get_histogram(DB_QUERY_DURATION, query="SELECT mood_entries").count, 1)
+        self.assertEqual(metrics.get_counter(DB_ROWS, query="SELECT mood_entries"), 1)
+        self.assertEqual(metrics.get_counter(DB_ROWS, query="INSERT mood_entries"), 1)
+        self.assertIn('moodtracker_db_query_duration_seconds_bucket{query="SELECT mood_entries",le="+Inf"} 1',
+                      metrics.render())
+
+        print("✅ Запросы к базе измеряются!")
+
+    def test_slow_query_log(self):
+        """Медленный запрос пишется в лог с планом выполнения"""
+        print("🧪 Тестируем журнал медленных запросов...")
+
+        from utils.profiling import slow_query_log, params_shape
+
+        self.assertEqual(params_shape((1, "текст", None)), "(int, str[5], NoneType)")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'test.db'))
+            slow_query_log.configure(enabled=True, threshold_ms=0)
+            try:
+                with self.assertLogs(level='WARNING') as logs:
+                    db.get_mood_entries(1)
+            finally:
+                slow_query_log.configure(enabled=False, threshold_ms=100)
+
+        output = "\n".join(logs.output)
+        self.assertIn("db_manager.get_mood_entries", output)
+        self.assertIn("параметры (int)", output)
+        self.assertIn("план:", output)
+
+        print("✅ Медленные запросы журналируются!")
+
+
+class TestTagUsage(TempDatabaseTestCase):
+    """Тесты для счетчиков использования тегов (tag_usage)"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.get_or_create_user(user_id=1, username="test_user", first_name="Test")
+        self.tags = {tag.name: tag.id for tag in self.db.get_all_tags(1)}
+
+    def test_counters_follow_saved_entries(self):
+        """Счетчики обновляются при сохранении записей и удалении тега"""
+        print("🧪 Тестируем счетчики использования тегов...")
+
+        sport, work = self.tags["🏃 спорт"], self.tags["💼 работа"]
+        custom = self.db.create_custom_tag("🧘 йога", "Мои теги", 1)
+
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=5, entry_date=date(2024, 5, 1)), [sport, custom])
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=3, entry_date=date(2024, 5, 3)), [sport, work])
+        self.db.save_mood_entry(MoodEntry(user_id=2, mood_score=1), [sport])
+
+        usage = self.db.get_tag_usage(1)
+        self.assertEqual(usage[0].name, "🏃 спорт")
+        self.assertEqual((usage[0].count, usage[0].mood_sum, usage[0].last_used), (2, 8, "2024-05-03"))
+        self.assertEqual(usage[0].average_mood, 4.0)
+        self.assertEqual({tag.tag_id for tag in usage}, {sport, work, custom})
+
+        self.assertTrue(self.db.delete_custom_tag(custom, 1))
+        self.assertNotIn(custom, {tag.tag_id for tag in self.db.get_tag_usage(1)})
+
+        print("✅ Счетчики тегов корректны!")
+
+    def test_existing_links_are_backfilled(self):
+        """Для старой базы счетчики заполняются по mood_tags"""
+        print("🧪 Тестируем заполнение счетчиков тегов в старой базе...")
+
+        sport = self.tags["🏃 спорт"]
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=2), [sport])
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=4), [sport])
+
+        with self.db.get_connection() as conn:
+            conn.execute('DELETE FROM tag_usage')
+            conn.commit()
+
+        usage = DatabaseManager(self.db_path).get_tag_usage(1)
+        self.assertEqual([(tag.tag_id, tag.count, tag.mood_sum) for tag in usage], [(sport, 2, 6)])
+
+        print("✅ Счетчики тегов восстановлены!")
+
+
+class TestReadCache(TempDatabaseTestCase):
+    """Тесты для кэша методов чтения по версии данных (utils/cache.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.get_or_create_user(user_id=1, username="test_user", first_name="Test")
+        self.db.get_or_create_user(user_id=2, username="other_user", first_name="Other")
+
+    def test_reads_are_cached_until_user_data_changes(self):
+        """Повторное чтение берется из кэша, запись пользователя его сбрасывает"""
+        print("🧪 Тестируем кэш чтения...")
+        from utils.metrics import metrics, DB_CACHE_REQUESTS
+
+        today = date.today()
+        self.assertIsNone(self.db.get_today_mood(1))
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=4))
+        self.assertEqual(self.db.get_today_mood(1).mood_score, 4)
+        stats = self.db.get_mood_stats(1, today, today)
+        hits = metrics.get_counter(DB_CACHE_REQUESTS, method='get_mood_stats', result='hit')
+        self.assertEqual(self.db.get_mood_stats(1, today, today), stats)
+        self.assertEqual(metrics.get_counter(DB_CACHE_REQUESTS, method='get_mood_stats', result='hit'),
+                         hits + 1)
+
+        # Результат из кэша выдается копией: изменения вызывающего кода в кэш не попадают
+        stats.most_frequent_tags.append(("🧪 тест", 1))
+        self.db.get_today_mood(1).mood_score = 1
+        self.assertEqual(self.db.get_mood_stats(1, today, today).most_frequent_tags, [])
+        self.assertEqual(self.db.get_today_mood(1).mood_score, 4)
+
+        # Запись другого пользователя кэш не сбрасывает, своя - сбрасывает
+        self.db.save_mood_entry(MoodEntry(user_id=2, mood_score=1))
+        self.assertEqual(metrics.get_counter(DB_CACHE_REQUESTS, method='get_mood_stats', result='hit'),
+                         hits + 2)
+        self.db.get_mood_stats(1, today, today)
+        self.assertEqual(metrics.get_counter(DB_CACHE_REQUESTS, method='get_mood_stats', result='hit'),
+                         hits + 3)
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=2))
+        self.assertEqual(self.db.get_mood_stats(1, today, today).total_entries, 2)
+
+        # Настройки выдаются копией: изменение без сохранения не попадает в кэш
+        settings = self.db.get_user_settings(1)
+        settings.daily_reminder = not settings.daily_reminder
+        self.assertNotEqual(self.db.get_user_settings(1).daily_reminder, settings.daily_reminder)
+        self.db.update_user_settings(settings)
+        self.assertEqual(self.db.get_user_settings(1).daily_reminder, settings.daily_reminder)
+
+        exported = self.db.export_user_data(1)
+        self.db.create_custom_tag("🧘 йога", "Мои теги", 1)
+        self.assertIsNot(self.db.export_user_data(1)['entries'], exported['entries'])
+
+        print("✅ Кэш чтения сбрасывается при изменениях!")
+
+
+class TestUserRegistration(TempDatabaseTestCase):
+    """Тесты для регистрации пользователей одним запросом"""
+
+    def test_upsert_keeps_registration(self):
+        """Повторная регистрация обновляет имя и не трогает остальные данные"""
+        print("🧪 Тестируем регистрацию пользователя...")
+        first = self.db.get_or_create_user(user_id=1, username="old", first_name="Test")
+        self.db.update_user_timezone(1, "UTC+5")
+        second = self.db.get_or_create_user(user_id=1, username="new")
+
+        self.assertEqual(second.username, "new")
+        self.assertEqual(second.first_name, "Test")
+        self.assertEqual(second.timezone, "UTC+5")
+        self.assertEqual(second.registration_date, first.registration_date)
+
+        # Повторная регистрация без изменений не сбрасывает кэш пользователя
+        version = self.db.data_version(1)
+        again = self.db.get_or_create_user(user_id=1, username="new")
+        self.assertEqual((again.username, again.timezone), ("new", "UTC+5"))
+        self.assertEqual(self.db.data_version(1), version)
+        self.db.get_or_create_user(user_id=1, first_name="Renamed")
+        self.assertNotEqual(self.db.data_version(1), version)
+
+        # Настройки по умолчанию до первого изменения, затем сохраненные
+        settings = self.db.get_user_settings(1)
+        self.assertTrue(settings.daily_reminder)
+        settings.daily_reminder = False
+        self.db.update_user_settings(settings)
+        self.assertFalse(self.db.get_user_settings(1).daily_reminder)
+        print("✅ Регистрация работает!")
+
+    def test_known_users_skip_database(self):
+        """Известный процессу пользователь не проверяется в базе"""
+        print("🧪 Тестируем кэш известных пользователей...")
+        from utils.metrics import metrics, DB_CONNECTIONS
+
+        self.db.ensure_user(7, "user7", "Seven")
+        connections = metrics.get_counter(DB_CONNECTIONS)
+        self.db.ensure_user(7, "user7", "Seven")
+        self.assertEqual(metrics.get_counter(DB_CONNECTIONS), connections)
+
+        # Отмененная регистрация забывается
+        with self.assertRaises(RuntimeError):
+            with self.db.session():
+                self.db.ensure_user(8)
+                raise RuntimeError("обработчик упал")
+        self.assertNotIn(8, self.db.known_users)
+        print("✅ Кэш известных пользователей работает!")
+
+
+class TestDatabaseSession(TempDatabaseTestCase):
+    """Тесты для единицы работы на обновление (DatabaseManager.session)"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.get_or_create_user(user_id=1, username="test_user", first_name="Test")
+
+    def _stored_entries(self) -> int:
+        import sqlite3
+        conn = sqlite3.connect(self.db.db_path)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM mood_entries').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_session_commits_once(self):
+        """Все вызовы сессии идут через одно соединение и один коммит"""
+        print("🧪 Тестируем сессию базы...")
+        from utils.metrics import metrics, DB_CONNECTIONS, DB_COMMITS
+
+        connections = metrics.get_counter(DB_CONNECTIONS)
+        commits = metrics.get_counter(DB_COMMITS)
+        tag_ids = [tag.id for tag in self.db.get_all_tags(1)][:2]
+        with self.db.session():
+            self.db.get_today_mood(1)
+            self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=4), tag_ids)
+            self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=5))
+            self.assertEqual(self._stored_entries(), 0)
+            self.assertEqual(self.db.get_today_mood(1).user_id, 1)
+
+        self.assertEqual(self._stored_entries(), 2)
+        self.assertEqual(metrics.get_counter(DB_CONNECTIONS) - connections, 2)  # + get_all_tags
+        self.assertEqual(metrics.get_counter(DB_COMMITS) - commits, 1)
+        print("✅ Сессия фиксирует записи одним коммитом!")
+
+    def test_session_rolls_back_on_error(self):
+        """Ошибка отменяет записи сессии вместе с результатами в кэше"""
+        print("🧪 Тестируем откат сессии...")
+        with self.assertRaises(RuntimeError):
+            with self.db.session():
+                self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=4))
+                self.assertIsNotNone(self.db.get_today_mood(1))
+                raise RuntimeError("обработчик упал")
+
+        self.assertEqual(self._stored_entries(), 0)
+        self.assertIsNone(self.db.get_today_mood(1))
+        print("✅ Откат сессии работает!")
+
+    def test_flush_before_bot_request(self):
+        """Перед запросом к Bot API записи обновления уже сохранены"""
+        print("🧪 Тестируем фиксацию перед запросом к Telegram...")
+        import asyncio
+        from utils.middlewares import DatabaseFlushMiddleware
+
+        seen = []
+
+        async def make_request(bot, method):
+            seen.append(self._stored_entries())
+
+        async def handle():
+            with self.db.session():
+                self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=3))
+                await DatabaseFlushMiddleware()(make_request, None, None)
+
+        asyncio.run(handle())
+        self.assertEqual(seen, [1])
+        print("✅ Записи фиксируются до запроса к Telegram!")
+
+    def test_version_changes_after_commit(self):
+        """Чтение из другого потока до коммита сессии не оставляет в кэше старых данных"""
+        print("🧪 Тестируем версию данных и коммит сессии...")
+        import threading
+
+        today = date.today()
+        seen = []
+
+        def read_in_thread():
+            # Поток не видит сессию: у него свое соединение
+            thread = threading.Thread(target=lambda: seen.append(
+                self.db.get_mood_stats(1, today, today).total_entries))
+            thread.start()
+            thread.join()
+
+        with self.db.session() as session:
+            self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=4))
+            # Сессия видит свою запись, кэш для пользователя не используется
+            self.assertEqual(self.db.get_mood_stats(1, today, today).total_entries, 1)
+            read_in_thread()
+            session.flush()
+            read_in_thread()
+
+        self.assertEqual(seen, [0, 1])
+        print("✅ Версия данных меняется после коммита!")
+
+
+class TestEditDebouncer(unittest.TestCase):
+    """Тесты для отложенного редактирования сообщений (utils/debounce.py)"""
+
+    def test_burst_produces_single_edit(self):
+        """Серия нажатий дает одно редактирование с последним состоянием"""
+        print("🧪 Тестируем объединение редактирований...")
+        import asyncio
+        from utils.debounce import EditDebouncer
+
+        message = Mock()
+        message.chat.id, message.message_id = 1, 10
+        edits = []
+
+        async def edit(text):
+            edits.append(text)
+
+        async def scenario():
+            debouncer = EditDebouncer(delay=0.05)
+            for text in ("1 выбрано", "2 выбрано", "3 выбрано"):
+                debouncer.schedule(message, lambda text=text: edit(text))
+            await asyncio.sleep(0.15)
+
+            # Обработчик, перерисовавший сообщение сам, отменяет ожидающее
+            debouncer.schedule(message, lambda: edit("устарело"))
+            self.assertTrue(debouncer.cancel(message))
+            await asyncio.sleep(0.1)
+            self.assertEqual(debouncer.pending(), 0)
+
+        asyncio.run(scenario())
+        self.assertEqual(edits, ["3 выбрано"])
+        print("✅ Редактирования объединяются!")
+
+
+class TestMenuCallbacks(TempDatabaseTestCase):
+    """Тесты для кнопок главного меню (handlers/start.py)"""
+
+    def test_tags_menu_uses_callback_user(self):
+        """Меню тегов показывает теги нажавшего, а не отправителя сообщения (бота)"""
+        print("🧪 Тестируем меню тегов из callback...")
+        import asyncio
+        from unittest.mock import AsyncMock
+        from handlers.start import callback_tags_menu
+
+        self.db.get_or_create_user(user_id=7)
+        self.db.create_custom_tag("🎸 репетиция", "Хобби", 7)
+
+        callback = Mock()
+        callback.from_user.id = 7
+        callback.answer = AsyncMock()
+        callback.message.from_user.id = 1
+        callback.message.answer = AsyncMock()
+
+        asyncio.run(callback_tags_menu(callback))
+
+        text = callback.message.answer.call_args.args[0]
+        self.assertIn("🎸 репетиция", text)
+        print("✅ Меню тегов использует пользователя из callback!")
+
+    def test_mood_record_replaces_menu(self):
+        """Кнопка записи настроения заменяет сообщение меню, а не отправляет новое"""
+        print("🧪 Тестируем запись настроения из меню...")
+        import asyncio
+        from unittest.mock import AsyncMock
+        from handlers.start import callback_mood_record_from_main
+
+        callback = Mock()
+        callback.from_user.id = 7
+        callback.answer = AsyncMock()
+        callback.message.answer = AsyncMock()
+        callback.message.edit_text = AsyncMock()
+
+        asyncio.run(callback_mood_record_from_main(callback, AsyncMock()))
+
+        callback.message.answer.assert_not_called()
+        self.assertIn("Какое у вас настроение", callback.message.edit_text.call_args.args[0])
+        print("✅ Меню заменяется вопросом об оценке!")
+
+
+class TestCallbackIndex(unittest.TestCase):
+    """Тесты для таблицы обработчиков кнопок (utils/callbacks.py)"""
+
+    def test_keyboard_buttons_resolve(self):
+        """Каждая кнопка клавиатур находит свой обработчик"""
+        print("🧪 Тестируем таблицу обработчиков кнопок...")
+        # Импорт модулей регистрирует их обработчики
+        import handlers.start, handlers.mood, handlers.analytics
+        from keyboards.inline import (get_mood_rating_keyboard, get_tags_selection_keyboard,
+                                      get_analytics_keyboard, get_settings_keyboard,
+                                      get_diary_actions_keyboard, get_confirmation_keyboard,
+                                      get_back_keyboard, get_cancel_keyboard)
+        from utils.callbacks import callbacks, ConfirmDeleteTag
+
+        tags = [Tag(id=1, name="😴 сон", category="Физическое состояние"),
+                Tag(id=2, name="🎸 репетиция", category="Хобби: музыка")]
+        keyboards = [
+            get_main_menu_keyboard(), get_mood_rating_keyboard(),
+            get_tags_selection_keyboard(tags), get_tags_selection_keyboard(tags, [1], "Хобби: музыка"),
+            get_analytics_keyboard(), get_settings_keyboard(), get_diary_actions_keyboard(),
+            get_confirmation_keyboard(ConfirmDeleteTag(tag_id=2).pack()),
+            get_confirmation_keyboard("confirm_reset_data"),
+            get_back_keyboard(), get_back_keyboard("analytics_menu"), get_cancel_keyboard(),
+        ]
+        for keyboard in keyboards:
+            for row in keyboard.inline_keyboard:
+                for button in row:
+                    self.assertIsNotNone(callbacks.lookup(button.callback_data), button.callback_data)
+
+        # Кнопки аналитики больше не перехватывает обработчик периода
+        handler, callback_data = callbacks.lookup("analytics_days")
+        self.assertEqual(handler.callback.__name__, "callback_analytics_days")
+        handler, callback_data = callbacks.lookup("analytics_period:week")
+        self.assertEqual(callback_data.period, "week")
+        print("✅ Все кнопки находят обработчик!")
+
+    def test_duplicates_and_stale_data(self):
+        """Повторная регистрация - ошибка, неизвестные данные не находятся"""
+        print("🧪 Тестируем повторную регистрацию кнопок...")
+        from utils.callbacks import CallbackIndex, TagToggle
+
+        async def first(callback):
+            pass
+
+        async def second(callback):
+            pass
+
+        index = CallbackIndex(name="test")
+        index.register("back_to_main", first)
+        index.register(TagToggle, first)
+        with self.assertRaises(ValueError):
+            index.register("back_to_main", second)
+        with self.assertRaises(ValueError):
+            index.register("tag_toggle", second)
+
+        self.assertEqual(index.lookup("tag_toggle:12")[1].tag_id, 12)
+        self.assertIsNone(index.lookup("tag_toggle:abc"))
+        self.assertIsNone(index.lookup("tag_toggle_12"))
+        self.assertIsNone(index.lookup(""))
+        print("✅ Повторная регистрация обнаруживается!")
+
+
+class TestLogging(unittest.TestCase):
+    """Тесты для очереди логов (utils/logs.py)"""
+
+    def test_json_format_and_sampling(self):
+        """JSON запись с полями extra, выборка частых событий"""
+        print("🧪 Тестируем формат и выборку логов...")
+        import json
+        import logging
+        from utils.logs import JsonFormatter, SamplingFilter, parse_sampling
+
+        record = logging.LogRecord('mood_tracker.callbacks', logging.INFO, __file__, 1,
+                                   "Кнопка %s от пользователя %s", ("tags_done", 7), None)
+        record.user_id = 7
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data['message'], "Кнопка tags_done от пользователя 7")
+        self.assertEqual(data['user_id'], 7)
+        self.assertEqual(data['logger'], 'mood_tracker.callbacks')
+
+        sampling = SamplingFilter(0.1)
+        self.assertEqual(sum(sampling.filter(record) for _ in range(100)), 10)
+        record.levelno = logging.ERROR
+        self.assertTrue(all(sampling.filter(record) for _ in range(10)))
+
+        self.assertEqual(parse_sampling("mood_tracker.callbacks=0.1, aiogram=0.5"),
+                         {'mood_tracker.callbacks': 0.1, 'aiogram': 0.5})
+        print("✅ Формат и выборка работают!")
+
+    def test_writer_thread_rotates_file(self):
+        """Записи пишет фоновый поток, файл ротируется по размеру"""
+        print("🧪 Тестируем фоновую запись логов...")
+        import logging
+        from utils.logs import LogWriter, file_handler
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bot.log')
+            handler = file_handler(path, 'size', max_bytes=2000, backup_count=10)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            writer = LogWriter([handler])
+            writer.start()
+
+            test_logger = logging.getLogger('mood_tracker.test_writer')
+            test_logger.propagate = False
+            test_logger.addHandler(writer.handler)
+            try:
+                for i in range(200):
+                    test_logger.warning("Запись %s", i)
+            finally:
+                writer.stop()
+                test_logger.removeHandler(writer.handler)
+                handler.close()
+
+            files = sorted(os.listdir(tmp))
+            self.assertIn('bot.log.1', files)
+            lines = []
+            for name in files:
+                with open(os.path.join(tmp, name), encoding='utf-8') as f:
+                    lines.extend(f.read().splitlines())
+            self.assertEqual(len(lines), 200)
+        print("✅ Фоновая запись и ротация работают!")
+
+    def test_config_import_starts_no_writer(self):
+        """Импорт config не запускает поток записи логов (его запускает bot.main)"""
+        print("🧪 Тестируем импорт config без потока записи...")
+        import subprocess
+        code = (
+            "import threading, config; from utils import logs; "
+            "print(logs.log_writer is None, threading.active_count())"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True
+        )
+
+        self.assertEqual(result.stdout.strip(), "True 1", result.stderr)
+        print("✅ Импорт config не запускает поток записи!")
+
+
+class TestSingleFlight(TempDatabaseTestCase):
+    """Тесты для объединения одинаковых вычислений (utils/singleflight.py)"""
+
+    def test_concurrent_requests_share_computation(self):
+        """Одновременные одинаковые запросы ждут одно вычисление, новые данные - новое"""
+        print("🧪 Тестируем single-flight...")
+        import asyncio
+        import threading
+        from utils.singleflight import SingleFlight
+
+        calls = []
+        release = threading.Event()
+
+        def report(user_id, period):
+            calls.append((user_id, period))
+            release.wait(5)
+            return f"отчет {user_id} за {period}"
+
+        async def scenario():
+            flight = SingleFlight()
+            requests = [asyncio.ensure_future(flight.run(user_id, 'trend', report, period))
+                        for user_id, period in [(1, 'month'), (1, 'month'), (1, 'month'), (1, 'week'), (2, 'month')]]
+            await asyncio.sleep(0.05)
+            self.assertEqual(flight.in_flight(), 3)
+
+            # Отмена одного из ожидающих не отменяет вычисление для остальных
+            requests[0].cancel()
+            release.set()
+            results = await asyncio.gather(*requests[1:])
+            self.assertEqual(flight.in_flight(), 0)
+
+            # Запрос после записи пользователя считается заново
+            self.db._bump_data_version(1)
+            results.append(await flight.run(1, 'trend', report, 'month'))
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results, ["отчет 1 за month", "отчет 1 за month", "отчет 1 за week",
+                                   "отчет 2 за month", "отчет 1 за month"])
+        self.assertEqual(sorted(calls), [(1, 'month'), (1, 'month'), (1, 'week'), (2, 'month')])
+        print("✅ Одинаковые запросы считаются один раз!")
+
+    def test_full_queue_degrades_to_text(self):
+        """При полной очереди графиков новое вычисление не принимается, аналитика отвечает текстом"""
+        print("🧪 Тестируем ограничение очереди графиков...")
+        import asyncio
+        import threading
+        from unittest.mock import AsyncMock, patch
+        from handlers.analytics import callback_analytics_period
+        from utils.callbacks import AnalyticsPeriod
+        from utils.charts import chart_executor
+        from utils.singleflight import SingleFlight, Overloaded, single_flight
+
+        self.db.get_or_create_user(user_id=7)
+        self.db.save_mood_entry(MoodEntry(user_id=7, mood_score=4), [])
+        release = threading.Event()
+
+        # Отчет без графика читает историю не в потоке цикла событий
+        read_threads = []
+        get_mood_arrays = self.db.get_mood_arrays
+
+        def read_arrays(*args, **kwargs):
+            read_threads.append(threading.current_thread())
+            return get_mood_arrays(*args, **kwargs)
+
+        callback = Mock()
+        callback.from_user.id = 7
+        callback.answer = AsyncMock()
+        callback.message.edit_text = AsyncMock()
+        callback.bot.send_photo = AsyncMock()
+
+        async def scenario():
+            flight = SingleFlight()
+            single_flight.override(flight)
+            busy = asyncio.ensure_future(flight.run(1, 'trend', lambda user_id: release.wait(5),
+                                                    executor=chart_executor, limit=1))
+            await asyncio.sleep(0.05)
+            self.assertEqual(flight.queue_depth(chart_executor), 1)
+
+            # Одинаковый запрос принимается, новый - нет
+            same = asyncio.ensure_future(flight.run(1, 'trend', lambda user_id: None,
+                                                    executor=chart_executor, limit=1))
+            with self.assertRaises(Overloaded):
+                await flight.run(2, 'trend', lambda user_id: None, executor=chart_executor, limit=1)
+
+            with patch.object(config, 'CHART_QUEUE_LIMIT', 1), \
+                    patch.object(self.db, 'get_mood_arrays', read_arrays):
+                await callback_analytics_period(callback, AnalyticsPeriod(period="month"))
+
+            release.set()
+            await asyncio.gather(busy, same)
+            self.assertEqual(flight.queue_depth(chart_executor), 0)
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            release.set()
+            single_flight.reset()
+
+        callback.bot.send_photo.assert_not_called()
+        text = callback.message.edit_text.call_args.args[0]
+        self.assertIn("Среднее настроение: 4.0/5", text)
+        self.assertIn("▆", text)
+        self.assertIn("без графика", text)
+        self.assertTrue(read_threads)
+        self.assertNotIn(threading.main_thread(), read_threads)
+        print("✅ Перегрузка дает текстовый ответ!")
+
+    def test_overload_fallbacks_are_bounded(self):
+        """Отчеты без графика и отложенные выгрузки тоже ограничены"""
+        print("🧪 Тестируем ограничение работы при перегрузке...")
+        import asyncio
+        import threading
+        from unittest.mock import AsyncMock, patch
+        from handlers import settings
+        from handlers.analytics import callback_analytics_period
+        from handlers.settings import callback_settings_export, export_executor
+        from utils.callbacks import AnalyticsPeriod
+        from utils.charts import chart_executor
+        from utils.singleflight import SingleFlight, single_flight
+
+        self.db.save_mood_entry(MoodEntry(user_id=7, mood_score=4), [])
+        release = threading.Event()
+
+        callback = Mock()
+        callback.from_user.id = 7
+        callback.answer = AsyncMock()
+        callback.message.edit_text = AsyncMock()
+        callback.bot.send_document = AsyncMock()
+
+        async def scenario():
+            flight = SingleFlight()
+            single_flight.override(flight)
+            # Поток графиков, общий пул и поток выгрузок заняты
+            busy = [asyncio.ensure_future(flight.run(0, f'busy{i}', lambda user_id: release.wait(5),
+                                                     executor=executor, limit=1))
+                    for i, executor in enumerate((chart_executor, None, export_executor))]
+            await asyncio.sleep(0.05)
+
+            texts = []
+            with patch.object(config, 'CHART_QUEUE_LIMIT', 1), patch.object(config, 'OVERLOAD_QUEUE_LIMIT', 1):
+                await callback_analytics_period(callback, AnalyticsPeriod(period="month"))
+                texts.append(callback.message.edit_text.call_args.args[0])
+                # Первая выгрузка откладывается, на вторую места уже нет
+                for user_id in (7, 8):
+                    callback.from_user.id = user_id
+                    await callback_settings_export(callback)
+                    texts.append(callback.message.edit_text.call_args.args[0])
+
+            release.set()
+            await asyncio.gather(*busy)
+            await asyncio.gather(*settings._queued_exports)
+            return texts
+
+        try:
+            report, queued, rejected = asyncio.run(scenario())
+        finally:
+            release.set()
+            single_flight.reset()
+
+        self.assertIn("Попробуйте чуть позже", report)
+        self.assertNotIn("Среднее настроение", report)
+        self.assertIn("пришлю его отдельным сообщением", queued)
+        self.assertIn("Попробуйте экспорт чуть позже", rejected)
+        self.assertEqual(callback.bot.send_document.await_count, 1)
+        print("✅ Работа при перегрузке ограничена!")
+
+
+class TestMoodPatterns(TempDatabaseTestCase):
+    """Тесты для расчета паттернов настроения (utils/patterns.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.get_or_create_user(user_id=1, username="test_user", first_name="Test")
+        self.tags = {tag.name: tag.id for tag in self.db.get_all_tags(1)}
+
+    def test_correlation_matches_reference_and_cache_follows_writes(self):
+        """Корреляция совпадает с numpy.corrcoef, кэш сбрасывается записью"""
+        print("🧪 Тестируем паттерны настроения...")
+        import numpy as np
+
+        sport, work = self.tags["🏃 спорт"], self.tags["💼 работа"]
+        scores = [5, 4, 5, 3, 4, 2, 1, 3, 2, 4, 5, 1]
+        has_sport = [1, 1, 1, 0, 1, 0, 0, 1, 0, 1, 1, 0]
+        for score, with_sport in zip(scores, has_sport):
+            tag_ids = [sport] if with_sport else [work]
+            self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=score), tag_ids)
+
+        patterns = {pattern.tag_name: pattern for pattern in self.db.get_mood_patterns(1)}
+        pattern = patterns["🏃 спорт"]
+
+        expected = np.corrcoef(has_sport, scores)[0, 1]
+        self.assertAlmostEqual(pattern.correlation, round(expected, 2))
+        self.assertEqual((pattern.positive_entries, pattern.total_entries), (6, 7))
+        self.assertAlmostEqual(pattern.lift, round((6 / 7) / (6 / 12), 2))
+        self.assertLess(pattern.ci_low, pattern.correlation)
+        self.assertGreater(pattern.ci_high, pattern.correlation)
+        self.assertTrue(pattern.significant)
+        self.assertLess(patterns["💼 работа"].correlation, 0)
+
+        # Повторный запрос берется из кэша, новая запись его сбрасывает
+        from utils.metrics import metrics, DB_CACHE_REQUESTS
+        hits = metrics.get_counter(DB_CACHE_REQUESTS, method='get_mood_patterns', result='hit')
+        self.assertEqual(self.db.get_mood_patterns(1), self.db.get_mood_patterns(1))
+        self.assertEqual(metrics.get_counter(DB_CACHE_REQUESTS, method='get_mood_patterns', result='hit'),
+                         hits + 2)
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=1), [sport])
+        updated = {p.tag_name: p for p in self.db.get_mood_patterns(1)}["🏃 спорт"]
+        self.assertEqual(updated.total_entries, 8)
+
+        print("✅ Паттерны настроения корректны!")
+
+
+class TestPatternMining(TempDatabaseTestCase):
+    """Тесты для фонового поиска паттернов (utils/mining.py)"""
+
+    def setUp(self):
+        from utils.mining import PatternMiner
+        super().setUp()
+        self.miner = PatternMiner(min_support=3)
+        self.tags = {tag.name: tag.id for tag in self.db.get_all_tags(1)}
+
+    def test_pairs_and_next_day_effects(self):
+        """Пары тегов и эффект следующего дня совпадают с прямым расчетом"""
+        print("🧪 Тестируем поиск связок тегов и эффектов следующего дня...")
+        import numpy as np
+
+        sleep, sport, work = self.tags["😴 сон"], self.tags["🏃 спорт"], self.tags["💼 работа"]
+        start = date(2024, 3, 1).toordinal()
+        slept = [1, 0, 1, 1, 0, 0, 1, 0, 1, 1, 0, 1, 0, 0, 1, 1]
+        moods = [3]
+        for day, with_sleep in enumerate(slept):
+            # После дня со сном настроение выше, спорт с работой - хуже
+            score = 5 if day and slept[day - 1] else 2
+            moods.append(score)
+            tag_ids = [sleep] if with_sleep else []
+            if day % 3 == 0:
+                tag_ids += [sport, work]
+            self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=score,
+                                              entry_date=date.fromordinal(start + day)), tag_ids)
+
+        self.assertEqual(self.db.get_pattern_mining_queue(), {1: len(slept)})
+        self.assertEqual(self.miner.run_pending(), 1)
+        self.assertEqual(self.db.get_pattern_mining_queue(), {})
+
+        mined = self.db.get_mined_patterns(1)
+        lag = next(p for p in mined if p.kind == 'lag' and p.tag_name == "😴 сон")
+        scores = np.array(moods[2:], dtype=float)
+        expected = np.corrcoef(slept[:-1], scores)[0, 1]
+        self.assertAlmostEqual(lag.correlation, expected, places=3)
+        self.assertEqual(lag.support, sum(slept[:-1]))
+        self.assertTrue(lag.significant)
+
+        pair = next(p for p in mined if p.kind == 'pair')
+        self.assertEqual({pair.tag_name, pair.other_tag_name}, {"🏃 спорт", "💼 работа"})
+        self.assertEqual(pair.support, 6)
+
+        # Изменение во время расчета оставляет пользователя в очереди
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=4), [sleep])
+        self.db.finish_pattern_mining(1, 0, [])
+        self.assertEqual(self.db.get_pattern_mining_queue(), {1: 1})
+
+        print("✅ Связки тегов найдены!")
+
+
+class TestMoodStreaks(TempDatabaseTestCase):
+    """Тесты для серий записей (столбцы users)"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.get_or_create_user(user_id=1, username="test_user", first_name="Test")
+
+    def save(self, day: date):
+        self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=3, entry_date=day))
+
+    def test_streak_follows_days_not_entries(self):
+        """Несколько записей за день, пропуск дня и запись задним числом"""
+        print("🧪 Тестируем серии записей...")
+
+        start = date(2024, 6, 1)
+        for day in (1, 2, 2, 3, 4, 4, 4):
+            self.save(start.replace(day=day))
+        self.assertEqual(self.db.get_mood_streak(1, today=start.replace(day=5)), (4, 4))
+
+        # Пропуск дня начинает серию заново, самая длинная сохраняется
+        self.save(start.replace(day=6))
+        self.save(start.replace(day=7))
+        self.assertEqual(self.db.get_mood_streak(1, today=start.replace(day=7)), (2, 4))
+        # Запись задним числом серию не меняет
+        self.save(start.replace(day=5))
+        self.assertEqual(self.db.get_mood_streak(1, today=start.replace(day=7)), (2, 4))
+        # Без записи вчера и сегодня текущей серии нет
+        self.assertEqual(self.db.get_mood_streak(1, today=start.replace(day=9)), (0, 4))
+
+        # Пересчет по всем записям (старые базы, генератор данных) видит
+        # и заполненный задним числом день: 1-7 июня подряд
+        with self.db.get_connection() as conn:
+            DatabaseManager.recompute_user_streaks(conn.cursor())
+            conn.commit()
+        self.assertEqual(self.db.get_mood_streak(1, today=start.replace(day=7)), (7, 7))
+
+        print("✅ Серии записей корректны!")
+
+
+class TestInsightsBatch(TempDatabaseTestCase):
+    """Тесты для ночного расчета инсайтов (utils/insights.py)"""
+
+    def setUp(self):
+        super().setUp()
+        for user_id in (1, 2):
+            self.db.get_or_create_user(user_id=user_id, username="test_user", first_name="Test")
+
+    def test_trend_and_weekday_for_all_users(self):
+        """Тренд и лучший день недели считаются для всех пользователей, серия читается из users"""
+        print("🧪 Тестируем ночной расчет инсайтов...")
+        from datetime import timedelta
+        from utils.insights import InsightsBatch
+        from fixes import get_mood_insights
+
+        today = date.today()
+        # Пользователь 1: 14 дней подряд до вчера, в последнюю неделю настроение
+        # лучше, а три дня назад - две записи за день
+        for days_ago in range(14, 0, -1):
+            day = today - timedelta(days=days_ago)
+            scores = [2] if days_ago > 7 else [5, 5] if days_ago == 3 else [5]
+            for score in scores:
+                self.db.save_mood_entry(MoodEntry(user_id=1, mood_score=score, entry_date=day))
+        # Пользователь 2: серия прервана пропуском, последняя запись давно
+        for days_ago in (30, 29, 27, 26, 25):
+            self.db.save_mood_entry(MoodEntry(user_id=2, mood_score=3,
+                                              entry_date=today - timedelta(days=days_ago)))
+
+        # Маленькие порции: записи пользователей попадают в несколько порций
+        self.assertEqual(InsightsBatch(chunk_rows=4).run(), 2)
+
+        first = self.db.get_user_insights(1)
+        self.assertEqual(first.total_entries, 15)
+        self.assertEqual(first.trend, 'up')
+        self.assertEqual(first.recent_average, 5.0)
+        self.assertAlmostEqual(first.older_average, round((5 + 2 * 6) / 7, 2))
+
+        self.assertEqual(self.db.get_user_insights(2).total_entries, 5)
+
+        insights = get_mood_insights(1)
+        self.assertEqual(insights["trend"], "улучшающееся 📈")
+        self.assertEqual(insights["streak"], 14)
+        self.assertEqual(self.db.get_mood_streak(2), (0, 3))
+        self.assertIn("message", get_mood_insights(2))
+
+        print("✅ Инсайты посчитаны!")
+
+
+class TestDatasetGenerator(unittest.TestCase):
+    """Тесты для генератора синтетических баз (benchmarks/datagen.py)"""
+
+    def test_generated_data_is_consistent_and_reproducible(self):
+        """Генератор дает согласованные данные, одинаковые при одном seed"""
+        print("🧪 Тестируем генератор синтетических данных...")
+
+        import sqlite3
+        from benchmarks.datagen import DatasetGenerator
+
+        snapshots = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('a.db', 'b.db'):
+                path = os.path.join(tmp, name)
+                generator = DatasetGenerator(path, days=60, end_date=date(2024, 6, 30),
+                                             seed=7, chunk_users=40)
+                counts = generator.generate(100)
+
+                conn = sqlite3.connect(path)
+                self.assertEqual(conn.execute('SELECT COUNT(*) FROM mood_entries').fetchone()[0],
+                                 counts['mood_entries'])
+                self.assertEqual(conn.execute('''
+                    SELECT COUNT(*) FROM mood_entries
+                    WHERE mood_score NOT BETWEEN 1 AND 5
+                       OR LENGTH(diary_text) > ?
+                       OR entry_ordinal != CAST(julianday(entry_date) - 1721424.5 AS INTEGER)
+                       OR created_ts != CAST(strftime('%s', created_at) AS INTEGER)
+                ''', (config.DIARY_TEXT_LIMIT,)).fetchone()[0], 0)
+                self.assertEqual(conn.execute('''
+                    SELECT COUNT(*) FROM mood_tags
+                    WHERE mood_id NOT IN (SELECT id FROM mood_entries)
+                       OR tag_id NOT IN (SELECT id FROM tags)
+                ''').fetchone()[0], 0)
+                snapshots.append(conn.execute('''
+                    SELECT user_id, mood_score, diary_text, created_at FROM mood_entries ORDER BY id
+                ''').fetchall())
+                conn.close()
+
+        self.assertEqual(counts['users'], 100)
+        self.assertGreater(counts['mood_tags'], 0)
+        self.assertEqual(snapshots[0], snapshots[1])
+
+        print("✅ Синтетические данные согласованы и воспроизводимы!")
+
+
+class TestLoadHarness(unittest.TestCase):
+    """Сквозной прогон бота через заглушку Bot API (benchmarks/bench_e2e.py)"""
+
+    def test_user_scenarios_end_to_end(self):
+        """Сценарии записи настроения, аналитики и экспорта проходят без ошибок"""
+        print("🧪 Тестируем сценарии пользователей через заглушку Bot API...")
+
+        import asyncio
+        from benchmarks.bench_e2e import run_benchmark
+        from database.db_manager import db_manager
+
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                result = asyncio.run(run_benchmark(
+                    users=2, rounds=1, analytics_share=1, export_share=1,
+                    timeout=30, db_path=os.path.join(tmp, 'test.db')
+                ))
+            finally:
+                db_manager.reset()
+
+        self.assertEqual(result['failed_users'], 0)
+        self.assertEqual(result['error_replies'], 0)
+        self.assertEqual(result['db']['mood_entries'], 2)
+        self.assertEqual(result['api_calls']['sendPhoto'], 2)
+        self.assertEqual(result['api_calls']['sendDocument'], 2)
+        self.assertIn('cmd_mood', result['handlers'])
+
+        print("✅ Сценарии пользователей проходят!")
+
+    def test_workers_scenarios_end_to_end(self):
+        """Обновления проходят через супервизор и процессы-воркеры"""
+        print("🧪 Тестируем сценарии пользователей через супервизор с воркерами...")
+
+        import asyncio
+        from benchmarks.bench_workers import run_once
+
+        with tempfile.TemporaryDirectory() as tmp:
+            result = asyncio.run(run_once(
+                workers=2, users=3, rounds=1, analytics_share=1,
+                timeout=60, db_path=os.path.join(tmp, 'test.db')
+            ))
+
+        self.assertEqual(result['failed_users'], 0)
+        self.assertEqual(result['error_replies'], 0)
+        # Записи сохранили воркеры, а не процесс теста
+        self.assertEqual(result['mood_entries'], 3)
+        self.assertGreater(result['updates_per_sec'], 0)
+
+        print("✅ Воркеры обрабатывают обновления!")
+
+    def test_mood_entry_api_calls(self):
+        """Запись настроения укладывается в фиксированное число запросов к Bot API"""
+        print("🧪 Тестируем число запросов на запись настроения...")
+
+        import asyncio
+        from benchmarks.bench_mood_flow import run_benchmark
+        from database.db_manager import db_manager
+
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                result = asyncio.run(run_benchmark(
+                    users=1, entries=1, tags=2, timeout=30,
+                    db_path=os.path.join(tmp, 'test.db')
+                ))
+            finally:
+                db_manager.reset()
+
+        # /mood, оценка, категория, 2 тега, заметка (+ "Готово")
+        self.assertEqual(result['flows']['note']['api_calls_per_entry'], 9)
+        self.assertEqual(result['flows']['done']['api_calls_per_entry'], 11)
+        self.assertEqual(result['flows']['note']['by_method']['sendMessage'], 2)
+
+        print("✅ Запись настроения укладывается в 9 запросов!")
+
 
 def run_tests():
     """Запуск всех тестов с подробным выводом"""
@@ -300,6 +1697,25 @@ def run_tests():
     suite.addTest(loader.loadTestsFromTestCase(TestHelpers))
     suite.addTest(loader.loadTestsFromTestCase(TestKeyboards))
     suite.addTest(loader.loadTestsFromTestCase(TestModels))
+    suite.addTest(loader.loadTestsFromTestCase(TestWorkers))
+    suite.addTest(loader.loadTestsFromTestCase(TestLazyImports))
+    suite.addTest(loader.loadTestsFromTestCase(TestMoodArrays))
+    suite.addTest(loader.loadTestsFromTestCase(TestMetrics))
+    suite.addTest(loader.loadTestsFromTestCase(TestTagUsage))
+    suite.addTest(loader.loadTestsFromTestCase(TestReadCache))
+    suite.addTest(loader.loadTestsFromTestCase(TestUserRegistration))
+    suite.addTest(loader.loadTestsFromTestCase(TestDatabaseSession))
+    suite.addTest(loader.loadTestsFromTestCase(TestEditDebouncer))
+    suite.addTest(loader.loadTestsFromTestCase(TestMenuCallbacks))
+    suite.addTest(loader.loadTestsFromTestCase(TestCallbackIndex))
+    suite.addTest(loader.loadTestsFromTestCase(TestLogging))
+    suite.addTest(loader.loadTestsFromTestCase(TestSingleFlight))
+    suite.addTest(loader.loadTestsFromTestCase(TestMoodPatterns))
+    suite.addTest(loader.loadTestsFromTestCase(TestPatternMining))
+    suite.addTest(loader.loadTestsFromTestCase(TestMoodStreaks))
+    suite.addTest(loader.loadTestsFromTestCase(TestInsightsBatch))
+    suite.addTest(loader.loadTestsFromTestCase(TestDatasetGenerator))
+    suite.addTest(loader.loadTestsFromTestCase(TestLoadHarness))
 
     # Запускаем тесты
     runner = unittest.TextTestRunner(verbosity=2)
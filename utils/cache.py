@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Hashable, Tuple
+
+from utils.metrics import metrics, DB_CACHE_REQUESTS
+
+class VersionedLRUCache:
+    """LRU-кэш, в котором значение действительно только для своей версии
+
+    Запись хранит версию данных, для которой она посчитана. Если текущая
+    версия другая, запись считается устаревшей и перезаписывается.
+    maxsize = 0 выключает кэш.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int) -> Tuple[bool, Any]:
+        """(найдено, значение) для ключа и версии"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                return False, None
+            self._items.move_to_end(key)
+            return True, item[1]
+
+    def put(self, key: Hashable, version: int, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (version, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def resize(self, maxsize: int):
+        """Изменить размер (лишние старые записи удаляются)"""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._items) > max(maxsize, 0):
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+class LRUSet:
+    """Множество ограниченного размера: при переполнении удаляются давно не
+    проверявшиеся элементы"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, item: Hashable) -> bool:
+        with self._lock:
+            if item not in self._items:
+                return False
+            self._items.move_to_end(item)
+            return True
+
+    def add(self, item: Hashable):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[item] = None
+            self._items.move_to_end(item)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def discard(self, item: Hashable):
+        with self._lock:
+            self._items.pop(item, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+def memoize_per_user(method: Callable = None, *, copy: Callable = None):
+    """Декоратор метода чтения DatabaseManager
+
+    Первый аргумент метода - user_id. Результат хранится в self.read_cache
+    под ключом (метод, аргументы) вместе с версией данных пользователя
+    (self.data_version) и отдается, пока версия не изменится. copy - функция,
+    которой копируется результат перед выдачей, если вызывающий код его меняет.
+    Если self.cache_allowed(user_id) ложно (незафиксированные записи
+    пользователя в сессии), метод выполняется без кэша.
+    """
+    def decorate(method: Callable) -> Callable:
+        name = method.__name__
+
+        @wraps(method)
+        def wrapper(self, user_id: int, *args, **kwargs):
+            if not self.cache_allowed(user_id):
+                metrics.inc(DB_CACHE_REQUESTS, method=name, result='bypass')
+                return method(self, user_id, *args, **kwargs)
+
+            key = (name, user_id, args, tuple(sorted(kwargs.items())))
+            # Версия берется до чтения: если данные изменятся во время
+            # запроса, результат сохранится под старой версией и не будет выдан
+            version = self.data_version(user_id)
+
+            found, value = self.read_cache.get(key, version)
+            metrics.inc(DB_CACHE_REQUESTS, method=name, result='hit' if found else 'miss')
+            if not found:
+                value = method(self, user_id, *args, **kwargs)
+                self.read_cache.put(key, version, value)
+
+            return copy(value) if copy is not None else value
+
+        return wrapper
+
+    return decorate(method) if method is not None else decorate
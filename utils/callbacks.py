@@ -0,0 +1,132 @@
+from typing import Callable, Dict, List, Optional, Tuple, Type, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+from config import logger
+
+# Нажатия кнопок - самые частые события, в лог попадает их доля (config.LOG_SAMPLING)
+callback_logger = logger.getChild('callbacks')
+
+# ПРОТОКОЛ CALLBACK_DATA
+# ======================
+# Кнопка без аргументов передает имя действия ("diary_menu"), кнопка с
+# аргументами - действие и аргументы через двоеточие ("tag_toggle:12").
+# Аргументы описываются классами CallbackData, обработчик получает
+# разобранное значение аргументом callback_data.
+
+# Разделитель CallbackData по умолчанию
+SEPARATOR = ":"
+
+class MoodSelect(CallbackData, prefix="mood_select"):
+    score: int
+
+class TagCategory(CallbackData, prefix="category"):
+    key: str
+
+class TagToggle(CallbackData, prefix="tag_toggle"):
+    tag_id: int
+
+class DeleteTag(CallbackData, prefix="delete_tag"):
+    tag_id: int
+
+class ConfirmDeleteTag(CallbackData, prefix="confirm_delete_tag"):
+    tag_id: int
+
+class AnalyticsPeriod(CallbackData, prefix="analytics_period"):
+    period: str
+
+def category_key(name: str) -> str:
+    """Ключ категории тегов для кнопки (без пробелов и разделителя)"""
+    return name.lower().replace(" ", "_").replace(SEPARATOR, "_")
+
+async def callback_stale(callback: CallbackQuery):
+    """Кнопка неизвестного действия (например, из сообщения старой версии бота)"""
+    await callback.answer("⌛ Кнопка устарела, откройте меню заново")
+
+class CallbackIndex:
+    """Таблица обработчиков callback-запросов: действие -> обработчик
+
+    Обработчик находится одним поиском в словаре по действию из
+    callback_data, а не перебором фильтров всех роутеров по порядку.
+    Каждое действие регистрируется один раз: повторная регистрация
+    (например, одной кнопки в двух модулях) - ошибка при импорте модуля.
+    """
+
+    def __init__(self, name: str = "callbacks"):
+        self._handlers: Dict[str, Tuple[HandlerObject, Optional[Type[CallbackData]]]] = {}
+        self._stale = HandlerObject(callback=callback_stale)
+        # Единственный обработчик callback-запросов в диспетчере
+        self.router = Router(name=name)
+        self.router.callback_query.register(self._dispatch, self._match)
+
+    def register(self, action: Union[str, Type[CallbackData]], callback: Callable):
+        """Зарегистрировать обработчик действия (имени или класса CallbackData)"""
+        data_type = None
+        if isinstance(action, type) and issubclass(action, CallbackData):
+            if action.__separator__ != SEPARATOR:
+                raise ValueError(f"{action.__name__}: разделитель должен быть '{SEPARATOR}'")
+            data_type, action = action, action.__prefix__
+        elif SEPARATOR in action:
+            raise ValueError(f"Действие '{action}' содержит разделитель '{SEPARATOR}'")
+
+        existing = self._handlers.get(action)
+        if existing is not None:
+            raise ValueError(
+                f"Действие '{action}' уже обрабатывает {_qualified_name(existing[0].callback)}, "
+                f"повторная регистрация: {_qualified_name(callback)}"
+            )
+        self._handlers[action] = (HandlerObject(callback=callback), data_type)
+
+    def handler(self, action: Union[str, Type[CallbackData]]):
+        """Декоратор обработчика: @callbacks.handler("diary_menu")"""
+        def decorator(callback: Callable) -> Callable:
+            self.register(action, callback)
+            return callback
+        return decorator
+
+    def lookup(self, data: str) -> Optional[Tuple[HandlerObject, Optional[CallbackData]]]:
+        """Обработчик и разобранные аргументы для callback_data (None - неизвестное действие)"""
+        entry = self._handlers.get(data.partition(SEPARATOR)[0])
+        if entry is None:
+            return None
+
+        handler, data_type = entry
+        if data_type is None:
+            return handler, None
+        try:
+            return handler, data_type.unpack(data)
+        except (TypeError, ValueError):
+            return None
+
+    def actions(self) -> List[Union[str, Type[CallbackData]]]:
+        """Зарегистрированные действия (имена и классы CallbackData)"""
+        return [data_type or action for action, (_, data_type) in self._handlers.items()]
+
+    async def _match(self, callback: CallbackQuery) -> dict:
+        # Фильтр асинхронный: синхронные фильтры aiogram выполняет в пуле потоков.
+        # Найденный обработчик подменяет handler в данных события, поэтому
+        # метрики и флаги относятся к нему, а не к _dispatch
+        found = self.lookup(callback.data or "")
+        if found is None:
+            return {'handler': self._stale}
+
+        handler, callback_data = found
+        if callback_data is None:
+            return {'handler': handler}
+        return {'handler': handler, 'callback_data': callback_data}
+
+    @staticmethod
+    async def _dispatch(callback: CallbackQuery, handler: HandlerObject, **data):
+        callback_logger.info("Кнопка %s от пользователя %s", callback.data, callback.from_user.id,
+                             extra={'user_id': callback.from_user.id, 'action': callback.data})
+        # Обработчик получает только те аргументы, которые объявил (state, callback_data...)
+        return await handler.call(callback, **data)
+
+def _qualified_name(callback: Callable) -> str:
+    return f"{callback.__module__}.{callback.__qualname__}"
+
+# Глобальная таблица: модули handlers регистрируют в ней обработчики при импорте
+callbacks = CallbackIndex()
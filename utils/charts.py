@@ -1,18 +1,59 @@
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import seaborn as sns
-import pandas as pd
-import numpy as np
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from io import BytesIO
 
-from database.models import MoodEntry
+from database.models import MoodEntry, MoodArrays, EPOCH_ORDINAL
 from config import config, logger
+from utils.metrics import metrics, CHART_RENDER_DURATION
 
-# Настройка стиля графиков
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+# Библиотеки для графиков тяжелые (секунды и десятки МБ при импорте),
+# поэтому они загружаются не при старте бота, а при первом построении
+# графика или в фоновом прогреве (см. ChartGenerator.warm_up)
+plt = None
+mdates = None
+np = None
+
+_plotting_lock = threading.Lock()
+
+def load_plotting_stack():
+    """Загрузить matplotlib и numpy (выполняется один раз)"""
+    global plt, mdates, np
+
+    if plt is not None:
+        return
+
+    with _plotting_lock:
+        if plt is not None:
+            return
+
+        import matplotlib
+        # Бот работает без графического интерфейса - рисуем сразу в PNG
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as _plt
+        import matplotlib.dates as _mdates
+        import numpy as _np
+
+        # Настройка стиля графиков (стиль входит в сам matplotlib)
+        _plt.style.use('seaborn-v0_8')
+
+        mdates, np = _mdates, _np
+        # plt присваиваем последним: по нему проверяется, что все загружено
+        plt = _plt
+        logger.info("Библиотеки для графиков загружены")
+
+WEEKDAY_NAMES = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+# Графики принимают массивы из db_manager.get_mood_arrays
+# или (для совместимости) список MoodEntry
+ChartData = Union[MoodArrays, List[MoodEntry]]
+
+def as_mood_arrays(data: ChartData) -> MoodArrays:
+    """Привести данные графика к MoodArrays"""
+    if isinstance(data, MoodArrays):
+        return data
+    return MoodArrays.from_entries(data)
 
 class ChartGenerator:
     """Генератор графиков для аналитики настроения"""
@@ -20,33 +61,36 @@ class ChartGenerator:
     def __init__(self):
         self.colors = config.CHART_COLORS
 
-    def generate_mood_trend_chart(self, entries: List[MoodEntry],
+    def warm_up(self):
+        """Заранее загрузить библиотеки графиков (вызывается в фоне при старте)"""
+        load_plotting_stack()
+
+    @metrics.timed(CHART_RENDER_DURATION, chart='trend')
+    def generate_mood_trend_chart(self, entries: ChartData,
                                 start_date: date, end_date: date) -> BytesIO:
         """Генерировать график тренда настроения"""
-        if not entries:
-            return self._create_empty_chart("Нет данных для отображения")
+        load_plotting_stack()
 
-        # Подготовка данных
-        df = pd.DataFrame([{
-            'date': entry.entry_date,
-            'mood': entry.mood_score,
-            'diary': bool(entry.diary_text)
-        } for entry in entries])
+        if not len(entries):
+            return self._create_empty_chart("Нет данных для отображения")
 
-        df = df.sort_values('date')
-        df['date'] = pd.to_datetime(df['date'])
+        # Подготовка данных: сортировка по дате и перевод в datetime64
+        data = as_mood_arrays(entries)
+        order = np.argsort(data.ordinal, kind='stable')
+        dates = (data.ordinal[order] - EPOCH_ORDINAL).astype('datetime64[D]')
+        moods = data.score[order]
+        diary = data.diary[order].astype(bool)
 
         # Создание графика
         fig, ax = plt.subplots(figsize=(12, 6))
 
         # Линия тренда настроения
-        ax.plot(df['date'], df['mood'], 'o-', color=self.colors['good'],
+        ax.plot(dates, moods, 'o-', color=self.colors['good'],
                linewidth=2, markersize=6, alpha=0.8, label='Настроение')
 
         # Точки с дневниковыми записями
-        diary_points = df[df['diary']]
-        if not diary_points.empty:
-            ax.scatter(diary_points['date'], diary_points['mood'],
+        if diary.any():
+            ax.scatter(dates[diary], moods[diary],
                       color=self.colors['excellent'], s=80, marker='*',
                       label='С дневником', zorder=5)
 
@@ -75,56 +119,63 @@ class ChartGenerator:
 
         return buf
 
-    def generate_weekday_stats_chart(self, entries: List[MoodEntry]) -> BytesIO:
-        """Генерировать статистику по дням недели"""
-        if not entries:
-            return self._create_empty_chart("Нет данных для анализа")
+    def weekday_stats(self, entries: ChartData) -> tuple:
+        """Среднее настроение и количество записей по дням недели
 
-        # Подготовка данных
-        df = pd.DataFrame([{
-            'weekday': entry.entry_date.weekday(),
-            'mood': entry.mood_score
-        } for entry in entries])
+        Возвращает (mean, count) - массивы длины 7, mean = nan для дней без записей.
+        Нужен и отчету без графика, поэтому обходится без matplotlib.
+        """
+        import numpy as np
 
-        # Группировка по дням недели
-        weekday_stats = df.groupby('weekday').agg({
-            'mood': ['mean', 'count', 'std']
-        }).round(2)
+        data = as_mood_arrays(entries)
+        weekday = data.weekday
+        count = np.bincount(weekday, minlength=7)
+        total = np.bincount(weekday, weights=data.score, minlength=7)
 
-        weekday_stats.columns = ['mean_mood', 'count', 'std']
-        weekday_stats = weekday_stats.reset_index()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
 
-        # Названия дней недели
-        weekday_names = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
-        weekday_stats['weekday_name'] = weekday_stats['weekday'].map(
-            lambda x: weekday_names[x]
-        )
+        return mean, count
+
+    @metrics.timed(CHART_RENDER_DURATION, chart='weekday')
+    def generate_weekday_stats_chart(self, entries: ChartData) -> BytesIO:
+        """Генерировать статистику по дням недели"""
+        load_plotting_stack()
+
+        if not len(entries):
+            return self._create_empty_chart("Нет данных для анализа")
+
+        # Группировка по дням недели (показываем только дни с записями)
+        mean, count = self.weekday_stats(entries)
+        present = np.flatnonzero(count)
+        mean_mood = np.round(mean[present], 2)
+        counts = count[present]
+        names = [WEEKDAY_NAMES[day] for day in present]
 
         # Создание графика
         fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
 
         # График среднего настроения
-        bars1 = ax1.bar(weekday_stats['weekday_name'], weekday_stats['mean_mood'],
-                       color=[self.get_mood_color(mood) for mood in weekday_stats['mean_mood']])
+        bars1 = ax1.bar(names, mean_mood,
+                       color=[self.get_mood_color(mood) for mood in mean_mood])
         ax1.set_title('📅 Среднее настроение по дням недели', fontsize=14)
         ax1.set_ylabel('Среднее настроение')
         ax1.set_ylim(0, 5.5)
         ax1.grid(True, alpha=0.3)
 
         # Добавление значений на столбцы
-        for bar, mean_mood in zip(bars1, weekday_stats['mean_mood']):
+        for bar, value in zip(bars1, mean_mood):
             ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
-                    f'{mean_mood:.1f}', ha='center', va='bottom', fontsize=10)
+                    f'{value:.1f}', ha='center', va='bottom', fontsize=10)
 
         # График количества записей
-        bars2 = ax2.bar(weekday_stats['weekday_name'], weekday_stats['count'],
-                       color='skyblue', alpha=0.7)
+        bars2 = ax2.bar(names, counts, color='skyblue', alpha=0.7)
         ax2.set_title('Количество записей по дням недели', fontsize=14)
         ax2.set_ylabel('Количество записей')
         ax2.grid(True, alpha=0.3)
 
         # Добавление значений на столбцы
-        for bar, count in zip(bars2, weekday_stats['count']):
+        for bar, count in zip(bars2, counts):
             ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
                     str(int(count)), ha='center', va='bottom', fontsize=10)
 
@@ -138,8 +189,11 @@ class ChartGenerator:
 
         return buf
 
+    @metrics.timed(CHART_RENDER_DURATION, chart='tags')
     def generate_tags_pie_chart(self, tag_stats: Dict[str, int]) -> BytesIO:
         """Генерировать круговую диаграмму по тегам"""
+        load_plotting_stack()
+
         if not tag_stats:
             return self._create_empty_chart("Нет данных о тегах")
 
@@ -186,61 +240,70 @@ class ChartGenerator:
 
         return buf
 
-    def generate_heatmap_chart(self, entries: List[MoodEntry]) -> BytesIO:
+    def hour_weekday_grid(self, entries: ChartData) -> tuple:
+        """Сумма оценок и количество записей в сетке день недели x час
+
+        Учитываются только записи с известным временем создания.
+        Возвращает (total, count) - массивы 7x24.
+        """
+        import numpy as np
+
+        data = as_mood_arrays(entries)
+        known = data.hour >= 0
+        weekday = data.created_weekday[known]
+        hour = data.hour[known]
+
+        total = np.zeros((7, 24))
+        count = np.zeros((7, 24), dtype=np.int64)
+        np.add.at(total, (weekday, hour), data.score[known])
+        np.add.at(count, (weekday, hour), 1)
+
+        return total, count
+
+    @metrics.timed(CHART_RENDER_DURATION, chart='heatmap')
+    def generate_heatmap_chart(self, entries: ChartData) -> BytesIO:
         """Генерировать тепловую карту настроения по часам"""
-        if not entries:
-            return self._create_empty_chart("Нет данных для тепловой карты")
+        load_plotting_stack()
 
-        # Подготовка данных
-        data = []
-        for entry in entries:
-            if entry.created_at:
-                hour = entry.created_at.hour
-                weekday = entry.created_at.weekday()
-                data.append({
-                    'hour': hour,
-                    'weekday': weekday,
-                    'mood': entry.mood_score
-                })
-
-        if not data:
-            return self._create_empty_chart("Недостаточно данных для анализа по времени")
+        if not len(entries):
+            return self._create_empty_chart("Нет данных для тепловой карты")
 
-        df = pd.DataFrame(data)
+        total, count = self.hour_weekday_grid(entries)
 
-        # Создание сводной таблицы
-        pivot_table = df.pivot_table(
-            values='mood',
-            index='weekday',
-            columns='hour',
-            aggfunc='mean'
-        ).round(1)
+        if not count.any():
+            return self._create_empty_chart("Недостаточно данных для анализа по времени")
 
-        # Заполнение пропущенных значений средним
-        pivot_table = pivot_table.fillna(df['mood'].mean())
+        # Оставляем только дни и часы, в которые были записи
+        rows = np.flatnonzero(count.any(axis=1))
+        columns = np.flatnonzero(count.any(axis=0))
+        total = total[np.ix_(rows, columns)]
+        count = count[np.ix_(rows, columns)]
 
-        # Названия дней недели
-        weekday_names = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+        # Среднее по ячейкам, пустые ячейки заполняются общим средним
+        overall_mean = total.sum() / count.sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            grid = np.where(count > 0, np.round(total / count, 1), overall_mean)
 
         # Создание тепловой карты
         fig, ax = plt.subplots(figsize=(12, 6))
 
-        sns.heatmap(
-            pivot_table,
-            annot=True,
-            fmt='.1f',
-            cmap='RdYlGn',
-            center=3.0,
-            vmin=1,
-            vmax=5,
-            ax=ax,
-            cbar_kws={'label': 'Настроение'}
-        )
+        image = ax.imshow(grid, cmap='RdYlGn', vmin=1, vmax=5, aspect='auto')
+        colorbar = fig.colorbar(image, ax=ax)
+        colorbar.set_label('Настроение')
+
+        # Подписи значений в ячейках
+        for i, j in np.ndindex(grid.shape):
+            ax.text(j, i, f'{grid[i, j]:.1f}', ha='center', va='center', fontsize=9)
+
+        ax.set_xticks(range(len(columns)))
+        ax.set_xticklabels(columns)
+        ax.set_yticks(range(len(rows)))
+        ax.set_yticklabels([WEEKDAY_NAMES[day] for day in rows], rotation=0)
+        ax.grid(False)
 
         ax.set_title('🔥 Тепловая карта настроения по времени', fontsize=16, pad=20)
         ax.set_xlabel('Час дня', fontsize=12)
         ax.set_ylabel('День недели', fontsize=12)
-        ax.set_yticklabels(weekday_names, rotation=0)
 
         plt.tight_layout()
 
@@ -252,22 +315,26 @@ class ChartGenerator:
 
         return buf
 
-    def generate_mood_distribution_chart(self, entries: List[MoodEntry]) -> BytesIO:
+    @metrics.timed(CHART_RENDER_DURATION, chart='distribution')
+    def generate_mood_distribution_chart(self, entries: ChartData) -> BytesIO:
         """Генерировать гистограмму распределения настроения"""
-        if not entries:
+        load_plotting_stack()
+
+        if not len(entries):
             return self._create_empty_chart("Нет данных для анализа")
 
-        # Подготовка данных
-        moods = [entry.mood_score for entry in entries]
-        mood_counts = pd.Series(moods).value_counts().sort_index()
+        # Количество записей по каждой оценке (только встречающиеся оценки)
+        counts = np.bincount(as_mood_arrays(entries).score, minlength=6)
+        scores = np.flatnonzero(counts)
+        counts = counts[scores]
 
         # Создание графика
         fig, ax = plt.subplots(figsize=(10, 6))
 
         bars = ax.bar(
-            mood_counts.index,
-            mood_counts.values,
-            color=[self.get_mood_color(score) for score in mood_counts.index]
+            scores,
+            counts,
+            color=[self.get_mood_color(score) for score in scores]
         )
 
         ax.set_title('📊 Распределение настроения', fontsize=16, pad=20)
@@ -278,7 +345,7 @@ class ChartGenerator:
         ax.grid(True, alpha=0.3)
 
         # Добавление значений на столбцы
-        for bar, count in zip(bars, mood_counts.values):
+        for bar, count in zip(bars, counts):
             ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
                    str(count), ha='center', va='bottom', fontsize=10)
 
@@ -298,6 +365,8 @@ class ChartGenerator:
 
     def _create_empty_chart(self, message: str) -> BytesIO:
         """Создать пустой график с сообщением"""
+        load_plotting_stack()
+
         fig, ax = plt.subplots(figsize=(8, 6))
 
         ax.text(0.5, 0.5, message,
@@ -319,3 +388,8 @@ class ChartGenerator:
 
 # Глобальный экземпляр генератора графиков
 chart_generator = ChartGenerator()
+
+# Графики строятся не в цикле событий, а в этом потоке (см. utils.singleflight).
+# pyplot не потокобезопасен, поэтому поток один. Длину его очереди
+# ограничивает config.CHART_QUEUE_LIMIT
+chart_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='charts')
@@ -0,0 +1,47 @@
+import threading
+from typing import Any, Callable
+
+class LazySingleton:
+    """Ленивый глобальный экземпляр.
+
+    Объект создается при первом обращении к любому его атрибуту, а не при
+    импорте модуля. Поэтому импорт database.db_manager не открывает базу
+    данных, а импорт utils.scheduler не создает планировщик - это делается
+    явно при запуске бота (bot.on_startup) или при первом использовании.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def resolve(self) -> Any:
+        """Получить экземпляр, создав его при необходимости"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    @property
+    def initialized(self) -> bool:
+        """Был ли экземпляр уже создан"""
+        return self._instance is not None
+
+    def override(self, instance: Any):
+        """Подставить готовый экземпляр (тесты, бенчмарки с временной базой)"""
+        with self._lock:
+            self._instance = instance
+
+    def reset(self):
+        """Забыть экземпляр (следующее обращение создаст новый)"""
+        with self._lock:
+            self._instance = None
+
+    def __getattr__(self, name: str) -> Any:
+        # Вызывается только для атрибутов, которых нет у самой обертки
+        return getattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        state = repr(self._instance) if self._instance is not None else "не создан"
+        return f"<LazySingleton {state}>"
@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Dict, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+from config import config, logger
+from utils.container import LazySingleton
+from utils.metrics import metrics, TELEGRAM_EDITS_COALESCED
+
+class EditDebouncer:
+    """Отложенное редактирование сообщений
+
+    Редактирование выполняется через delay секунд после последнего вызова
+    schedule для того же сообщения; более ранние, еще не выполненные
+    редактирования отменяются. Так серия нажатий на кнопки дает один запрос
+    editMessageText вместо нескольких и не упирается в ограничения Telegram
+    на частоту запросов в чат.
+    """
+
+    def __init__(self, delay: float = config.EDIT_DEBOUNCE_SECONDS):
+        self.delay = delay
+        self._pending: Dict[Tuple[int, int], asyncio.Task] = {}
+
+    @staticmethod
+    def _key(message: Message) -> Tuple[int, int]:
+        return message.chat.id, message.message_id
+
+    def schedule(self, message: Message, edit: Callable[[], Awaitable]):
+        """Отредактировать сообщение после паузы, заменив ожидающее редактирование"""
+        if self.cancel(message):
+            metrics.inc(TELEGRAM_EDITS_COALESCED)
+
+        key = self._key(message)
+        # Задача создается в пустом контексте: сессия базы обновления
+        # (DatabaseManager.session) к моменту редактирования уже закрыта
+        task = contextvars.Context().run(asyncio.create_task, self._run(key, edit))
+        self._pending[key] = task
+
+    def cancel(self, message: Message) -> bool:
+        """Отменить ожидающее редактирование (обработчик сам перерисовывает сообщение)"""
+        task = self._pending.pop(self._key(message), None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def cancel_chat(self, chat_id: int):
+        """Отменить ожидающие редактирования всех сообщений чата"""
+        for key in [key for key in self._pending if key[0] == chat_id]:
+            self._pending.pop(key).cancel()
+
+    def pending(self) -> int:
+        """Количество ожидающих редактирований"""
+        return len(self._pending)
+
+    async def _run(self, key: Tuple[int, int], edit: Callable[[], Awaitable]):
+        await asyncio.sleep(self.delay)
+
+        # Начатое редактирование уже не отменяется
+        if self._pending.get(key) is asyncio.current_task():
+            del self._pending[key]
+
+        try:
+            await edit()
+        except TelegramBadRequest as e:
+            # Выбор вернулся к показанному (тег нажали дважды)
+            if 'message is not modified' not in str(e):
+                logger.error("Ошибка отложенного редактирования сообщения %s: %s", key, e)
+        except Exception as e:
+            logger.error("Ошибка отложенного редактирования сообщения %s: %s", key, e)
+
+# Глобальный экземпляр (создается при первом обращении)
+edit_debouncer = LazySingleton(EditDebouncer)
@@ -82,6 +82,26 @@ def format_stats_message(stats) -> str:
 
     return message
 
+SPARKLINE_BLOCKS = "▁▂▃▄▅▆▇█"
+
+def format_sparkline(values: list, width: int = 31) -> str:
+    """Строка-график настроения ▁▃▅█ (вместо картинки, когда графики перегружены)
+
+    values - средние оценки 1-5 по дням, None - день без записей ("·").
+    Если дней больше width, соседние дни усредняются.
+    """
+    if len(values) > width:
+        step = len(values) / width
+        buckets = [[value for value in values[int(i * step):int((i + 1) * step)] if value is not None]
+                   for i in range(width)]
+        values = [sum(bucket) / len(bucket) if bucket else None for bucket in buckets]
+
+    top = len(SPARKLINE_BLOCKS) - 1
+    return "".join(
+        "·" if value is None else SPARKLINE_BLOCKS[min(max(round((value - 1) / 4 * top), 0), top)]
+        for value in values
+    )
+
 def get_mood_color(score: int) -> str:
     """Получить цвет для оценки настроения"""
     if score >= 5:
@@ -95,7 +115,7 @@ def get_mood_color(score: int) -> str:
     else:
         return config.CHART_COLORS['terrible']
 
-def format_patterns_message(patterns: list) -> str:
+def format_patterns_message(patterns: list, limit: int = 10) -> str:
     """Форматировать сообщение с паттернами настроения"""
     if not patterns:
         return "🔍 Паттерны не найдены. Нужно больше записей для анализа."
@@ -105,13 +125,43 @@ def format_patterns_message(patterns: list) -> str:
     # Сортируем по абсолютному значению корреляции
     patterns.sort(key=lambda x: abs(x.correlation), reverse=True)
 
-    for pattern in patterns[:10]:  # Показываем топ 10
-        trend = "📈" if pattern.correlation > 0 else "📉"
+    for pattern in patterns[:limit]:  # Показываем топ limit
+        # Корреляции, интервал которых содержит ноль, могут быть случайными
+        if pattern.significant:
+            trend = "📈" if pattern.correlation > 0 else "📉"
+        else:
+            trend = "❔"
         correlation_text = f"+{pattern.correlation}" if pattern.correlation > 0 else str(pattern.correlation)
 
         message += f"{trend} {pattern.tag_name}\n"
         message += f"   Корреляция: {correlation_text}\n"
-        message += f"   Положительных записей: {pattern.positive_entries}/{pattern.total_entries}\n\n"
+        message += (f"   Положительных записей: {pattern.positive_entries}/{pattern.total_entries}"
+                    f" (×{pattern.lift:.2f})\n\n")
+
+    if any(not pattern.significant for pattern in patterns[:limit]):
+        message += "❔ - связь может быть случайной (мало записей)"
+
+    return message
+
+def format_mined_patterns_message(patterns: list, limit: int = 5) -> str:
+    """Форматировать связки тегов и эффекты следующего дня (MinedPattern)
+
+    Показываются только статистически значимые паттерны.
+    """
+    patterns = [pattern for pattern in patterns if pattern.significant][:limit]
+    if not patterns:
+        return ""
+
+    message = "🔗 Связки и последствия\n\n"
+    for pattern in patterns:
+        trend = "📈" if pattern.correlation > 0 else "📉"
+        difference = f"{pattern.mean_difference:+.1f}"
+
+        if pattern.kind == 'lag':
+            message += f"{trend} {pattern.tag_name} вчера → настроение сегодня {difference}\n"
+        else:
+            message += f"{trend} {pattern.tag_name} + {pattern.other_tag_name}: {difference}\n"
+        message += f"   Случаев: {pattern.support}, корреляция: {pattern.correlation:+.2f}\n"
 
     return message
 
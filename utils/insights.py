@@ -0,0 +1,142 @@
+import asyncio
+import time
+from typing import Dict, List
+
+from config import config, logger
+from database.db_manager import db_manager
+from utils.container import LazySingleton
+
+# Разница средних (последние 7 записей против 7 предыдущих), начиная
+# с которой настроение считается улучшающимся или ухудшающимся
+TREND_THRESHOLD = 0.3
+
+def compute_insights(user_ids, ordinals, scores) -> Dict[str, object]:
+    """Инсайты для всех пользователей порции сразу
+
+    Массивы упорядочены по (user_id, entry_ordinal) и содержат все записи
+    каждого пользователя. Возвращает массивы по пользователям: user_id,
+    total_entries, recent_average, older_average, trend (-1, 0, 1) и
+    best_weekday (0 - понедельник). Серии здесь не считаются: они хранятся
+    в users и обновляются при записи (DatabaseManager.save_mood_entry).
+    """
+    import numpy as np
+
+    n = len(user_ids)
+    new_user = np.r_[True, user_ids[1:] != user_ids[:-1]]
+    starts = np.flatnonzero(new_user)
+    counts = np.diff(np.r_[starts, n])
+    group = np.cumsum(new_user) - 1
+    users = starts.size
+
+    # Номер записи с конца (0 - самая свежая запись пользователя)
+    rank = np.repeat(starts + counts, counts) - np.arange(n) - 1
+
+    def window_average(mask):
+        total = np.bincount(group[mask], weights=scores[mask], minlength=users)
+        number = np.bincount(group[mask], minlength=users)
+        return total / np.maximum(number, 1)
+
+    recent_average = window_average(rank < 7)
+    # Предыдущие 7 записей учитываются, только если они есть полностью
+    older_average = np.where(counts >= 14, window_average((rank >= 7) & (rank < 14)), recent_average)
+    trend = np.where(recent_average > older_average + TREND_THRESHOLD, 1,
+                     np.where(recent_average < older_average - TREND_THRESHOLD, -1, 0))
+
+    # Лучший день недели по средней оценке (порядковый номер дня 1 - понедельник)
+    cell = group * 7 + (ordinals - 1) % 7
+    weekday_sums = np.bincount(cell, weights=scores, minlength=users * 7).reshape(users, 7)
+    weekday_counts = np.bincount(cell, minlength=users * 7).reshape(users, 7)
+    weekday_means = np.where(weekday_counts > 0, weekday_sums / np.maximum(weekday_counts, 1), -np.inf)
+    best_weekday = weekday_means.argmax(axis=1)
+
+    return {
+        'user_id': user_ids[starts],
+        'total_entries': counts,
+        'recent_average': recent_average,
+        'older_average': older_average,
+        'trend': trend,
+        'best_weekday': best_weekday,
+    }
+
+class InsightsBatch:
+    """Ночной расчет инсайтов для всех пользователей
+
+    Таблица mood_entries читается один раз порциями, упорядоченными по
+    пользователю; тренд и лучший день недели считаются сразу для всех
+    пользователей порции и сохраняются в user_insights. Обработчики только
+    читают готовые строки (см. fixes.get_mood_insights).
+    """
+
+    TRENDS = {1: 'up', -1: 'down', 0: 'stable'}
+
+    def __init__(self, chunk_rows: int = config.INSIGHTS_CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+
+    def run(self) -> int:
+        """Посчитать инсайты всех пользователей, вернуть их количество"""
+        import numpy as np
+
+        started = time.perf_counter()
+        processed = 0
+        carry = None
+
+        for chunk in db_manager.iter_all_mood_columns(self.chunk_rows):
+            if carry is not None:
+                chunk = np.concatenate([carry, chunk])
+
+            # Записи последнего пользователя порции могут продолжиться в следующей
+            last_user = chunk[-1, 0]
+            complete = np.searchsorted(chunk[:, 0], last_user)
+            carry = chunk[complete:]
+
+            if complete:
+                processed += self._save(chunk[:complete])
+
+        if carry is not None and len(carry):
+            processed += self._save(carry)
+
+        logger.info("Инсайты посчитаны для %s пользователей за %.2f с",
+                    processed, time.perf_counter() - started)
+        return processed
+
+    def _save(self, rows) -> int:
+        insights = compute_insights(rows[:, 0], rows[:, 1], rows[:, 2])
+        db_manager.save_user_insights(self._rows(insights))
+        return len(insights['user_id'])
+
+    def _rows(self, insights: Dict[str, object]) -> List[tuple]:
+        return [
+            (user_id, total, round(recent, 2), round(older, 2), self.TRENDS[trend], weekday)
+            for user_id, total, recent, older, trend, weekday in zip(
+                insights['user_id'].tolist(), insights['total_entries'].tolist(),
+                insights['recent_average'].tolist(), insights['older_average'].tolist(),
+                insights['trend'].tolist(), insights['best_weekday'].tolist()
+            )
+        ]
+
+    async def run_async(self):
+        """Расчет в отдельном потоке, чтобы не блокировать обработку обновлений"""
+        await asyncio.to_thread(self.run)
+
+    def schedule(self, scheduler):
+        """Добавить ночной расчет в планировщик APScheduler
+
+        Если инсайты еще ни разу не считались, первый расчет запускается сразу.
+        """
+        from datetime import datetime
+        from apscheduler.triggers.cron import CronTrigger
+
+        job = scheduler.add_job(
+            func=self.run_async,
+            trigger=CronTrigger(hour=config.INSIGHTS_HOUR, minute=0),
+            id="insights_batch",
+            name="Nightly insights",
+            replace_existing=True
+        )
+        if db_manager.get_insights_computed_at() is None:
+            job.modify(next_run_time=datetime.now())
+
+        logger.info("Расчет инсайтов запускается ежедневно в %s:00", config.INSIGHTS_HOUR)
+
+# Глобальный экземпляр (создается при первом обращении)
+insights_batch = LazySingleton(InsightsBatch)
@@ -0,0 +1,165 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from typing import Dict, List, Optional
+
+# Модуль не импортирует config: его использует config.setup_logging
+
+# Атрибуты, которые есть у любой записи; остальные пришли через extra=
+_RECORD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON
+
+    Поля, переданные через extra= (например, user_id), попадают в запись
+    отдельными ключами, поэтому логи можно фильтровать без разбора текста.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc_info'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей ниже WARNING (предупреждения и ошибки - все)
+
+    Выборка равномерная и детерминированная: при rate=0.1 проходит каждая
+    десятая запись (первая, одиннадцатая и т.д.).
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._seen = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        n = self._seen
+        self._seen += 1
+        # Запись проходит, когда n * rate переходит к следующему целому
+        return n == 0 or int(n * self.rate) > int((n - 1) * self.rate)
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """'mood_tracker.callbacks=0.1,aiogram=0.5' -> {логгер: доля}"""
+    rates = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition('=')
+        rates[name.strip()] = float(rate)
+    return rates
+
+def file_handler(path: str, rotate: str, max_bytes: int, backup_count: int) -> logging.Handler:
+    """Файл лога с ротацией по размеру (rotate="size") или по времени ("midnight", "H"...)"""
+    # delay: файл открывается при первой записи, поэтому воркер, который
+    # передает записи супервизору (forward_to), его не открывает
+    if rotate == 'size':
+        return logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+    return logging.handlers.TimedRotatingFileHandler(
+        path, when=rotate, backupCount=backup_count, encoding='utf-8', delay=True
+    )
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """Очередь внутри процесса: запись не нужно готовить к передаче
+
+    Сообщение (msg % args) собирает поток записи, а не обработчик
+    обновления. Аргументы логов - id, числа и строки, они не меняются
+    до записи.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class LogWriter:
+    """Фоновый поток, который пишет записи логов в файл и консоль
+
+    Логгеры только ставят запись в очередь, поэтому запись на диск не
+    блокирует цикл событий. Записи воркеров (отдельных процессов) приходят
+    через их очереди (listen), файл пишет и ротирует один процесс.
+    """
+
+    def __init__(self, handlers: List[logging.Handler]):
+        self.handlers = handlers
+        self.queue = queue.SimpleQueue()
+        self.handler = _LocalQueueHandler(self.queue)
+        self._listeners = [logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)]
+        self._started = False
+
+    def start(self):
+        for listener in self._listeners:
+            listener.start()
+        self._started = True
+
+    def listen(self, source) -> logging.handlers.QueueListener:
+        """Писать записи из очереди другого процесса (см. forward_to)"""
+        listener = logging.handlers.QueueListener(source, *self.handlers, respect_handler_level=True)
+        self._listeners.append(listener)
+        if self._started:
+            listener.start()
+        return listener
+
+    def stop_listening(self, listener: logging.handlers.QueueListener):
+        """Дописать записи из очереди другого процесса и перестать ее читать"""
+        self._listeners.remove(listener)
+        if self._started:
+            listener.stop()
+
+    def stop(self):
+        """Дописать записи из очередей и остановить потоки"""
+        if not self._started:
+            return
+        self._started = False
+        for listener in self._listeners:
+            listener.stop()
+
+# Поток записи процесса (см. install)
+log_writer: Optional[LogWriter] = None
+
+def install(handlers: List[logging.Handler], level: int = logging.INFO) -> LogWriter:
+    """Направить записи корневого логгера в фоновый поток записи"""
+    global log_writer
+
+    if log_writer is not None:
+        log_writer.stop()
+    log_writer = LogWriter(handlers)
+    logging.basicConfig(level=level, handlers=[log_writer.handler], force=True)
+    log_writer.start()
+    return log_writer
+
+def forward_to(target_queue, level: int = logging.INFO):
+    """В процессе-воркере: передавать записи супервизору вместо своего потока записи"""
+    global log_writer
+
+    if log_writer is not None:
+        log_writer.stop()
+        for handler in log_writer.handlers:
+            handler.close()
+        log_writer = None
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(target_queue))
+    root.setLevel(level)
+
+def _stop_writer():
+    if log_writer is not None:
+        log_writer.stop()
+
+# Выполняется до logging.shutdown: записи из очереди успевают попасть в файл
+atexit.register(_stop_writer)
@@ -0,0 +1,294 @@
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Dict, Tuple
+
+from config import logger
+from utils.profiling import slow_query_log
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Квантили, которые отдаются вместе с гистограммами
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Последняя корзина - все, что больше верхней границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    # Выше последней границы точнее оценить нельзя
+                    return lower
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+
+        return self.buckets[-1]
+
+class MetricsRegistry:
+    """Хранилище метрик процесса: гистограммы и счетчики с метками"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        """Описание метрики для # HELP"""
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels):
+        """Записать значение в гистограмму"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            histogram = family.get(key)
+            if histogram is None:
+                histogram = family[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Увеличить счетчик"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Замерить время выполнения блока кода"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name: str, **labels):
+        """Декоратор: замер времени выполнения функции"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def get_histogram(self, name: str, **labels) -> Histogram:
+        """Получить гистограмму (для тестов и отчетов)"""
+        return self._histograms.get(name, {}).get(tuple(sorted(labels.items())))
+
+    def get_histograms(self, name: str) -> Dict[Tuple, Histogram]:
+        """Все гистограммы метрики: {метки: гистограмма}"""
+        with self._lock:
+            return dict(self._histograms.get(name, {}))
+
+    def get_counter(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        with self._lock:
+            for name, family in sorted(self._counters.items()):
+                self._render_header(lines, name, 'counter')
+                for key, value in sorted(family.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name, family in sorted(self._histograms.items()):
+                self._render_header(lines, name, 'histogram')
+                for key, histogram in sorted(family.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(key, le=bound)} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, le='+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+
+                # Квантили отдельной метрикой, чтобы их было видно без PromQL
+                lines.append(f"# TYPE {name}_quantile gauge")
+                for key, histogram in sorted(family.items()):
+                    for q in QUANTILES:
+                        lines.append(f"{name}_quantile{_format_labels(key, quantile=q)} "
+                                     f"{histogram.quantile(q)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _render_header(self, lines: list, name: str, metric_type: str):
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+def _format_labels(key: tuple, **extra) -> str:
+    items = list(key) + [(k, v) for k, v in extra.items()]
+    if not items:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+# Глобальное хранилище метрик процесса
+metrics = MetricsRegistry()
+
+HANDLER_DURATION = 'moodtracker_handler_duration_seconds'
+DB_QUERY_DURATION = 'moodtracker_db_query_duration_seconds'
+DB_ROWS = 'moodtracker_db_rows_total'
+CHART_RENDER_DURATION = 'moodtracker_chart_render_seconds'
+TELEGRAM_REQUEST_DURATION = 'moodtracker_telegram_request_duration_seconds'
+DB_CACHE_REQUESTS = 'moodtracker_db_cache_requests_total'
+DB_CONNECTIONS = 'moodtracker_db_connections_total'
+DB_COMMITS = 'moodtracker_db_commits_total'
+TELEGRAM_EDITS_COALESCED = 'moodtracker_telegram_edits_coalesced_total'
+SINGLE_FLIGHT_SHARED = 'moodtracker_single_flight_shared_total'
+SINGLE_FLIGHT_REJECTED = 'moodtracker_single_flight_rejected_total'
+
+metrics.describe(HANDLER_DURATION, "Время работы обработчика aiogram")
+metrics.describe(DB_QUERY_DURATION, "Время выполнения SQL-запроса")
+metrics.describe(DB_ROWS, "Строки, прочитанные или измененные SQL-запросами")
+metrics.describe(CHART_RENDER_DURATION, "Время построения графика")
+metrics.describe(TELEGRAM_REQUEST_DURATION, "Время запроса к Telegram Bot API")
+metrics.describe(DB_CACHE_REQUESTS, "Обращения к кэшу чтения базы (result: hit, miss, bypass)")
+metrics.describe(DB_CONNECTIONS, "Открытые соединения с базой")
+metrics.describe(DB_COMMITS, "Зафиксированные транзакции")
+metrics.describe(TELEGRAM_EDITS_COALESCED, "Редактирования сообщений, замененные более поздними")
+metrics.describe(SINGLE_FLIGHT_SHARED, "Запросы, получившие результат уже выполнявшегося вычисления")
+metrics.describe(SINGLE_FLIGHT_REJECTED, "Вычисления, не принятые из-за полной очереди (ответ без графика)")
+
+# ===== ЗАПРОСЫ К БАЗЕ ДАННЫХ =====
+
+_QUERY_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?: IF NOT EXISTS)?|ON)\s+(\w+)', re.IGNORECASE)
+
+@lru_cache(maxsize=512)
+def query_label(sql: str) -> str:
+    """Короткая метка запроса: операция и таблица ("SELECT mood_entries")"""
+    words = sql.split(None, 1)
+    if not words:
+        return "EMPTY"
+    operation = words[0].upper()
+    match = _QUERY_TABLE.search(sql)
+    return f"{operation} {match.group(1)}" if match else operation
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, записывающий время запросов и количество строк
+
+    Прочитанные строки считаются в fetchone/fetchmany/fetchall. Перебор
+    курсора в цикле не учитывается: переопределение __next__ замедлило бы
+    чтение каждой строки.
+    """
+
+    def execute(self, sql, parameters=()):
+        label = query_label(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            duration = time.perf_counter() - started
+            metrics.observe(DB_QUERY_DURATION, duration, query=label)
+            self._count_changes(label)
+            if slow_query_log.enabled:
+                slow_query_log.check(self.connection, sql, parameters, duration)
+
+    def executemany(self, sql, seq_of_parameters):
+        label = query_label(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            duration = time.perf_counter() - started
+            metrics.observe(DB_QUERY_DURATION, duration, query=label)
+            self._count_changes(label)
+            if slow_query_log.enabled:
+                slow_query_log.check(self.connection, sql, seq_of_parameters, duration, many=True)
+
+    def _count_changes(self, label: str):
+        self._label = label
+        # Для INSERT/UPDATE/DELETE количество строк известно сразу,
+        # прочитанные строки считаются в fetch*
+        if self.rowcount > 0:
+            metrics.inc(DB_ROWS, self.rowcount, query=label)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            metrics.inc(DB_ROWS, 1, query=getattr(self, '_label', 'UNKNOWN'))
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        metrics.inc(DB_ROWS, len(rows), query=getattr(self, '_label', 'UNKNOWN'))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        metrics.inc(DB_ROWS, len(rows), query=getattr(self, '_label', 'UNKNOWN'))
+        return rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого записывают метрики запросов"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        metrics.inc(DB_CONNECTIONS)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        if self.in_transaction:
+            metrics.inc(DB_COMMITS)
+        super().commit()
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# ===== HTTP ЭНДПОИНТ =====
+
+async def start_metrics_server(host: str, port: int):
+    """Запустить HTTP сервер с /metrics, вернуть runner для остановки"""
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("📈 Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
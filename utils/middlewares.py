@@ -0,0 +1,91 @@
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from database.db_manager import db_manager, current_session
+from utils.metrics import metrics, HANDLER_DURATION, TELEGRAM_REQUEST_DURATION
+
+def _handler_name(data: dict) -> str:
+    handler = data.get('handler')
+    callback = getattr(handler, 'callback', None)
+    return getattr(callback, '__name__', 'unknown')
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренняя middleware: время работы каждого обработчика"""
+
+    def __init__(self, event_type: str):
+        self.event_type = event_type
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            metrics.observe(
+                HANDLER_DURATION, time.perf_counter() - started,
+                handler=_handler_name(data), event=self.event_type, status=status
+            )
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """Middleware сессии бота: время запросов к Bot API (отправка, загрузка фото)"""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = getattr(method, '__api_method__', type(method).__name__)
+        with metrics.timer(TELEGRAM_REQUEST_DURATION, method=api_method):
+            return await make_request(bot, method)
+
+class DatabaseSessionMiddleware(BaseMiddleware):
+    """Внешняя middleware обновлений: одна сессия базы на обновление
+
+    Все вызовы db_manager при обработке обновления идут через одно
+    соединение и фиксируются одним коммитом (см. DatabaseManager.session).
+    Сессия передается обработчикам аргументом db_session.
+    """
+
+    async def __call__(self, handler, event, data):
+        with db_manager.session() as session:
+            data['db_session'] = session
+            return await handler(event, data)
+
+class UserRegistrationMiddleware(BaseMiddleware):
+    """Внешняя middleware обновлений: отправитель всегда зарегистрирован
+
+    Обработчикам не нужно вызывать get_or_create_user. Пользователи, уже
+    встреченные процессом, не проверяются (см. DatabaseManager.ensure_user).
+    """
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if user is not None and not user.is_bot:
+            db_manager.ensure_user(user.id, user.username, user.first_name)
+        return await handler(event, data)
+
+class DatabaseFlushMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: фиксирует записи обновления перед запросом к Bot API
+
+    Пока идет запрос, обрабатываются другие обновления, и открытая
+    транзакция заставила бы их ждать блокировку базы. Кроме того,
+    пользователь получает ответ только о сохраненных данных.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        session = current_session()
+        if session is not None:
+            session.flush()
+        return await make_request(bot, method)
+
+def setup_middlewares(dp):
+    """Подключить middleware к диспетчеру"""
+    # Регистрация фиксируется сразу, до сессии: синхронные фильтры aiogram
+    # выполняются в пуле потоков, и открытая до выбора обработчика транзакция
+    # держала бы блокировку базы, пока обрабатываются другие обновления
+    dp.update.outer_middleware(UserRegistrationMiddleware())
+    dp.update.outer_middleware(DatabaseSessionMiddleware())
+    # Внутренние middleware диспетчера действуют на обработчики всех роутеров
+    dp.message.middleware(HandlerMetricsMiddleware("message"))
+    dp.callback_query.middleware(HandlerMetricsMiddleware("callback_query"))
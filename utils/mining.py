@@ -0,0 +1,99 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import List
+
+from config import config, logger
+from database.db_manager import db_manager
+from utils.container import LazySingleton
+
+class PatternMiner:
+    """Фоновый поиск паттернов: связки тегов и влияние тега на следующий день
+
+    Пересчитываются только пользователи из очереди pattern_mining_queue
+    (в нее попадают при сохранении записи и удалении тега), поэтому
+    каждый запуск обрабатывает лишь изменившиеся данные. Кнопка
+    "Паттерны" читает готовые строки из mined_patterns.
+    """
+
+    def __init__(self, min_support: int = config.PATTERN_MIN_SUPPORT,
+                 max_per_kind: int = config.PATTERN_MAX_PER_KIND):
+        self.min_support = min_support
+        self.max_per_kind = max_per_kind
+
+    def mine_user(self, user_id: int) -> List[tuple]:
+        """Найти паттерны пользователя (строки для finish_pattern_mining)"""
+        import numpy as np
+        from utils.patterns import mine_patterns
+
+        data = db_manager.fetch_pattern_data(user_id)
+        if not data['link_tags'].size:
+            return []
+
+        found = mine_patterns(**data, min_support=self.min_support)
+
+        rows = []
+        for kind, stats in (('pair', found['pairs']), ('lag', found['lagged'])):
+            # Сохраняем самые сильные связи каждого вида
+            strongest = np.argsort(-np.abs(stats['correlation']), kind='stable')[:self.max_per_kind]
+            other_tag_ids = stats.get('other_tag_id')
+
+            for i in strongest.tolist():
+                rows.append((
+                    kind,
+                    int(stats['tag_id'][i]),
+                    int(other_tag_ids[i]) if other_tag_ids is not None else None,
+                    int(stats['total_entries'][i]),
+                    round(float(stats['correlation'][i]), 3),
+                    round(float(stats['ci_low'][i]), 3),
+                    round(float(stats['ci_high'][i]), 3),
+                    round(float(stats['lift'][i]), 3),
+                    round(float(stats['mean_difference'][i]), 3)
+                ))
+
+        return rows
+
+    def run_pending(self, limit: int = None) -> int:
+        """Пересчитать паттерны пользователей из очереди
+
+        Возвращает количество обработанных пользователей.
+        """
+        queue = db_manager.get_pattern_mining_queue(limit)
+        if not queue:
+            return 0
+
+        started = time.perf_counter()
+        for user_id, changes in queue.items():
+            try:
+                rows = self.mine_user(user_id)
+            except Exception as e:
+                # Пользователь остается в очереди и будет обработан в следующий раз
+                logger.error("Ошибка поиска паттернов для пользователя %s: %s", user_id, e)
+                continue
+
+            db_manager.finish_pattern_mining(user_id, changes, rows)
+
+        logger.info("Паттерны пересчитаны для %s пользователей за %.2f с",
+                    len(queue), time.perf_counter() - started)
+        return len(queue)
+
+    async def run_pending_async(self):
+        """Пересчет в отдельном потоке, чтобы не блокировать обработку обновлений"""
+        await asyncio.to_thread(self.run_pending)
+
+    def schedule(self, scheduler):
+        """Добавить периодический пересчет в планировщик APScheduler"""
+        from apscheduler.triggers.interval import IntervalTrigger
+
+        scheduler.add_job(
+            func=self.run_pending_async,
+            trigger=IntervalTrigger(minutes=config.PATTERN_MINING_INTERVAL),
+            id="pattern_mining",
+            name="Pattern mining",
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+        logger.info("Поиск паттернов запускается каждые %s мин", config.PATTERN_MINING_INTERVAL)
+
+# Глобальный экземпляр (создается при первом обращении)
+pattern_miner = LazySingleton(PatternMiner)
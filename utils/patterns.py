@@ -0,0 +1,156 @@
+from typing import Dict
+
+import numpy as np
+
+# Оценка настроения, начиная с которой запись считается положительной
+POSITIVE_SCORE = 4
+
+# Квантиль нормального распределения для 95% доверительного интервала
+Z_95 = 1.959964
+
+def tag_mood_statistics(entry_ids: np.ndarray, scores: np.ndarray,
+                        link_entries: np.ndarray, link_tags: np.ndarray,
+                        min_entries: int = 5) -> Dict[str, np.ndarray]:
+    """Связь тегов с настроением для всех тегов сразу
+
+    entry_ids, scores - id и оценки всех записей пользователя;
+    link_entries, link_tags - пары (id записи, id тега) из mood_tags, то есть
+    разреженная матрица инцидентности "запись x тег" в формате координат.
+
+    Для каждого тега, отмеченного не менее чем в min_entries записях,
+    возвращает массивы одинаковой длины:
+    - tag_id, total_entries, positive_entries;
+    - correlation - точечно-бисериальная корреляция оценки с наличием тега;
+    - ci_low, ci_high - 95% доверительный интервал корреляции (по Фишеру);
+    - lift - P(хорошее настроение | тег) / P(хорошее настроение);
+    - mean_difference - средняя оценка с тегом минус средняя по всем записям.
+
+    Все суммы считаются через bincount по парам, плотная матрица не строится,
+    поэтому время линейно по числу отметок тегов.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+
+    rows, columns, tag_ids = _incidence(entry_ids, link_entries, link_tags)
+
+    positive = scores >= POSITIVE_SCORE
+    tagged = np.bincount(columns, minlength=tag_ids.size)
+    tagged_sum = np.bincount(columns, weights=scores[rows], minlength=tag_ids.size)
+    tagged_positive = np.bincount(columns, weights=positive[rows], minlength=tag_ids.size)
+
+    keep = tagged >= min_entries
+    stats = _indicator_statistics(scores, tagged[keep], tagged_sum[keep], tagged_positive[keep])
+    stats['tag_id'] = tag_ids[keep]
+    return stats
+
+def mine_patterns(entry_ids: np.ndarray, scores: np.ndarray, ordinals: np.ndarray,
+                  link_entries: np.ndarray, link_tags: np.ndarray,
+                  min_support: int = 5) -> Dict[str, Dict[str, np.ndarray]]:
+    """Связки тегов и влияние тега на настроение следующего дня
+
+    Возвращает два набора массивов в формате tag_mood_statistics:
+    - 'pairs' - два тега в одной записи (tag_id, other_tag_id);
+    - 'lagged' - тег вчера -> средняя оценка сегодня (tag_id), по парам
+      соседних дней с записями; total_entries здесь - число таких пар.
+
+    В пары попадают только теги с поддержкой не меньше min_support (если
+    реже встречается один тег, пара с ним встречается не чаще). Число
+    совместных отметок всех пар - одно произведение матриц X.T @ X
+    по матрице "запись x частый тег".
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    rows, columns, tag_ids = _incidence(entry_ids, link_entries, link_tags)
+
+    frequent = np.bincount(columns, minlength=tag_ids.size) >= min_support
+    remap = np.cumsum(frequent) - 1
+    mask = frequent[columns]
+    rows, columns, tag_ids = rows[mask], remap[columns[mask]], tag_ids[frequent]
+
+    matrix = np.zeros((scores.size, tag_ids.size))
+    matrix[rows, columns] = 1.0
+
+    # Пары тегов в одной записи: верхний треугольник матрицы совместной встречаемости
+    together = matrix.T @ matrix
+    together_sum = matrix.T @ (matrix * scores[:, None])
+    together_positive = matrix.T @ (matrix * (scores >= POSITIVE_SCORE)[:, None])
+    first, second = np.nonzero(np.triu(together >= min_support, k=1))
+
+    pairs = _indicator_statistics(scores, together[first, second],
+                                  together_sum[first, second], together_positive[first, second])
+    pairs['tag_id'] = tag_ids[first]
+    pairs['other_tag_id'] = tag_ids[second]
+
+    # Тег вчера -> настроение сегодня: записи сворачиваются в дни
+    days, day_index = np.unique(ordinals, return_inverse=True)
+    day_mood = (np.bincount(day_index, weights=scores, minlength=days.size)
+                / np.bincount(day_index, minlength=days.size))
+    day_tags = np.zeros((days.size, tag_ids.size))
+    day_tags[day_index[rows], columns] = 1.0
+
+    previous = np.nonzero(np.diff(days) == 1)[0]
+    yesterday, today = day_tags[previous], day_mood[previous + 1]
+
+    support = yesterday.sum(axis=0)
+    keep = support >= min_support
+    lagged = _indicator_statistics(today, support[keep], (yesterday.T @ today)[keep],
+                                   (yesterday.T @ (today >= POSITIVE_SCORE))[keep])
+    lagged['tag_id'] = tag_ids[keep]
+
+    return {'pairs': pairs, 'lagged': lagged}
+
+def _incidence(entry_ids: np.ndarray, link_entries: np.ndarray, link_tags: np.ndarray):
+    """Координаты матрицы "запись x тег": (строки, столбцы, id тегов столбцов)"""
+    # Номер строки для каждой пары (id записей отсортированы)
+    order = np.argsort(entry_ids, kind='stable')
+    sorted_ids = np.asarray(entry_ids)[order]
+    rows = order[np.searchsorted(sorted_ids, link_entries)]
+    tag_ids, columns = np.unique(link_tags, return_inverse=True)
+    return rows, columns.reshape(-1), tag_ids
+
+def _indicator_statistics(outcome: np.ndarray, n1: np.ndarray, s1: np.ndarray,
+                          q1: np.ndarray) -> Dict[str, np.ndarray]:
+    """Связь бинарного признака с оценкой по его суммарным статистикам
+
+    outcome - оценки всех наблюдений; n1, s1, q1 - для каждого признака число
+    наблюдений с ним, сумма их оценок и число положительных оценок.
+    """
+    n = outcome.size
+    n1 = np.asarray(n1, dtype=np.float64)
+    s1 = np.asarray(s1, dtype=np.float64)
+    q1 = np.asarray(q1, dtype=np.float64)
+    n0 = n - n1
+
+    total_sum = outcome.sum()
+    mean = total_sum / n if n else 0.0
+    std = outcome.std() if n else 0.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_with = s1 / n1
+        mean_without = np.where(n0 > 0, (total_sum - s1) / n0, mean_with)
+
+        # r_pb = (M1 - M0) / sigma * sqrt(n1 * n0) / n
+        if std > 0:
+            correlation = (mean_with - mean_without) / std * np.sqrt(n1 * n0) / n
+        else:
+            correlation = np.zeros_like(n1)
+        correlation = np.clip(np.nan_to_num(correlation), -1.0, 1.0)
+
+        # Доверительный интервал через преобразование Фишера z = atanh(r)
+        if n > 3:
+            z = np.arctanh(np.clip(correlation, -0.999999, 0.999999))
+            margin = Z_95 / np.sqrt(n - 3)
+            ci_low, ci_high = np.tanh(z - margin), np.tanh(z + margin)
+        else:
+            ci_low, ci_high = np.full_like(n1, -1.0), np.full_like(n1, 1.0)
+
+        base_rate = (outcome >= POSITIVE_SCORE).sum() / n if n else 0.0
+        lift = (q1 / n1) / base_rate if base_rate > 0 else np.ones_like(n1)
+
+    return {
+        'total_entries': n1.astype(np.int64),
+        'positive_entries': q1.astype(np.int64),
+        'correlation': correlation,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'lift': lift,
+        'mean_difference': mean_with - mean,
+    }
@@ -0,0 +1,262 @@
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from config import config, logger
+
+# ===== ЖУРНАЛ МЕДЛЕННЫХ ЗАПРОСОВ =====
+
+# Запросы, для которых имеет смысл EXPLAIN QUERY PLAN
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+def params_shape(parameters) -> str:
+    """Форма параметров запроса без самих значений: (int, str[12], NoneType)"""
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(sorted(parameters)) + "}"
+
+    items = []
+    for value in parameters:
+        if isinstance(value, (str, bytes)):
+            items.append(f"{type(value).__name__}[{len(value)}]")
+        else:
+            items.append(type(value).__name__)
+    return "(" + ", ".join(items) + ")"
+
+def _caller() -> str:
+    """Первая функция вне слоя метрик - обычно метод DatabaseManager"""
+    skip = (__file__, sys.modules['utils.metrics'].__file__)
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename in skip:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return f"{module}.{frame.f_code.co_name}"
+
+class SlowQueryLog:
+    """Журнал SQL-запросов, выполняющихся дольше порога
+
+    Включается и выключается во время работы (команда /slowlog, сигнал
+    SIGUSR2). Для каждого медленного запроса пишет в лог место вызова,
+    форму параметров и план выполнения (EXPLAIN QUERY PLAN).
+    """
+
+    def __init__(self, threshold_ms: float = 0):
+        self.threshold_ms = threshold_ms or 100.0
+        self.enabled = threshold_ms > 0
+
+    def configure(self, enabled: bool = None, threshold_ms: float = None):
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if enabled is not None:
+            self.enabled = enabled
+        logger.info("Журнал медленных запросов: %s, порог %g мс",
+                    'включен' if self.enabled else 'выключен', self.threshold_ms)
+
+    def check(self, connection: sqlite3.Connection, sql: str, parameters, duration: float,
+              many: bool = False):
+        """Вызывается после каждого запроса (см. utils.metrics.InstrumentedCursor)"""
+        duration_ms = duration * 1000
+        if not self.enabled or duration_ms < self.threshold_ms:
+            return
+
+        if many:
+            shape = f"{len(parameters)} наборов" if hasattr(parameters, '__len__') else "executemany"
+        else:
+            shape = params_shape(parameters)
+        query = " ".join(sql.split())
+        logger.warning("🐢 Медленный запрос %.1f мс в %s: %s | параметры %s%s", duration_ms, _caller(),
+                       query, shape, self._explain(connection, sql, parameters, many))
+
+    def _explain(self, connection, sql: str, parameters, many: bool) -> str:
+        if many or sql.split(None, 1)[0].upper() not in EXPLAINABLE:
+            return ""
+        try:
+            # Обычный курсор, чтобы сам EXPLAIN не попадал в метрики и журнал
+            rows = sqlite3.Cursor(connection).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        except sqlite3.Error as e:
+            return f" | план недоступен: {e}"
+        return " | план: " + "; ".join(str(row[-1]) for row in rows)
+
+# Глобальный журнал медленных запросов
+slow_query_log = SlowQueryLog(config.SLOW_QUERY_MS)
+
+# ===== ПРОФИЛИРОВЩИК =====
+
+class StackSampler:
+    """Статистический профилировщик: периодически снимает стеки всех потоков
+
+    Результат - файл в формате "folded stacks" (стек через ';' и число
+    попаданий), который понимают flamegraph.pl, speedscope и inferno.
+    Работает в отдельном потоке и почти не замедляет бота.
+    """
+
+    def __init__(self, interval: float = config.PROFILE_INTERVAL,
+                 output_dir: str = config.PROFILE_DIR):
+        self.interval = interval
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def run(self, seconds: float) -> str:
+        """Профилировать seconds секунд, вернуть путь к файлу (блокирует поток)"""
+        with self._lock:
+            if self._running:
+                raise RuntimeError("Профилирование уже запущено")
+            self._running = True
+
+        try:
+            logger.info("🔬 Профилирование на %g с...", seconds)
+            stacks = self._sample(seconds)
+            path = self._write(stacks)
+            logger.info("🔬 Профиль сохранен: %s (%s снимков)", path, sum(stacks.values()))
+            return path
+        finally:
+            self._running = False
+
+    def start(self, seconds: float) -> threading.Thread:
+        """Профилировать в фоновом потоке (для сигнала)"""
+        thread = threading.Thread(target=self._run_logged, args=(seconds,),
+                                  name="stack-sampler", daemon=True)
+        thread.start()
+        return thread
+
+    def _run_logged(self, seconds: float):
+        try:
+            self.run(seconds)
+        except Exception as e:
+            logger.error("Ошибка профилирования: %s", e)
+
+    def _sample(self, seconds: float) -> Counter:
+        stacks = Counter()
+        own_thread = threading.get_ident()
+        thread_names = {}
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                if thread_id not in thread_names:
+                    thread_names = {t.ident: t.name for t in threading.enumerate()}
+                stacks[self._fold(thread_names.get(thread_id, str(thread_id)), frame)] += 1
+            time.sleep(self.interval)
+
+        return stacks
+
+    @staticmethod
+    def _fold(thread_name: str, frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        names.append(thread_name)
+        return ";".join(reversed(names))
+
+    def _write(self, stacks: Counter) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(
+            self.output_dir,
+            f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded"
+        )
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+# Глобальный профилировщик процесса
+stack_sampler = StackSampler()
+
+# ===== КОМАНДЫ ПРОЦЕССАМ =====
+# В режиме нескольких воркеров /profile, /slowlog и сигналы должны действовать
+# на все процессы, а не только на тот, который их получил. Команда - словарь
+# {'action': 'profile', 'seconds': 30} или {'action': 'slowlog', 'enabled': True,
+# 'threshold_ms': 50}: супервизор рассылает ее воркерам (см. bot.run_control),
+# каждый процесс выполняет ее через run_command и возвращает результат.
+
+def process_name() -> str:
+    """Имя и pid текущего процесса для ответа администратору"""
+    return f"{multiprocessing.current_process().name} (pid {os.getpid()})"
+
+def run_command(command: dict) -> dict:
+    """Выполнить команду в текущем процессе (профилирование блокирует поток)"""
+    result = {'process': process_name()}
+
+    if command['action'] == 'profile':
+        try:
+            result['path'] = stack_sampler.run(command['seconds'])
+        except RuntimeError as e:
+            result['error'] = str(e)
+    elif command['action'] == 'slowlog':
+        if command.get('enabled') is not None or command.get('threshold_ms') is not None:
+            slow_query_log.configure(enabled=command.get('enabled'),
+                                     threshold_ms=command.get('threshold_ms'))
+        result['enabled'] = slow_query_log.enabled
+        result['threshold_ms'] = slow_query_log.threshold_ms
+    else:
+        result['error'] = f"неизвестная команда {command['action']}"
+
+    return result
+
+def format_command_results(command: dict, results: list, missing: list = ()) -> str:
+    """Текст ответа администратору: что сделано в каждом процессе"""
+    if command['action'] == 'profile':
+        lines = ["🔥 Профили в формате folded stacks (flamegraph.pl, speedscope):"]
+    else:
+        lines = ["🐢 Журнал медленных запросов:"]
+
+    for result in results:
+        if 'error' in result:
+            lines.append(f"• {result['process']}: ❌ {result['error']}")
+        elif 'path' in result:
+            lines.append(f"• {result['process']}: {os.path.abspath(result['path'])}")
+        else:
+            state = 'включен' if result['enabled'] else 'выключен'
+            lines.append(f"• {result['process']}: {state}, порог {result['threshold_ms']:g} мс")
+
+    for name in missing:
+        lines.append(f"• {name}: ⚠️ нет ответа")
+
+    return "\n".join(lines)
+
+# ===== СИГНАЛЫ =====
+
+def install_signal_handlers(loop, send_command=None) -> bool:
+    """SIGUSR1 - профилировать PROFILE_SECONDS секунд, SIGUSR2 - журнал медленных запросов
+
+    send_command - функция, рассылающая команду всем процессам (супервизор);
+    без нее сигнал действует только на текущий процесс.
+    """
+    import signal
+
+    if not hasattr(signal, 'SIGUSR1'):
+        return False  # Windows
+
+    def on_profile_signal():
+        if send_command is not None:
+            send_command({'action': 'profile', 'seconds': config.PROFILE_SECONDS})
+        elif not stack_sampler.running:
+            stack_sampler.start(config.PROFILE_SECONDS)
+
+    def on_slow_log_signal():
+        # Состояние в процессах могло разойтись, поэтому рассылается
+        # не "переключить", а новое значение
+        enabled = not slow_query_log.enabled
+        if send_command is not None:
+            send_command({'action': 'slowlog', 'enabled': enabled})
+        else:
+            slow_query_log.configure(enabled=enabled)
+
+    loop.add_signal_handler(signal.SIGUSR1, on_profile_signal)
+    loop.add_signal_handler(signal.SIGUSR2, on_slow_log_signal)
+    return True
@@ -5,6 +5,8 @@ from apscheduler.triggers.cron import CronTrigger
 
 from database.db_manager import db_manager
 from config import config, logger
+from utils.container import LazySingleton
+from utils.workers import shard_for_user
 
 class ReminderScheduler:
     """Планировщик напоминаний о записи настроения"""
@@ -13,13 +15,18 @@ class ReminderScheduler:
         self.scheduler = AsyncIOScheduler()
         self.active_jobs: Dict[int, str] = {}  # user_id -> job_id
 
-    async def start_scheduler(self):
-        """Запуск планировщика"""
+    async def start_scheduler(self, reminders: bool = True):
+        """Запуск планировщика
+
+        reminders=False - не загружать напоминания из базы (супервизор
+        в режиме воркеров: напоминания рассылают сами воркеры).
+        """
         self.scheduler.start()
         logger.info("Планировщик напоминаний запущен")
 
         # Загрузка активных напоминаний из базы данных
-        await self.load_active_reminders()
+        if reminders:
+            await self.load_active_reminders()
 
     async def stop_scheduler(self):
         """Остановка планировщика"""
@@ -27,11 +34,17 @@ class ReminderScheduler:
         logger.info("Планировщик напоминаний остановлен")
 
     async def load_active_reminders(self):
-        """Загрузка активных напоминаний"""
-        # Получаем всех пользователей с активными напоминаниями
-        # В реальном проекте нужно добавить поле для хранения job_id в базе данных
-        # Пока что это заглушка
-        pass
+        """Загрузка активных напоминаний
+
+        В режиме воркеров каждый воркер загружает только своих пользователей:
+        их настройки меняются обработчиками этого же воркера, поэтому
+        напоминание пользователя всегда живет в одном планировщике.
+        """
+        for settings in db_manager.get_reminder_settings():
+            if shard_for_user(settings.user_id, config.WORKERS) == config.WORKER_INDEX:
+                await self.schedule_user_reminder(settings.user_id, settings.reminder_time)
+
+        logger.info("Загружено напоминаний: %s", len(self.active_jobs))
 
     async def schedule_user_reminder(self, user_id: int, reminder_time: time):
         """Установка напоминания для пользователя"""
@@ -50,7 +63,7 @@ class ReminderScheduler:
         )
 
         self.active_jobs[user_id] = job_id
-        logger.info(f"Установлено напоминание для пользователя {user_id} на {reminder_time}")
+        logger.info("Установлено напоминание для пользователя %s на %s", user_id, reminder_time)
 
     async def cancel_user_reminder(self, user_id: int):
         """Отмена напоминания для пользователя"""
@@ -59,7 +72,7 @@ class ReminderScheduler:
             if self.scheduler.get_job(job_id):
                 self.scheduler.remove_job(job_id)
             del self.active_jobs[user_id]
-            logger.info(f"Отменено напоминание для пользователя {user_id}")
+            logger.info("Отменено напоминание для пользователя %s", user_id)
 
     async def send_reminder(self, user_id: int):
         """Отправка напоминания пользователю"""
@@ -78,7 +91,7 @@ class ReminderScheduler:
 
         # Здесь должна быть логика отправки сообщения пользователю
         # В реальном проекте нужно передать bot экземпляр или использовать callback
-        logger.info(f"Отправлено напоминание пользователю {user_id}")
+        logger.info("Отправлено напоминание пользователю %s", user_id)
 
     async def send_adaptive_reminder(self, user_id: int):
         """Отправка адаптивного напоминания (если пользователь давно не записывал)"""
@@ -87,7 +100,7 @@ class ReminderScheduler:
 
         if not entries:
             # Пользователь никогда не записывал настроение
-            logger.info(f"Отправлено первое напоминание пользователю {user_id}")
+            logger.info("Отправлено первое напоминание пользователю %s", user_id)
             return
 
         last_entry = entries[0]
@@ -95,8 +108,8 @@ class ReminderScheduler:
 
         if days_since_last_entry > 3:
             # Пользователь не записывал больше 3 дней
-            logger.info(f"Отправлено адаптивное напоминание пользователю {user_id} "
-                       f"(последняя запись {days_since_last_entry} дней назад)")
+            logger.info("Отправлено адаптивное напоминание пользователю %s "
+                        "(последняя запись %s дней назад)", user_id, days_since_last_entry)
 
     async def update_all_reminders(self):
         """Обновление всех активных напоминаний"""
@@ -126,5 +139,5 @@ class ReminderScheduler:
 
         return {"active": False}
 
-# Глобальный экземпляр планировщика
-reminder_scheduler = ReminderScheduler()
+# Глобальный экземпляр планировщика (создается при первом обращении)
+reminder_scheduler = LazySingleton(ReminderScheduler)
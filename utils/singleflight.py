@@ -0,0 +1,77 @@
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from database.db_manager import db_manager
+from utils.container import LazySingleton
+from utils.metrics import metrics, SINGLE_FLIGHT_SHARED, SINGLE_FLIGHT_REJECTED
+
+class Overloaded(Exception):
+    """Очередь исполнителя заполнена: новое вычисление не принято (см. SingleFlight.run)"""
+
+class SingleFlight:
+    """Одно вычисление на одинаковые одновременные запросы
+
+    Двойное нажатие на кнопку графика (или рассылка, после которой
+    пользователь открывает аналитику с двух устройств) запускает одинаковые
+    вычисления. Пока вычисление с тем же ключом не закончилось, следующие
+    запросы ждут его и получают тот же результат. Готовые результаты не
+    хранятся - это задача кэша чтения базы (utils.cache).
+
+    Ключ - пользователь, операция, аргументы и версия данных пользователя:
+    запрос после новой записи не получит результат, посчитанный до нее.
+
+    Заодно это учет очереди исполнителя: limit в run ограничивает число
+    вычислений, ожидающих или выполняющихся в нем (см. queue_depth).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._depths: Dict[Optional[Executor], int] = {}
+
+    async def run(self, user_id: int, operation: str, func: Callable, *args,
+                  executor: Executor = None, limit: int = 0) -> Any:
+        """Результат func(user_id, *args), посчитанного в пуле потоков executor
+
+        Если limit > 0 и в executor уже limit вычислений, новое вычисление
+        не ставится в очередь - выбрасывается Overloaded. Запрос, одинаковый
+        с выполняющимся, принимается всегда: он не добавляет работы.
+        """
+        key = (user_id, operation, args, db_manager.data_version(user_id))
+
+        future = self._calls.get(key)
+        if future is None:
+            if limit > 0 and self.queue_depth(executor) >= limit:
+                metrics.inc(SINGLE_FLIGHT_REJECTED, operation=operation)
+                raise Overloaded(operation)
+
+            # run_in_executor не переносит контекст: вычисление не использует
+            # сессию базы обновления, которое его начало, - оно может
+            # закончиться позже этой сессии, если обновление отменят
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(executor, partial(func, user_id, *args))
+            self._calls[key] = future
+            self._depths[executor] = self._depths.get(executor, 0) + 1
+            future.add_done_callback(partial(self._forget, key, executor))
+        else:
+            metrics.inc(SINGLE_FLIGHT_SHARED, operation=operation)
+
+        # Отмена одного ожидающего не отменяет вычисление для остальных
+        return await asyncio.shield(future)
+
+    def in_flight(self) -> int:
+        """Количество выполняющихся вычислений"""
+        return len(self._calls)
+
+    def queue_depth(self, executor: Executor = None) -> int:
+        """Вычисления, ожидающие или выполняющиеся в executor"""
+        return self._depths.get(executor, 0)
+
+    def _forget(self, key: Hashable, executor: Optional[Executor], future: asyncio.Future):
+        self._depths[executor] -= 1
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+# Глобальный экземпляр (создается при первом обращении)
+single_flight = LazySingleton(SingleFlight)
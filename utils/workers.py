@@ -0,0 +1,195 @@
+import asyncio
+import multiprocessing
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+from config import config, logger, setup_logging
+from utils import logs
+
+# Типы обновлений, в которых пользователь лежит в поле "from"
+USER_UPDATE_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query',
+    'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+    'poll_answer', 'my_chat_member', 'chat_member', 'chat_join_request'
+)
+
+def extract_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Получить id пользователя из сырого обновления Telegram"""
+    for field in USER_UPDATE_FIELDS:
+        payload = update.get(field)
+        if not payload:
+            continue
+
+        user = payload.get('from') or payload.get('user')
+        if user:
+            return user['id']
+
+        chat = payload.get('chat')
+        if chat:
+            return chat['id']
+
+    return None
+
+def shard_for_user(user_id: int, workers: int) -> int:
+    """Номер воркера, который обрабатывает обновления пользователя"""
+    return user_id % workers
+
+def shard_for_update(update: Dict[str, Any], workers: int) -> int:
+    """Номер воркера для обновления.
+
+    Все обновления одного пользователя всегда попадают в один и тот же воркер,
+    поэтому порядок их обработки сохраняется. Обновления без пользователя
+    распределяются по update_id.
+    """
+    user_id = extract_user_id(update)
+    if user_id is not None:
+        return shard_for_user(user_id, workers)
+    return update.get('update_id', 0) % workers
+
+class UserOrderedRunner:
+    """Выполняет корутины параллельно для разных пользователей,
+    но строго последовательно для одного пользователя
+
+    limit - наибольшее число незавершенных задач (0 - без ограничения).
+    Когда их столько, submit ждет завершения одной из них: иначе
+    ограниченная очередь воркера не сдерживала бы супервизор, а все
+    полученные обновления копились бы в задачах внутри воркера.
+    """
+
+    def __init__(self, limit: int = 0):
+        self._tails: Dict[Any, asyncio.Task] = {}  # ключ -> последняя задача
+        self._slots = asyncio.Semaphore(limit) if limit > 0 else None
+
+    async def submit(self, key: Any, coro: Coroutine) -> asyncio.Task:
+        """Поставить корутину в очередь пользователя"""
+        if self._slots is not None:
+            await self._slots.acquire()
+
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run_after(previous, coro))
+        self._tails[key] = task
+        task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        return task
+
+    async def drain(self):
+        """Дождаться завершения всех запущенных задач"""
+        while self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+    def _forget(self, key: Any, task: asyncio.Task):
+        if self._slots is not None:
+            self._slots.release()
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    @staticmethod
+    async def _run_after(previous: Optional[asyncio.Task], coro: Coroutine):
+        if previous is not None:
+            # Ошибка предыдущего обновления не должна блокировать следующие
+            await asyncio.wait({previous})
+        return await coro
+
+# Очередь команд супервизору (профилирование, журнал медленных запросов).
+# Задается только в процессах-воркерах, см. _worker_entry и send_command
+control_queue = None
+
+def send_command(command: Dict[str, Any], chat_id: Optional[int] = None) -> bool:
+    """Попросить супервизор выполнить команду во всех процессах.
+
+    Результаты супервизор собирает сам и отправляет в чат chat_id.
+    Возвращает False, если процесс не воркер и команду нужно выполнить на месте.
+    """
+    if control_queue is None:
+        return False
+    control_queue.put({'control': command, 'chat_id': chat_id})
+    return True
+
+def send_result(command_id: int, result: Dict[str, Any]):
+    """Вернуть супервизору результат команды, полученной через broadcast"""
+    control_queue.put({'id': command_id, 'result': result})
+
+def _worker_entry(target: Callable, index: int, queue, log_queue, commands):
+    """Точка входа процесса-воркера"""
+    global control_queue
+
+    config.WORKER_INDEX = index
+    control_queue = commands
+    # Записи воркера пишет поток записи супервизора
+    setup_logging(config, log_queue=log_queue)
+    try:
+        target(index, queue)
+    except KeyboardInterrupt:
+        pass
+
+class WorkerPool:
+    """Пул процессов-воркеров с шардированием обновлений по user_id.
+
+    target - функция верхнего уровня модуля вида target(index, queue),
+    которая читает обновления из очереди до получения None. Кроме
+    обновлений в очередь попадают команды {'control': {...}} (см. broadcast).
+    """
+
+    def __init__(self, workers: int, target: Callable,
+                 queue_size: int = config.WORKER_QUEUE_SIZE):
+        self.workers = workers
+        self.target = target
+        # spawn работает одинаково на всех ОС и не копирует в воркеры
+        # состояние родителя (цикл событий, потоки, открытые соединения)
+        self._context = multiprocessing.get_context('spawn')
+        self.queues = [self._context.Queue(queue_size) for _ in range(workers)]
+        self.processes: List[multiprocessing.Process] = []
+        # Записи логов воркеров (см. utils.logs.forward_to)
+        self.log_queue = self._context.Queue()
+        # Команды от воркеров и их результаты для супервизора (см. bot.run_control)
+        self.control_queue = self._context.Queue()
+        self._log_listener = None
+
+    def start(self):
+        """Запуск всех воркеров"""
+        if logs.log_writer is not None:
+            self._log_listener = logs.log_writer.listen(self.log_queue)
+
+        for index, queue in enumerate(self.queues):
+            process = self._context.Process(
+                target=_worker_entry,
+                args=(self.target, index, queue, self.log_queue, self.control_queue),
+                name=f"mood-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+        logger.info("Запущено воркеров: %s", self.workers)
+
+    def submit(self, update: Dict[str, Any]) -> int:
+        """Отправить обновление в воркер пользователя.
+
+        Если очередь воркера заполнена, вызов блокируется -
+        это естественное ограничение скорости для получателя обновлений.
+        Из цикла событий вызывается в потоке (см. bot.run_supervisor).
+        """
+        index = shard_for_update(update, self.workers)
+        self.queues[index].put(update)
+        return index
+
+    def broadcast(self, command: Dict[str, Any]):
+        """Отправить команду всем воркерам (блокируется, как и submit)"""
+        for queue in self.queues:
+            queue.put({'control': command})
+
+    def stop(self, timeout: float = 30):
+        """Корректная остановка: воркеры дорабатывают свои очереди"""
+        for queue in self.queues:
+            queue.put(None)
+
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning("Воркер %s не завершился вовремя, останавливаем принудительно", process.name)
+                process.terminate()
+                process.join()
+
+        self.processes.clear()
+        if self._log_listener is not None:
+            logs.log_writer.stop_listening(self._log_listener)
+            self._log_listener = None
+        logger.info("Все воркеры остановлены")